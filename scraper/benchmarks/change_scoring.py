@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Change Scoring Benchmark
+Compares the shingle engine against the difflib reference on real raw
+snapshots (scraper/data/snapshots and legacy scraper/data/raw files), plus
+synthetic edits of those snapshots.
+
+Usage:
+    python scraper/benchmarks/change_scoring.py
+    python scraper/benchmarks/change_scoring.py --shingle-sizes 2 3 4 --scale 10
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from change_scoring import DifflibScorer, ShingleScorer
+from snapshot_store import SnapshotStore
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+RAW_DIR = DATA_DIR / "raw"
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"
+
+EDIT_RATES = [0.0, 0.01, 0.05, 0.20, 0.50]
+
+# =============================================================================
+# SNAPSHOT LOADING
+# =============================================================================
+
+def snapshot_text(data: Dict) -> str:
+    """Text the scraper would score for a raw snapshot"""
+    if data.get('content'):
+        return data['content']
+    parts = []
+    for article in data.get('articles', []):
+        parts.append(article.get('title', ''))
+        parts.append(article.get('abstract', ''))
+    for alert in data.get('alerts', []):
+        parts.append(alert.get('full_text', ''))
+    return ' '.join(p for p in parts if p)
+
+def load_snapshots() -> Dict[str, List[str]]:
+    """Group snapshot texts by source, oldest first"""
+    snapshots: Dict[str, List[str]] = {}
+    for raw_file in sorted(RAW_DIR.glob("*.json")):
+        source_id = raw_file.stem.rsplit('_', 2)[0]
+        with open(raw_file, 'r') as f:
+            text = snapshot_text(json.load(f))
+        if text:
+            snapshots.setdefault(source_id, []).append(text)
+    
+    store = SnapshotStore(SNAPSHOTS_DIR)
+    for manifest_file in sorted(store.manifests_dir.glob("*.json")):
+        source_id = manifest_file.stem
+        for data in (store.previous(source_id), store.latest(source_id)):
+            text = snapshot_text(data or {})
+            if text:
+                snapshots.setdefault(source_id, []).append(text)
+    return snapshots
+
+def mutate(text: str, rate: float, rng: random.Random) -> str:
+    """Delete, replace or insert roughly `rate` of the words"""
+    words = text.split()
+    out = []
+    for word in words:
+        roll = rng.random()
+        if roll < rate / 3:
+            continue
+        elif roll < 2 * rate / 3:
+            out.append(rng.choice(words))
+        elif roll < rate:
+            out.extend([word, rng.choice(words)])
+        else:
+            out.append(word)
+    return ' '.join(out)
+
+def build_pairs(scale: int, seed: int) -> List[Tuple[str, str, str, str]]:
+    """(source_id, label, old, new) pairs from consecutive and mutated snapshots"""
+    rng = random.Random(seed)
+    pairs = []
+    for source_id, texts in load_snapshots().items():
+        texts = [' '.join([t] * scale) for t in texts]
+        for older, newer in zip(texts, texts[1:]):
+            pairs.append((source_id, 'consecutive', older, newer))
+        for rate in EDIT_RATES:
+            pairs.append((source_id, f"edit {rate:.0%}", texts[-1], mutate(texts[-1], rate, rng)))
+    return pairs
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def timed(scorer, old: str, new: str) -> Tuple[float, float]:
+    start = time.perf_counter()
+    score = scorer.score(old, new)
+    return score, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark change scoring engines')
+    parser.add_argument('--shingle-sizes', type=int, nargs='+', default=[2, 3, 4, 5])
+    parser.add_argument('--minhash', type=int, default=0, help='MinHash permutations (0 = exact)')
+    parser.add_argument('--scale', type=int, default=1, help='Repeat each snapshot N times')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    pairs = build_pairs(args.scale, args.seed)
+    if not pairs:
+        print(f"No snapshots found in {SNAPSHOTS_DIR} or {RAW_DIR}")
+        return
+    
+    reference = DifflibScorer()
+    engines = {k: ShingleScorer(k, args.minhash) for k in args.shingle_sizes}
+    
+    header = f"{'source':<22} {'pair':<12} {'chars':>8} {'difflib':>8}"
+    for k in engines:
+        header += f" {f'k={k}':>8}"
+    print(header)
+    print("-" * len(header))
+    
+    errors = {k: [] for k in engines}
+    totals = {'difflib': 0.0, **{k: 0.0 for k in engines}}
+    
+    for source_id, label, old, new in pairs:
+        ref_score, ref_time = timed(reference, old, new)
+        totals['difflib'] += ref_time
+        line = f"{source_id:<22} {label:<12} {len(new):>8} {ref_score:>8.3f}"
+        for k, engine in engines.items():
+            score, elapsed = timed(engine, old, new)
+            totals[k] += elapsed
+            errors[k].append(abs(score - ref_score))
+            line += f" {score:>8.3f}"
+        print(line)
+    
+    print()
+    print(f"{'engine':<12} {'total time':>12} {'speedup':>9} {'mean |err|':>11} {'max |err|':>10}")
+    print(f"{'difflib':<12} {totals['difflib']:>11.4f}s {'1.0x':>9} {'-':>11} {'-':>10}")
+    for k in engines:
+        speedup = totals['difflib'] / totals[k] if totals[k] else float('inf')
+        mean_err = sum(errors[k]) / len(errors[k])
+        print(f"{f'shingle k={k}':<12} {totals[k]:>11.4f}s {speedup:>8.1f}x {mean_err:>11.3f} {max(errors[k]):>10.3f}")
+
+if __name__ == '__main__':
+    main()
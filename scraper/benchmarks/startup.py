@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Wall time of the read-only CLI commands and the import cost of the pipeline
+modules, measured in fresh interpreters.
+
+Import cost comes from `python -X importtime`: for each module the
+cumulative time of its own import, plus the heaviest third-party packages it
+pulls in.
+
+Usage:
+    python scraper/benchmarks/startup.py
+    python scraper/benchmarks/startup.py --runs 10 --top 15
+"""
+
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SCRAPER_DIR = Path(__file__).parent.parent
+LOGS_DIR = SCRAPER_DIR / "logs"
+
+COMMANDS = [
+    ['service.py', '--list-sources'],
+    ['updater.py', '--status'],
+    ['scheduler.py', '--status'],
+]
+MODULES = ['service', 'updater', 'scheduler']
+
+# =============================================================================
+# MEASUREMENTS
+# =============================================================================
+
+def command_times(command: List[str], runs: int) -> List[float]:
+    """Wall time of each run of a CLI command"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(SCRAPER_DIR / command[0])] + command[1:],
+                       cwd=SCRAPER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """{package: (self us, cumulative us)} from -X importtime for one import"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=SCRAPER_DIR, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if not self_us.isdigit():
+            continue  # header row
+        times[name] = (int(self_us), int(cumulative_us))
+    return times
+
+def log_files() -> int:
+    return len(list(LOGS_DIR.glob('*.log'))) if LOGS_DIR.exists() else 0
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup and import cost')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per command')
+    parser.add_argument('--top', type=int, default=10, help='Heaviest top-level packages to list per module')
+    args = parser.parse_args()
+
+    logs_before = log_files()
+    header = f"{'command':<28} {'min':>8} {'median':>8} {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    for command in COMMANDS:
+        times = command_times(command, args.runs)
+        print(f"{' '.join(command):<28} {min(times):>7.3f}s {statistics.median(times):>7.3f}s {max(times):>7.3f}s")
+    print(f"\nLog files created: {log_files() - logs_before}")
+
+    for module in MODULES:
+        times = import_times(module)
+        total = times.get(module, (0, 0))[1]
+        print(f"\nimport {module}: {total / 1000:.1f} ms")
+        top_level = {name: cumulative for name, (_, cumulative) in times.items()
+                     if '.' not in name and name != module}
+        for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {name:<26} {cumulative / 1000:>8.1f} ms")
+
+if __name__ == '__main__':
+    main()
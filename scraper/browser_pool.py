@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+MedKitt Browser Pool
+Bounded pool of reusable headless browser sessions for rendered (CDC) pages.
+
+Each pool worker is a thread that owns one browser session, since Playwright
+sessions must stay on the thread that created them (they are also closed
+there). Pages render in parallel on up to `size` sessions. A session is closed
+and replaced after `max_pages` fetches, or when the resident memory of its own
+browser processes grows past `max_memory_mb` (requires psutil). A session's
+processes are the ones spawned while it started; sessions are started one at
+a time so they can be told apart.
+
+Usage:
+    pool = BrowserPool(lambda: StealthySession(headless=True), size=2)
+    page = pool.fetch(url)
+    pool.close()
+"""
+
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Set
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger("MedKittScraper")
+
+# =============================================================================
+# BROWSER POOL
+# =============================================================================
+
+class _PooledSession:
+    """A browser session, the processes it spawned, and the pages it has served"""
+
+    def __init__(self, session: Any, pids: Optional[Set[int]] = None):
+        self.session = session
+        self.pids = pids or set()
+        self.pages = 0
+
+def _child_pids() -> Set[int]:
+    """PIDs of every descendant of this process"""
+    if not PSUTIL_AVAILABLE:
+        return set()
+    try:
+        return {proc.pid for proc in psutil.Process(os.getpid()).children(recursive=True)}
+    except psutil.Error:
+        return set()
+
+def _processes_memory_mb(pids: Set[int]) -> Optional[float]:
+    """Resident memory of the given processes and their descendants, in MB"""
+    if not PSUTIL_AVAILABLE or not pids:
+        return None
+    seen = set()
+    total = 0
+    for pid in pids:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            continue  # the process has exited
+        for proc in procs:
+            if proc.pid in seen:
+                continue
+            seen.add(proc.pid)
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+    return total / (1024 * 1024)
+
+class BrowserPool:
+    """Fixed number of browser sessions, each recycled after N pages or on memory growth"""
+
+    def __init__(self, factory: Callable[[], Any], size: int = 2, max_pages: int = 50,
+                 max_memory_mb: Optional[float] = None):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._local = threading.local()
+        self._sessions: List[_PooledSession] = []
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        # Work items are (url, kwargs, future); None tells one worker to close its session and exit
+        self._tasks: 'queue.Queue[Optional[tuple]]' = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._idle = 0  # workers waiting for a task that no fetch has claimed yet
+        self._closed = False
+        self.pages_served = 0
+        self.recycled = 0
+
+        if max_memory_mb and not PSUTIL_AVAILABLE:
+            logger.warning("psutil not installed; browser pool recycles by page count only")
+
+    def _open(self) -> _PooledSession:
+        track = bool(self.max_memory_mb and PSUTIL_AVAILABLE)
+        with self._open_lock:
+            before = _child_pids() if track else set()
+            session = self.factory()
+            if hasattr(session, 'start'):
+                session.start()
+            pids = _child_pids() - before if track else set()
+        pooled = _PooledSession(session, pids)
+        with self._lock:
+            self._sessions.append(pooled)
+        return pooled
+
+    def _retire(self, pooled: _PooledSession, recycled: bool = True):
+        with self._lock:
+            if pooled in self._sessions:
+                self._sessions.remove(pooled)
+            if recycled:
+                self.recycled += 1
+        try:
+            if hasattr(pooled.session, 'close'):
+                pooled.session.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser session: {e}")
+
+    def _should_recycle(self, pooled: _PooledSession) -> Optional[str]:
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return f"{pooled.pages} pages served"
+        if self.max_memory_mb:
+            memory = _processes_memory_mb(pooled.pids)
+            if memory is not None and memory > self.max_memory_mb:
+                return f"memory {memory:.0f} MB > {self.max_memory_mb} MB"
+        return None
+
+    def _fetch_on_worker(self, url: str, kwargs: dict) -> Any:
+        pooled = getattr(self._local, 'pooled', None)
+        if pooled is None:
+            pooled = self._local.pooled = self._open()
+
+        try:
+            page = pooled.session.fetch(url, **kwargs)
+        except Exception:
+            # A failed render may leave the browser in a bad state; start fresh next time
+            self._local.pooled = None
+            self._retire(pooled)
+            raise
+
+        pooled.pages += 1
+        with self._lock:
+            self.pages_served += 1
+
+        reason = self._should_recycle(pooled)
+        if reason:
+            logger.info(f"Recycling browser session ({reason})")
+            self._local.pooled = None
+            self._retire(pooled)
+        return page
+
+    def _work(self):
+        """Worker loop: render pages on this thread's session until told to close"""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                self._close_local()
+                return
+            url, kwargs, future = task
+            try:
+                future.set_result(self._fetch_on_worker(url, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            with self._lock:
+                self._idle += 1
+
+    def fetch(self, url: str, **kwargs) -> Any:
+        """Render a page on the next free browser session (blocks until done)"""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BrowserPool is closed")
+            # Reuse an idle worker (and its open session) before starting another, up to size
+            if self._idle:
+                self._idle -= 1
+            elif len(self._workers) < self.size:
+                worker = threading.Thread(target=self._work, daemon=True,
+                                          name=f"browser_{len(self._workers)}")
+                self._workers.append(worker)
+                worker.start()
+            self._tasks.put((url, kwargs, future))
+        return future.result()
+
+    def close(self):
+        """Close every browser session on its own thread and stop the workers"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        # A worker exits after its first None, so each one closes its own session exactly once
+        for _ in workers:
+            self._tasks.put(None)
+        for worker in workers:
+            worker.join()
+
+    def _close_local(self):
+        pooled = getattr(self._local, 'pooled', None)
+        if pooled is not None:
+            self._local.pooled = None
+            self._retire(pooled, recycled=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'open_sessions': len(self._sessions),
+                'pages_served': self.pages_served,
+                'recycled': self.recycled
+            }
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+MedKitt Change Scoring
+Scores how much a source's text changed between two scrapes (0.0 = identical,
+1.0 = nothing in common).
+
+Engines:
+    shingle  - rolling-hash word shingles compared with Dice similarity.
+               Linear in text length; optional MinHash signatures.
+    difflib  - character-level difflib.SequenceMatcher. Quadratic in the worst
+               case; kept as the reference the shingle engine is tuned against.
+
+Usage:
+    scorer = build_scorer(config['scraper'].get('change_scoring', {}))
+    scorer.score(old_text, new_text)
+"""
+
+import re
+import zlib
+import difflib
+from collections import Counter
+from typing import Dict, List, Type
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Rolling hash parameters (Mersenne prime modulus keeps the arithmetic cheap)
+_MOD = (1 << 61) - 1
+_BASE = 1_000_003
+
+# Texts too short for this many full-size shingles are scored with smaller ones
+_MIN_SHINGLES = 8
+
+# =============================================================================
+# SCORING ENGINES
+# =============================================================================
+
+class DifflibScorer:
+    """Character-level SequenceMatcher ratio (reference engine)"""
+    
+    name = 'difflib'
+    
+    def score(self, old: str, new: str) -> float:
+        if not old:
+            return 1.0 if new else 0.0
+        return 1.0 - difflib.SequenceMatcher(None, old, new).ratio()
+
+class ShingleScorer:
+    """Word-shingle Dice distance computed with a rolling hash
+    
+    shingle_size is the accuracy knob: smaller shingles track difflib more
+    closely on small edits, larger shingles are stricter about word order.
+    With minhash_permutations > 0 the similarity is estimated from fixed-size
+    MinHash signatures instead of exact shingle counts.
+    """
+    
+    name = 'shingle'
+    
+    def __init__(self, shingle_size: int = 4, minhash_permutations: int = 0):
+        if shingle_size < 1:
+            raise ValueError("shingle_size must be at least 1")
+        self.shingle_size = shingle_size
+        self.minhash_permutations = minhash_permutations
+        # Fixed coefficients so scores are reproducible across runs
+        self._permutations = [
+            (2 * i + 1) * 0x9E3779B97F4A7C15 % _MOD or 1 for i in range(minhash_permutations)
+        ]
+    
+    def _token_hashes(self, text: str) -> List[int]:
+        return [zlib.crc32(token.encode('utf-8')) for token in TOKEN_RE.findall(text)]
+    
+    def _shingles(self, token_hashes: List[int], k: int) -> Counter:
+        """Count k-token shingles, sliding a polynomial hash over the tokens"""
+        shingles = Counter()
+        if len(token_hashes) < k:
+            return shingles
+        
+        high = pow(_BASE, k - 1, _MOD)
+        h = 0
+        for t in token_hashes[:k]:
+            h = (h * _BASE + t) % _MOD
+        shingles[h] += 1
+        
+        for i in range(k, len(token_hashes)):
+            h = ((h - token_hashes[i - k] * high) * _BASE + token_hashes[i]) % _MOD
+            shingles[h] += 1
+        return shingles
+    
+    def _minhash_similarity(self, old: Counter, new: Counter) -> float:
+        """Estimate Dice similarity from MinHash signatures"""
+        matches = 0
+        for a in self._permutations:
+            if min((a * s) % _MOD for s in old) == min((a * s) % _MOD for s in new):
+                matches += 1
+        jaccard = matches / len(self._permutations)
+        return 2 * jaccard / (1 + jaccard)
+    
+    def score(self, old: str, new: str) -> float:
+        if not old:
+            return 1.0 if new else 0.0
+        if old == new:
+            return 0.0
+        
+        old_tokens = self._token_hashes(old)
+        new_tokens = self._token_hashes(new)
+        if not old_tokens or not new_tokens:
+            return 0.0 if old_tokens == new_tokens else 1.0
+        
+        # Short texts fall back to smaller shingles so they can still overlap
+        shortest = min(len(old_tokens), len(new_tokens))
+        k = max(1, min(self.shingle_size, shortest // _MIN_SHINGLES))
+        old_shingles = self._shingles(old_tokens, k)
+        new_shingles = self._shingles(new_tokens, k)
+        
+        if self.minhash_permutations:
+            similarity = self._minhash_similarity(old_shingles, new_shingles)
+        else:
+            overlap = sum((old_shingles & new_shingles).values())
+            total = sum(old_shingles.values()) + sum(new_shingles.values())
+            similarity = 2 * overlap / total
+        
+        return 1.0 - similarity
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+SCORERS: Dict[str, Type] = {
+    DifflibScorer.name: DifflibScorer,
+    ShingleScorer.name: ShingleScorer,
+}
+
+def build_scorer(settings: Dict):
+    """Build the scorer described by the scraper.change_scoring config block"""
+    engine = settings.get('engine', ShingleScorer.name)
+    if engine not in SCORERS:
+        raise ValueError(f"Unknown change scoring engine: {engine}")
+    
+    if engine == ShingleScorer.name:
+        return ShingleScorer(
+            shingle_size=settings.get('shingle_size', 4),
+            minhash_permutations=settings.get('minhash_permutations', 0)
+        )
+    return SCORERS[engine]()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+MedKitt Config Loader
+Loads config.yaml once into a validated Config, with the lookups the pipeline
+needs compiled ahead of time:
+
+    handlers         source_id -> scrape handler ('cdc', 'fda' or 'pubmed')
+    consult_sources  consult_id -> ids of the sources mapped to it
+    tree_consults    tree file stem -> ids of the consults using that tree
+
+Selector strings under each source's `selectors` are split into lists.
+
+The compiled config is cached as JSON in __pycache__/ next to the config file,
+keyed on the sha256 of the file's bytes and of this module's source (the
+validation and compile rules), so later loads of an unchanged file with
+unchanged rules skip YAML parsing and validation. Invalid configs raise ConfigError listing
+every problem found, before any scraping starts.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import functools
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from source_schedule import FREQUENCIES, PRIORITY_RANKS
+
+logger = logging.getLogger("MedKittScraper")
+
+CONFIG_PATH = Path(__file__).parent / "config.yaml"
+CACHE_VERSION = 2
+
+# Source type prefix -> scrape handler (e.g. "cdc_guideline" -> "cdc")
+HANDLERS = ('cdc', 'fda', 'pubmed')
+
+class ConfigError(ValueError):
+    """config.yaml is unreadable or fails validation"""
+
+    def __init__(self, path: Path, errors: List[str]):
+        self.path = path
+        self.errors = errors
+        super().__init__(f"Invalid config {path}:\n" + '\n'.join(f"  - {error}" for error in errors))
+
+# =============================================================================
+# COMPILED LOOKUPS
+# =============================================================================
+
+def source_handler(source_type: str) -> Optional[str]:
+    """Scrape handler for a source type, or None if no handler takes it"""
+    for handler in HANDLERS:
+        if (source_type or '').startswith(handler):
+            return handler
+    return None
+
+def split_selectors(selectors: Union[str, Iterable[str], None]) -> List[str]:
+    """Selectors from a comma-separated string or an already split list"""
+    if not selectors:
+        return []
+    if isinstance(selectors, str):
+        selectors = selectors.split(',')
+    return [selector.strip() for selector in selectors if selector and selector.strip()]
+
+class Config(dict):
+    """The parsed config.yaml mapping, plus lookups compiled from it"""
+
+    def __init__(self, data: Dict[str, Any], digest: str = '',
+                 handlers: Optional[Dict[str, str]] = None,
+                 consult_sources: Optional[Dict[str, List[str]]] = None,
+                 tree_consults: Optional[Dict[str, List[str]]] = None):
+        super().__init__(data)
+        self.digest = digest
+        self.handlers: Dict[str, str] = handlers or {}
+        self.consult_sources: Dict[str, List[str]] = consult_sources or {}
+        self.tree_consults: Dict[str, List[str]] = tree_consults or {}
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            'version': CACHE_VERSION,
+            'rules': rules_digest(),
+            'digest': self.digest,
+            'config': dict(self),
+            'handlers': self.handlers,
+            'consult_sources': self.consult_sources,
+            'tree_consults': self.tree_consults
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'Config':
+        return cls(state['config'], state['digest'], state['handlers'],
+                   state['consult_sources'], state['tree_consults'])
+
+def compile_config(data: Dict[str, Any], digest: str = '') -> Config:
+    """Config with selectors split and routing/reverse maps built (data must be valid)"""
+    handlers = {}
+    consult_sources = {consult_id: [] for consult_id in data.get('consults', {})}
+    for source_id, source_config in data.get('sources', {}).items():
+        handlers[source_id] = source_handler(source_config.get('type', ''))
+        if source_config.get('selectors'):
+            source_config['selectors'] = {
+                kind: split_selectors(selectors) for kind, selectors in source_config['selectors'].items()
+            }
+        for consult_id in source_config.get('consults', []):
+            consult_sources[consult_id].append(source_id)
+
+    tree_consults: Dict[str, List[str]] = {}
+    for consult_id, consult_config in data.get('consults', {}).items():
+        tree_consults.setdefault(Path(consult_config['file']).stem, []).append(consult_id)
+
+    return Config(data, digest, handlers, consult_sources, tree_consults)
+
+# =============================================================================
+# VALIDATION
+# =============================================================================
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_str_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+def validate(data: Any) -> List[str]:
+    """Every problem found in a parsed config (empty when valid)"""
+    if not isinstance(data, dict):
+        return ["top level must be a mapping"]
+    errors = []
+    for section in ('scraper', 'sources', 'consults'):
+        if not isinstance(data.get(section), dict):
+            errors.append(f"'{section}' must be a mapping")
+    if errors:
+        return errors
+
+    scraper = data['scraper']
+    if not isinstance(scraper.get('user_agent'), str) or not scraper['user_agent'].strip():
+        errors.append("scraper.user_agent must be a non-empty string")
+    if not _is_number(scraper.get('timeout')) or scraper['timeout'] <= 0:
+        errors.append("scraper.timeout must be a positive number")
+    for key in ('request_delay', 'max_retries', 'max_workers'):
+        if key in scraper and (not _is_number(scraper[key]) or scraper[key] < 0):
+            errors.append(f"scraper.{key} must be a non-negative number")
+    for section, keys in (('retry', ('backoff_base', 'backoff_max', 'max_retry_after')),
+                          ('circuit_breaker', ('failure_threshold', 'reset_timeout')),
+                          ('connection_pool', ('hosts', 'per_host'))):
+        settings = scraper.get(section, {})
+        if not isinstance(settings, dict):
+            errors.append(f"scraper.{section} must be a mapping")
+            continue
+        for key in keys:
+            if key in settings and (not _is_number(settings[key]) or settings[key] < 0):
+                errors.append(f"scraper.{section}.{key} must be a non-negative number")
+    settings = data.get('metrics', {})
+    if not isinstance(settings, dict):
+        errors.append("metrics must be a mapping")
+    else:
+        for key in ('enabled', 'prometheus'):
+            if key in settings and not isinstance(settings[key], bool):
+                errors.append(f"metrics.{key} must be true or false")
+        if 'max_history_mb' in settings and (not _is_number(settings['max_history_mb'])
+                                             or settings['max_history_mb'] <= 0):
+            errors.append("metrics.max_history_mb must be a positive number")
+    thresholds = scraper.get('thresholds', {})
+    levels = [thresholds.get(level) for level in ('minor', 'major', 'critical') if level in thresholds]
+    if not all(_is_number(level) and 0 <= level <= 1 for level in levels):
+        errors.append("scraper.thresholds must be fractions between 0 and 1")
+    elif levels != sorted(levels):
+        errors.append("scraper.thresholds must increase from minor to critical")
+
+    consults = data['consults']
+    for consult_id, consult_config in consults.items():
+        where = f"consults.{consult_id}"
+        if not isinstance(consult_config, dict):
+            errors.append(f"{where} must be a mapping")
+            continue
+        for key in ('name', 'file'):
+            if not isinstance(consult_config.get(key), str) or not consult_config[key]:
+                errors.append(f"{where}.{key} must be a non-empty string")
+        if not _is_str_list(consult_config.get('keywords')):
+            errors.append(f"{where}.keywords must be a list of strings")
+
+    for source_id, source_config in data['sources'].items():
+        where = f"sources.{source_id}"
+        if not isinstance(source_config, dict):
+            errors.append(f"{where} must be a mapping")
+            continue
+        for key in ('name', 'url', 'type'):
+            if not isinstance(source_config.get(key), str) or not source_config[key]:
+                errors.append(f"{where}.{key} must be a non-empty string")
+        handler = source_handler(source_config.get('type', ''))
+        if isinstance(source_config.get('type'), str) and handler is None:
+            errors.append(f"{where}.type '{source_config['type']}' has no handler ({', '.join(HANDLERS)})")
+        if handler == 'pubmed' and not source_config.get('search_query'):
+            errors.append(f"{where}.search_query is required for PubMed sources")
+        if source_config.get('check_frequency', 'daily') not in FREQUENCIES:
+            errors.append(f"{where}.check_frequency must be one of {', '.join(FREQUENCIES)}")
+        if source_config.get('priority', 'medium') not in PRIORITY_RANKS:
+            errors.append(f"{where}.priority must be one of {', '.join(PRIORITY_RANKS)}")
+        selectors = source_config.get('selectors', {})
+        if not isinstance(selectors, dict) or not all(
+                isinstance(value, str) or _is_str_list(value) for value in selectors.values()):
+            errors.append(f"{where}.selectors must map names to selector strings")
+        for key in ('consults', 'drug_keywords'):
+            if key in source_config and not _is_str_list(source_config[key]):
+                errors.append(f"{where}.{key} must be a list of strings")
+        for consult_id in source_config.get('consults', []) if _is_str_list(source_config.get('consults')) else []:
+            if consult_id not in consults:
+                errors.append(f"{where} maps to unknown consult '{consult_id}'")
+    return errors
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+@functools.lru_cache(maxsize=None)
+def rules_digest() -> str:
+    """Hash of the rules a cached config was validated and compiled with"""
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    digest.update(repr((sorted(FREQUENCIES), sorted(PRIORITY_RANKS))).encode('utf-8'))
+    return digest.hexdigest()
+
+def cache_path(config_path: Path) -> Path:
+    """Where the compiled form of a config file is cached"""
+    config_path = Path(config_path)
+    return config_path.parent / '__pycache__' / f"{config_path.name}.json"
+
+def _read_cache(path: Path, digest: str) -> Optional[Config]:
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        if (state.get('version') == CACHE_VERSION and state.get('rules') == rules_digest()
+                and state.get('digest') == digest):
+            return Config.from_state(state)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def _write_cache(path: Path, config: Config):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(config.to_state(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug(f"Not caching compiled config: {e}")
+
+def load_config(path: Union[str, Path] = CONFIG_PATH, use_cache: bool = True) -> Config:
+    """Validated, compiled config (from the cache when the file is unchanged)"""
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+    except OSError as e:
+        raise ConfigError(path, [f"cannot read: {e}"])
+    digest = hashlib.sha256(raw).hexdigest()
+
+    if use_cache:
+        cached = _read_cache(cache_path(path), digest)
+        if cached is not None:
+            return cached
+
+    import yaml
+    try:
+        data = yaml.safe_load(raw)
+    except yaml.YAMLError as e:
+        raise ConfigError(path, [f"not valid YAML: {e}"])
+
+    errors = validate(data)
+    if errors:
+        raise ConfigError(path, errors)
+
+    config = compile_config(data, digest)
+    if use_cache:
+        _write_cache(cache_path(path), config)
+    return config
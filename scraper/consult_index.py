@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+MedKitt Consult Index
+Inverted index from normalized terms and drug names to the decision tree
+nodes that mention them, built from every tree in src/data/trees.
+
+The updater queries it to find which nodes a scraped table or alert touches,
+instead of lowercasing and scanning every consult for every table.
+
+State (data/consult_index.json):
+    {"drugs_hash": ..., "trees": {consult_id: {"key": [mtime_ns, size],
+                                               "nodes": {node_id: title}}},
+     "postings": {term: ["consult_id/node_id", ...]}}
+
+Only trees whose mtime or size changed are re-parsed on refresh(). Drug names
+are indexed as whole phrases ("drug:benzathine penicillin g") next to the
+single-word terms, so multi-word names match exactly.
+"""
+
+import os
+import re
+import json
+import math
+import hashlib
+import logging
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Any
+
+from keyword_matcher import KeywordMatcher
+from ts_parser import parse_file, TSParseError
+
+logger = logging.getLogger("MedKittUpdater")
+
+SKIP_FILES = {'index.ts'}
+
+# Node fields that hold ids or wiring rather than clinical text
+_SKIPPED_FIELDS = {'id', 'type', 'next', 'children', 'module', 'calculatorLinks'}
+
+_TERM_RE = re.compile(r"[a-z][a-z0-9]*(?:['-][a-z0-9]+)*")
+_DRUG_NAME_RE = re.compile(r"^\s+(?:name|genericName):\s*'((?:[^'\\]|\\.)+)'", re.MULTILINE)
+
+STOPWORDS = frozenset('''
+    the and for with without from that this these those are was were has have had not but
+    all any can may should must will than then into over under per via its his her their
+    who what when where which while within after before other others also only such
+    patient patients use used using see
+'''.split())
+
+DRUG_WEIGHT = 2.0  # a drug name counts double toward a node's score
+
+# =============================================================================
+# TERMS
+# =============================================================================
+
+def terms(text: str) -> Set[str]:
+    """Normalized single-word terms of a text"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return {term for term in _TERM_RE.findall(text) if len(term) >= 3 and term not in STOPWORDS}
+
+def load_drug_names(drug_store: Path) -> List[str]:
+    """Drug names and generic names declared in src/data/drug-store.ts"""
+    drug_store = Path(drug_store)
+    if not drug_store.exists():
+        return []
+    names = []
+    for name in _DRUG_NAME_RE.findall(drug_store.read_text()):
+        # Drop qualifiers: "Benzathine Penicillin G (Bicillin L-A)"
+        name = re.sub(r'\s*\(.*$', '', name).strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def _node_text(value: Any) -> Iterable[str]:
+    """Every string in a node, skipping id and wiring fields"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from _node_text(item)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key not in _SKIPPED_FIELDS:
+                yield from _node_text(item)
+
+# =============================================================================
+# CONSULT INDEX
+# =============================================================================
+
+class ConsultIndex:
+    """Term and drug postings over all decision tree nodes, refreshed incrementally"""
+
+    def __init__(self, path: Path, trees_dir: Path, drugs: Iterable[str] = ()):
+        self.path = Path(path)
+        self.trees_dir = Path(trees_dir)
+        self.drug_matcher = KeywordMatcher(drugs)
+        self.drugs_hash = hashlib.sha256(
+            '\n'.join(sorted(d.lower() for d in self.drug_matcher.keywords)).encode('utf-8')
+        ).hexdigest()[:16]
+
+        self.trees: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    state = json.load(f)
+                if state.get('drugs_hash') == self.drugs_hash:
+                    self.trees = state.get('trees', {})
+                    self.postings = {term: set(keys) for term, keys in state.get('postings', {}).items()}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable consult index: {e}")
+
+    # -- building -------------------------------------------------------------
+
+    def _node_terms(self, node: Dict[str, Any]) -> Set[str]:
+        text = '\n'.join(_node_text(node))
+        found = terms(text)
+        found.update(f"drug:{drug.lower()}" for drug in self.drug_matcher.matched_keywords(text))
+        return found
+
+    def _drop_tree(self, consult_id: str):
+        prefix = f"{consult_id}/"
+        for term in list(self.postings):
+            keys = {key for key in self.postings[term] if not key.startswith(prefix)}
+            if keys:
+                self.postings[term] = keys
+            else:
+                del self.postings[term]
+        self.trees.pop(consult_id, None)
+
+    def _add_tree(self, consult_id: str, tree_path: Path, key: List[int]) -> bool:
+        try:
+            nodes = parse_file(tree_path)
+        except TSParseError as e:
+            logger.warning(f"Not indexing {tree_path.name}: {e}")
+            return False
+        titles = {}
+        for node in nodes:
+            node_id = node.get('id')
+            if not isinstance(node_id, str):
+                continue
+            titles[node_id] = node.get('title') if isinstance(node.get('title'), str) else ''
+            node_key = f"{consult_id}/{node_id}"
+            for term in self._node_terms(node):
+                self.postings.setdefault(term, set()).add(node_key)
+        self.trees[consult_id] = {'key': key, 'nodes': titles}
+        return True
+
+    def refresh(self) -> bool:
+        """Re-index trees that were added, changed or removed; returns whether anything did"""
+        changed = False
+        seen = set()
+        for tree_path in sorted(self.trees_dir.glob('*.ts')):
+            if tree_path.name in SKIP_FILES:
+                continue
+            consult_id = tree_path.stem
+            seen.add(consult_id)
+            stat = tree_path.stat()
+            key = [stat.st_mtime_ns, stat.st_size]
+            if self.trees.get(consult_id, {}).get('key') == key:
+                continue
+            self._drop_tree(consult_id)
+            self._add_tree(consult_id, tree_path, key)
+            changed = True
+
+        for consult_id in set(self.trees) - seen:
+            self._drop_tree(consult_id)
+            changed = True
+
+        if changed:
+            self.save()
+        return changed
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            'drugs_hash': self.drugs_hash,
+            'trees': self.trees,
+            'postings': {term: sorted(keys) for term, keys in sorted(self.postings.items())}
+        }
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    # -- queries --------------------------------------------------------------
+
+    def _node_count(self) -> int:
+        return sum(len(tree['nodes']) for tree in self.trees.values()) or 1
+
+    def _hit(self, node_key: str, score: float, matched: List[str]) -> Dict[str, Any]:
+        consult_id, node_id = node_key.split('/', 1)
+        return {
+            'consult_id': consult_id,
+            'node_id': node_id,
+            'title': self.trees.get(consult_id, {}).get('nodes', {}).get(node_id, ''),
+            'score': round(score, 3),
+            'terms': sorted(matched)
+        }
+
+    def search(self, text: str, consult_ids: Optional[Iterable[str]] = None,
+               min_score: float = 0.5, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Nodes covering at least min_score of the text's indexed terms
+
+        The score is the idf-weighted share of the query's terms (those that
+        occur in any node) that the node contains, with drug names weighted
+        DRUG_WEIGHT. Results are best first.
+        """
+        query = terms(text)
+        query.update(f"drug:{drug.lower()}" for drug in self.drug_matcher.matched_keywords(text or ''))
+        total_nodes = self._node_count()
+        prefixes = tuple(f"{consult_id}/" for consult_id in consult_ids) if consult_ids is not None else None
+
+        weights = {}
+        for term in query:
+            postings = self.postings.get(term)
+            if postings:
+                weight = math.log(1 + total_nodes / len(postings))
+                weights[term] = weight * (DRUG_WEIGHT if term.startswith('drug:') else 1.0)
+        total = sum(weights.values())
+        if not total:
+            return []
+
+        scores: Dict[str, float] = {}
+        matched: Dict[str, List[str]] = {}
+        for term, weight in weights.items():
+            for node_key in self.postings[term]:
+                if prefixes is not None and not node_key.startswith(prefixes):
+                    continue
+                scores[node_key] = scores.get(node_key, 0.0) + weight
+                matched.setdefault(node_key, []).append(term)
+
+        hits = [
+            self._hit(node_key, score / total, matched[node_key])
+            for node_key, score in scores.items() if score / total >= min_score
+        ]
+        hits.sort(key=lambda hit: (-hit['score'], hit['consult_id'], hit['node_id']))
+        return hits[:limit] if limit else hits
+
+    def nodes_for_drugs(self, drugs: Iterable[str],
+                        consult_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Nodes mentioning any of the drugs (by indexed drug name)"""
+        prefixes = tuple(f"{consult_id}/" for consult_id in consult_ids) if consult_ids is not None else None
+        matched: Dict[str, List[str]] = {}
+        for drug in drugs:
+            term = f"drug:{drug.lower()}"
+            for node_key in self.postings.get(term, ()):
+                if prefixes is None or node_key.startswith(prefixes):
+                    matched.setdefault(node_key, []).append(term)
+        return [self._hit(node_key, 1.0, matched[node_key]) for node_key in sorted(matched)]
+
+    def consults_for_drugs(self, drugs: Iterable[str]) -> List[str]:
+        """Consults with at least one node mentioning any of the drugs"""
+        return sorted({hit['consult_id'] for hit in self.nodes_for_drugs(drugs)})
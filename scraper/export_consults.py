@@ -1,88 +1,280 @@
 #!/usr/bin/env python3
 """
 Export existing TypeScript consults to JSON for PWA consumption
+
+Every tree in src/data/trees is exported (index.ts excepted). Trees are parsed
+with ts_parser in a single pass each and exported in parallel across a
+process pool.
+
+Trees whose source hash and output file match the export manifest are
+skipped, and a consult's last_updated only moves when its exported content
+changes.
+
+Usage:
+    python scraper/export_consults.py                 # Export all trees
+    python scraper/export_consults.py pep stroke      # Export selected trees
+    python scraper/export_consults.py --workers 1     # Export serially
+    python scraper/export_consults.py --changed-only  # Print changed consult ids only
+    python scraper/export_consults.py --force         # Ignore the manifest
 """
 
-import re
+import os
 import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config_loader import load_config
+from ts_parser import extract_nodes, find_tree_metadata, parse_declarations, TSParseError
 
 BASE_DIR = Path(__file__).parent.parent
+CONFIG_PATH = BASE_DIR / "scraper" / "config.yaml"
 CONSULTS_DIR = BASE_DIR / "src" / "data" / "consults"
 TREES_DIR = BASE_DIR / "src" / "data" / "trees"
+CATEGORIES_FILE = BASE_DIR / "src" / "data" / "categories.ts"
+EXPORT_MANIFEST_FILE = BASE_DIR / "scraper" / "data" / "export_manifest.json"
+
+# Tree modules that are not decision trees
+SKIP_FILES = {'index.ts'}
 
 def parse_ts_nodes(content):
     """Parse nodes from TypeScript file"""
-    nodes = []
-    
-    # Find node patterns
-    node_pattern = r'\{\s*id:\s*[\'"]([^\'"]+)[\'"]'
-    for m in re.finditer(node_pattern, content):
-        node_id = m.group(1)
-        node = {'id': node_id}
-        
-        # Type
-        type_match = re.search(rf'id:\s*[\'"]{re.escape(node_id)}[\'"]\s*,\s*[^}}]*type:\s*[\'](\w+)[\']', content)
-        if type_match:
-            node['type'] = type_match.group(1)
-        
-        # Title
-        title_match = re.search(rf'id:\s*[\'"]{re.escape(node_id)}[\'"]\s*,\s*[^}}]*title:\s*[\']([^\']+)[\']', content)
-        if title_match:
-            node['title'] = title_match.group(1)
-        
-        nodes.append(node)
-    
-    return nodes
-
-def export_consult(tree_file, consult_id, consult_name):
-    """Export a single consult to JSON"""
-    tree_path = TREES_DIR / tree_file
-    
+    return extract_nodes(content)
+
+def _category_entries() -> Dict[str, Dict]:
+    """Title and version of each tree listed in categories.ts"""
+    if not CATEGORIES_FILE.exists():
+        return {}
+    try:
+        declarations = parse_declarations(CATEGORIES_FILE.read_text())
+    except TSParseError as e:
+        print(f"  Warning: could not parse {CATEGORIES_FILE.name}: {e}")
+        return {}
+
+    entries = {}
+    for category in declarations.get('DEFAULT_CATEGORIES', []):
+        for tree in category.get('decisionTrees', []) if isinstance(category, dict) else []:
+            if isinstance(tree, dict) and tree.get('id'):
+                entries.setdefault(tree['id'], tree)
+    return entries
+
+def discover_consults(only: Optional[List[str]] = None) -> List[Tuple]:
+    """(tree_path, consult_id, consult_name, output_path, version, keywords) for every tree file"""
+    configured = load_config(CONFIG_PATH).get('consults', {})
+    categories = _category_entries()
+
+    consults = []
+    for tree_path in sorted(TREES_DIR.glob('*.ts')):
+        if tree_path.name in SKIP_FILES:
+            continue
+        consult_id = tree_path.stem
+        if only and consult_id not in only:
+            continue
+
+        consult_config = configured.get(consult_id, {})
+        name = (
+            consult_config.get('name')
+            or categories.get(consult_id, {}).get('title')
+            or consult_id.replace('-', ' ').title()
+        )
+        output_path = (
+            BASE_DIR / consult_config['json_output'] if consult_config.get('json_output')
+            else CONSULTS_DIR / f"{consult_id}.json"
+        )
+        version = categories.get(consult_id, {}).get('version')
+        consults.append((tree_path, consult_id, name, output_path, version, consult_config.get('keywords')))
+    return consults
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file's bytes"""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+# =============================================================================
+# EXPORT MANIFEST
+# =============================================================================
+
+class ExportManifest:
+    """Source and output hash of every exported consult"""
+
+    def __init__(self, path: Path = EXPORT_MANIFEST_FILE):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"  Warning: ignoring unreadable export manifest: {e}")
+
+    def is_current(self, consult_id: str, source_hash: str, output_path: Path, name: str) -> bool:
+        """Whether the consult was exported from this source and its output is untouched"""
+        entry = self.entries.get(consult_id)
+        if not entry or entry.get('source_hash') != source_hash or entry.get('name') != name:
+            return False
+        output_path = Path(output_path)
+        if entry.get('output') != str(output_path) or not output_path.exists():
+            return False
+        return file_hash(output_path) == entry.get('output_hash')
+
+    def record(self, consult_id: str, result: Dict[str, Any]):
+        self.entries[consult_id] = {
+            'name': result['name'],
+            'source': result['source'],
+            'source_hash': result['source_hash'],
+            'output': result['output'],
+            'output_hash': result['output_hash'],
+            'last_updated': result['last_updated']
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def write_export(export_data: Dict[str, Any], output_path: Path) -> Tuple[bool, str]:
+    """Write consult JSON unless only last_updated would change
+
+    export_data['last_updated'] is replaced with the existing file's value when
+    the rest of the content is identical. Returns (changed, output_hash).
+    """
+    output_path = Path(output_path)
+    if output_path.exists():
+        try:
+            with open(output_path, 'r') as f:
+                existing = json.load(f)
+        except (OSError, ValueError):
+            existing = None
+        if isinstance(existing, dict):
+            current = dict(existing, last_updated=None)
+            if current == dict(export_data, last_updated=None):
+                export_data['last_updated'] = existing.get('last_updated')
+                return False, file_hash(output_path)
+
+    payload = json.dumps(export_data, indent=2, ensure_ascii=False).encode('utf-8')
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(payload)
+    os.replace(tmp_path, output_path)
+    return True, hashlib.sha256(payload).hexdigest()
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def export_consult(tree_path, consult_id, consult_name, output_path=None, version=None,
+                   keywords=None, verbose=True):
+    """Export a single consult to JSON
+
+    Returns a result dict (changed, hashes, last_updated) or None on failure.
+    """
+    tree_path = Path(tree_path)
+
     if not tree_path.exists():
-        print(f"  Skipping {consult_id} - file not found")
-        return False
-    
-    content = tree_path.read_text()
-    nodes = parse_ts_nodes(content)
-    
+        if verbose:
+            print(f"  Skipping {consult_id} - file not found")
+        return None
+
+    source = tree_path.read_bytes()
+    content = source.decode('utf-8')
+    try:
+        nodes = parse_ts_nodes(content)
+    except TSParseError as e:
+        if verbose:
+            print(f"  Skipping {consult_id} - {e}")
+        return None
+
     export_data = {
         'id': consult_id,
         'name': consult_name,
-        'version': '1.0',
+        'version': find_tree_metadata(content).get('version') or version or '1.0',
         'last_updated': datetime.now().isoformat(),
         'node_count': len(nodes),
         'nodes': nodes
     }
-    
-    output_path = CONSULTS_DIR / f"{consult_id}.json"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w') as f:
-        json.dump(export_data, f, indent=2)
-    
-    print(f"  Exported {consult_id}: {len(nodes)} nodes -> {output_path}")
-    return True
+    if keywords is not None:
+        export_data['keywords'] = keywords
+
+    output_path = Path(output_path) if output_path else CONSULTS_DIR / f"{consult_id}.json"
+    changed, output_hash = write_export(export_data, output_path)
+
+    if verbose:
+        if changed:
+            print(f"  Exported {consult_id}: {len(nodes)} nodes -> {output_path}")
+        else:
+            print(f"  Unchanged {consult_id}: {len(nodes)} nodes")
+
+    return {
+        'consult_id': consult_id,
+        'name': consult_name,
+        'changed': changed,
+        'source': str(tree_path),
+        'source_hash': hashlib.sha256(source).hexdigest(),
+        'output': str(output_path),
+        'output_hash': output_hash,
+        'last_updated': export_data['last_updated']
+    }
+
+def _export_job(job):
+    """Process pool entry point"""
+    return export_consult(*job)
+
+def export_all(only: Optional[List[str]] = None, workers: int = 1, force: bool = False,
+               verbose: bool = True, manifest: Optional[ExportManifest] = None) -> List[Dict[str, Any]]:
+    """Export every tree whose source or output differs from the manifest"""
+    manifest = manifest or ExportManifest()
+    jobs = []
+    skipped = 0
+    for tree_path, consult_id, name, output_path, version, keywords in discover_consults(only):
+        if not force and manifest.is_current(consult_id, file_hash(tree_path), output_path, name):
+            skipped += 1
+            continue
+        jobs.append((tree_path, consult_id, name, output_path, version, keywords, verbose))
+
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        results = [_export_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_export_job, jobs))
+
+    results = [result for result in results if result]
+    for result in results:
+        manifest.record(result['consult_id'], result)
+    if results:
+        manifest.save()
+
+    if verbose and skipped:
+        print(f"  Skipped {skipped} unchanged trees")
+    return results
 
 def main():
-    print("Exporting MedKitt consults to JSON...")
+    parser = argparse.ArgumentParser(description="Export MedKitt consult trees to JSON")
+    parser.add_argument('consults', nargs='*', help='Consult ids to export (default: all trees)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (1 exports serially)')
+    parser.add_argument('--changed-only', action='store_true',
+                        help='Print only the ids of consults whose JSON changed')
+    parser.add_argument('--force', action='store_true', help='Re-export trees the manifest marks current')
+    args = parser.parse_args()
+
+    verbose = not args.changed_only
+    if verbose:
+        print("Exporting MedKitt consults to JSON...")
     CONSULTS_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # Export key consults tracked by scraper
-    consults = [
-        ('neurosyphilis.ts', 'neurosyphilis', 'Neurosyphilis Workup'),
-        ('pep.ts', 'pep', 'Post Exposure Prophylaxis'),
-        ('pe-treatment.ts', 'pe-treatment', 'PE Treatment'),
-        ('stroke.ts', 'stroke', 'Acute Ischemic Stroke'),
-    ]
-    
-    exported = 0
-    for tree_file, consult_id, consult_name in consults:
-        if export_consult(tree_file, consult_id, consult_name):
-            exported += 1
-    
-    print(f"\nExported {exported} consults to {CONSULTS_DIR}")
+
+    results = export_all(args.consults, workers=args.workers, force=args.force, verbose=verbose)
+    changed = [result['consult_id'] for result in results if result['changed']]
+
+    if args.changed_only:
+        for consult_id in changed:
+            print(consult_id)
+    else:
+        print(f"\nExported {len(changed)} changed consults to {CONSULTS_DIR}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+MedKitt Fetch Layer
+Retries, backoff and per-host circuit breaking shared by the CDC, FDA and
+PubMed paths.
+
+A transient failure (connection error, timeout, 429 or 5xx) is retried up to
+max_retries times. The wait before retry n is drawn uniformly from
+[0, min(backoff_max, backoff_base * 2**n)] ("full jitter"), unless the server
+sent a Retry-After, which is honoured up to max_retry_after seconds.
+
+Each failed attempt counts against the host's circuit breaker. After
+failure_threshold consecutive failures the circuit opens and calls to that
+host fail immediately with CircuitOpenError for reset_timeout seconds. Then a
+single trial call is let through: success closes the circuit, failure opens
+it again. A slow or down host therefore costs a few timeouts per run, not one
+per source.
+"""
+
+import sys
+import time
+import random
+import logging
+import threading
+import urllib.error
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("MedKittScraper")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Calls to a host are suspended after repeated failures"""
+
+    def __init__(self, host: str, retry_in: float):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(f"Circuit open for {host} (retrying in {retry_in:.0f}s)")
+
+# =============================================================================
+# FAILURE CLASSIFICATION
+# =============================================================================
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - (now or datetime.now(timezone.utc))).total_seconds())
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an exception (urllib HTTPError, requests HTTPError)"""
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a failed call is worth retrying"""
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance(exc, (ConnectionError, TimeoutError, urllib.error.URLError)):
+        return True
+    # requests is imported lazily; if it is not loaded the error is not from it
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        return isinstance(exc, (requests.ConnectionError, requests.Timeout,
+                                requests.exceptions.ChunkedEncodingError))
+    return False
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """Retry-After carried by an HTTP error, if any"""
+    headers = getattr(exc, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(exc, 'response', None), 'headers', None)
+    return parse_retry_after(headers.get('Retry-After')) if headers is not None else None
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+
+class CircuitBreaker:
+    """Per-host consecutive-failure counter with open / half-open states"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._trial: Dict[str, bool] = {}  # a half-open trial call is in flight
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            return self._state(host)
+
+    def _state(self, host: str) -> str:
+        opened_at = self._opened_at.get(host)
+        if opened_at is None:
+            return 'closed'
+        if self.clock() - opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def before_call(self, host: str):
+        """Raise CircuitOpenError unless a call to the host may go ahead"""
+        with self._lock:
+            state = self._state(host)
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._trial.get(host):
+                self._trial[host] = True
+                logger.info(f"Circuit half-open for {host}, sending a trial request")
+                return
+            retry_in = max(0.0, self._opened_at[host] + self.reset_timeout - self.clock())
+        raise CircuitOpenError(host, retry_in)
+
+    def record_success(self, host: str):
+        with self._lock:
+            if host in self._opened_at:
+                logger.info(f"Circuit closed for {host}")
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trial.pop(host, None)
+
+    def record_failure(self, host: str):
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if self._trial.pop(host, False) or failures >= self.failure_threshold:
+                if self._state(host) != 'open':
+                    logger.warning(f"Circuit opened for {host} after {failures} consecutive failures")
+                self._opened_at[host] = self.clock()
+
+# =============================================================================
+# RETRIER
+# =============================================================================
+
+class Retrier:
+    """Runs calls to a host with retries, backoff and the host's circuit breaker"""
+
+    def __init__(self, max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 max_retry_after: float = 120.0, breaker: Optional[CircuitBreaker] = None,
+                 sleep: Callable[[float], None] = time.sleep, rng: Optional[random.Random] = None):
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, scraper_config: Dict[str, Any], **kwargs) -> 'Retrier':
+        """Retrier for the `scraper` section of config.yaml"""
+        retry = scraper_config.get('retry', {})
+        breaker = scraper_config.get('circuit_breaker', {})
+        return cls(
+            max_retries=scraper_config.get('max_retries', 3),
+            backoff_base=retry.get('backoff_base', 1.0),
+            backoff_max=retry.get('backoff_max', 30.0),
+            max_retry_after=retry.get('max_retry_after', 120.0),
+            breaker=CircuitBreaker(breaker.get('failure_threshold', 5), breaker.get('reset_timeout', 300.0)),
+            **kwargs
+        )
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry `attempt` (0-based)"""
+        if retry_after is not None:
+            return retry_after
+        return self.rng.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_or_give_up(self, host: str, attempt: int, what: str, retry_after: Optional[float]) -> bool:
+        """Wait before the next attempt; False when out of attempts or Retry-After is too long"""
+        if attempt >= self.max_retries or self.breaker.state(host) == 'open':
+            return False
+        if retry_after is not None and retry_after > self.max_retry_after:
+            logger.warning(f"{host} asked to retry after {retry_after:.0f}s, giving up")
+            return False
+        delay = self.backoff(attempt, retry_after)
+        logger.info(f"{host}: {what}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        self.sleep(delay)
+        return True
+
+    def call(self, host: str, func: Callable[[], Any],
+             retry_on: Callable[[BaseException], bool] = is_transient,
+             failed: Optional[Callable[[Any], Optional[str]]] = None) -> Any:
+        """Call func(), retrying transient failures
+
+        failed(result) may describe a result that counts as a failure (e.g. an
+        HTTP 503 response); such a result is closed and retried, or returned
+        once attempts run out.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call(host)
+            try:
+                result = func()
+            except Exception as e:
+                if not retry_on(e):
+                    self.breaker.record_success(host)  # an answer, just not a useful one
+                    raise
+                self.breaker.record_failure(host)
+                if not self._retry_or_give_up(host, attempt, f"{type(e).__name__}: {e}", retry_after_of(e)):
+                    raise
+                attempt += 1
+                continue
+
+            failure = failed(result) if failed else None
+            if failure is None:
+                self.breaker.record_success(host)
+                return result
+            self.breaker.record_failure(host)
+            retry_after = parse_retry_after(getattr(result, 'headers', {}).get('Retry-After'))
+            if not self._retry_or_give_up(host, attempt, failure, retry_after):
+                return result
+            if hasattr(result, 'close'):
+                result.close()
+            attempt += 1
+
+    def get(self, session, host: str, url: str, **kwargs):
+        """session.get() with retries; a retryable status is returned once attempts run out"""
+        return self.call(
+            host, lambda: session.get(url, **kwargs),
+            failed=lambda response: f"HTTP {response.status_code}"
+            if response.status_code in RETRY_STATUSES else None
+        )
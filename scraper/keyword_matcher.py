@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+MedKitt Keyword Matcher
+Finds every configured keyword (drug names, consult keywords) in a text with a
+single compiled regex pass, instead of lowercasing and scanning the text once
+per keyword.
+
+Matching is case-insensitive and on whole words: "PE" matches "PE" or "pe"
+but not "prescription". Matches report the keyword as configured plus its
+character offsets in the text.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    """One occurrence of a keyword in a text"""
+    keyword: str
+    start: int
+    end: int
+
+# =============================================================================
+# MATCHER
+# =============================================================================
+
+class KeywordMatcher:
+    """Compiled whole-word, case-insensitive multi-keyword matcher"""
+    
+    def __init__(self, keywords: Iterable[str]):
+        # Keep configuration order; first spelling of a keyword wins
+        self.keywords: List[str] = []
+        self._canonical: Dict[str, str] = {}
+        for keyword in keywords:
+            key = keyword.lower() if keyword else ''
+            if key and key not in self._canonical:
+                self._canonical[key] = keyword
+                self.keywords.append(keyword)
+        self._order = {key: i for i, key in enumerate(self._canonical)}
+        
+        # Longer keywords that start with a shorter whole-word keyword
+        # ("lumbar puncture" / "lumbar") report both from one match
+        self._prefixes: Dict[str, List[str]] = {}
+        for key in self._canonical:
+            self._prefixes[key] = [
+                other for other in self._canonical
+                if other != key and key.startswith(other) and not re.match(r'\w', key[len(other)])
+            ]
+        
+        self._pattern = None
+        self._longest_first = sorted(self._canonical, key=len, reverse=True)
+        if self._canonical:
+            alternation = '|'.join(re.escape(key) for key in self._longest_first)
+            # Zero-width lookahead so overlapping keywords at different offsets
+            # ("ischemic stroke" / "stroke") are all found in the same pass
+            self._pattern = re.compile(rf'(?=(?<!\w)({alternation})(?!\w))', re.IGNORECASE)
+    
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+    
+    def finditer(self, text: str) -> Iterator[KeywordMatch]:
+        """Yield every keyword occurrence in text order"""
+        if not self._pattern or not text:
+            return
+        for m in self._pattern.finditer(text):
+            key = self._key_for(m.group(1))
+            start = m.start(1)
+            yield KeywordMatch(self._canonical[key], start, m.end(1))
+            for prefix in self._prefixes[key]:
+                yield KeywordMatch(self._canonical[prefix], start, start + len(prefix))
+    
+    def _key_for(self, matched: str) -> str:
+        key = matched.lower()
+        if key in self._canonical:
+            return key
+        # Unicode case folding can match text whose lowercase is not the keyword
+        # ("ſepſis" for "sepsis", the Kelvin sign for "k"); find the alternative
+        # the pattern took
+        for key in self._longest_first:
+            if re.fullmatch(re.escape(key), matched, re.IGNORECASE):
+                return key
+        raise AssertionError(f"{matched!r} matched no keyword")
+    
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """All keyword occurrences in text order"""
+        return list(self.finditer(text))
+    
+    def matched_keywords(self, text: str) -> List[str]:
+        """Distinct keywords present in the text, in configuration order"""
+        found = {match.keyword.lower() for match in self.finditer(text)}
+        return [self._canonical[key] for key in sorted(found, key=self._order.__getitem__)]
+    
+    def offsets(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """(start, end) offsets of each keyword present in the text"""
+        offsets: Dict[str, List[Tuple[int, int]]] = {}
+        for match in self.finditer(text):
+            offsets.setdefault(match.keyword, []).append((match.start, match.end))
+        return {keyword: offsets[keyword] for keyword in self.keywords if keyword in offsets}
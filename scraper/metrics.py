@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+MedKitt Metrics
+Timers and counters for the pipeline's hot paths, so a slow run can be traced
+to fetching, parsing, change scoring, snapshot I/O or consult parsing.
+
+    with metrics.timer('stage_seconds', stage='fetch'):
+        ...
+    metrics.count('bytes_fetched_total', len(body), host='www.cdc.gov')
+
+Series are keyed by name and labels and kept in one process-wide registry
+(scrapes run in worker threads, so it is locked). After a run, export_run()
+appends the run's series as one line to a JSON-lines history and rewrites a
+Prometheus text file, which a node_exporter textfile collector can scrape.
+The history is rotated to <name>.1 once it passes max_bytes.
+
+Metrics in use:
+    scrape_seconds{handler, source}   one source's scrape (PubMed: the batch)
+    stage_seconds{stage}              fetch (requests, and body reads of
+                                      streamed pages), parse, score,
+                                      snapshot_io, ts_parse, update
+    bytes_fetched_total{host}         response bytes read
+    sections_parsed_total, tables_parsed_total, alerts_parsed_total,
+    articles_parsed_total, ts_nodes_parsed_total  (labelled by source/consult)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("MedKittScraper")
+
+PREFIX = "medkitt_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+class Metrics:
+    """Thread-safe timers (count / total / max seconds) and counters"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._timers: Dict[Tuple[str, Labels], List[float]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self.started = time.time()
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record one timed call"""
+        key = (name, _labels(labels))
+        with self._lock:
+            timer = self._timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Time the block (also when it raises)"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start, **labels)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Add value to a counter"""
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        """Drop every series (start of a run)"""
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """{'timers': [...], 'counters': [...]}, each entry with name and labels"""
+        with self._lock:
+            timers = [
+                {'name': name, 'labels': dict(labels), 'count': count,
+                 'total': round(total, 6), 'max': round(longest, 6)}
+                for (name, labels), (count, total, longest) in sorted(self._timers.items())
+            ]
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {'timers': timers, 'counters': counters}
+
+    def empty(self) -> bool:
+        with self._lock:
+            return not self._timers and not self._counters
+
+# The registry the pipeline records into
+registry = Metrics()
+
+timer = registry.timer
+count = registry.count
+observe = registry.observe
+snapshot = registry.snapshot
+reset = registry.reset
+
+def fetched(chunks: Iterable[bytes], host: str) -> Iterator[bytes]:
+    """Pass the chunks of a streamed response body through, timing the reads
+
+    The time spent waiting for chunks is recorded as stage_seconds{stage="fetch"}
+    and their length as bytes_fetched_total{host}, so whatever consumes the
+    chunks can time its own work separately.
+    """
+    chunks = iter(chunks)
+    total = 0
+    waited = 0.0
+    try:
+        while True:
+            start = registry.clock()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                waited += registry.clock() - start
+            total += len(chunk)
+            yield chunk
+    finally:
+        registry.observe('stage_seconds', waited, stage='fetch')
+        registry.count('bytes_fetched_total', total, host=host)
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + '}'
+
+def prometheus_text(run: Dict[str, Any]) -> str:
+    """A run record in the Prometheus text exposition format (values of that run)"""
+    lines = [
+        f"# TYPE {PREFIX}last_run_timestamp_seconds gauge",
+        f"{PREFIX}last_run_timestamp_seconds {run['finished']:.3f}",
+        f"# TYPE {PREFIX}last_run_duration_seconds gauge",
+        f"{PREFIX}last_run_duration_seconds {run['duration']:.3f}",
+    ]
+    typed = set()
+    for entry in run['timers']:
+        name = PREFIX + entry['name']
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} summary")
+            lines.append(f"# TYPE {name}_max gauge")
+        labels = _label_text(entry['labels'])
+        lines.append(f"{name}_count{labels} {entry['count']}")
+        lines.append(f"{name}_sum{labels} {entry['total']}")
+        lines.append(f"{name}_max{labels} {entry['max']}")
+    for entry in run['counters']:
+        name = PREFIX + entry['name']
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_label_text(entry['labels'])} {entry['value']}")
+    return '\n'.join(lines) + '\n'
+
+def _write_atomic(path: Path, text: str):
+    # The textfile collector may read at any moment; never show it a partial file
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def export_run(command: str, jsonl_path: Optional[Path] = None, prometheus_path: Optional[Path] = None,
+               metrics: Optional[Metrics] = None, max_bytes: int = 5 * 1024 * 1024) -> Dict[str, Any]:
+    """Write the registry's series for the run just finished; returns the run record"""
+    metrics = metrics or registry
+    finished = time.time()
+    run = {
+        'command': command,
+        'timestamp': datetime.fromtimestamp(finished).isoformat(),
+        'finished': round(finished, 3),
+        'duration': round(finished - metrics.started, 3),
+        **metrics.snapshot()
+    }
+    if jsonl_path is not None:
+        jsonl_path = Path(jsonl_path)
+        jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        if jsonl_path.exists() and jsonl_path.stat().st_size > max_bytes:
+            os.replace(jsonl_path, jsonl_path.with_name(jsonl_path.name + '.1'))
+        with open(jsonl_path, 'a') as f:
+            f.write(json.dumps(run, separators=(',', ':')) + '\n')
+    if prometheus_path is not None:
+        prometheus_path = Path(prometheus_path)
+        prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(prometheus_path, prometheus_text(run))
+    return run
+
+def export_configured(command: str, settings: Dict[str, Any], jsonl_path: Path,
+                      prometheus_path: Path) -> Optional[Dict[str, Any]]:
+    """export_run() as the `metrics` section of config.yaml asks
+
+    Returns None when export is disabled, nothing was recorded, or the files
+    cannot be written (a run never fails over its metrics).
+    """
+    if not settings.get('enabled', True) or registry.empty():
+        return None
+    try:
+        return export_run(command, jsonl_path, prometheus_path if settings.get('prometheus', True) else None,
+                          max_bytes=int(settings.get('max_history_mb', 5) * 1024 * 1024))
+    except OSError as e:
+        logger.warning(f"Could not write metrics: {e}")
+        return None
+
+# =============================================================================
+# SUMMARY
+# =============================================================================
+
+def read_runs(path: Path, limit: int = 10) -> List[Dict[str, Any]]:
+    """The last `limit` run records of a JSON-lines history (oldest first)"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    runs = []
+    with open(path, 'r') as f:
+        for line in deque(f, maxlen=limit):
+            try:
+                runs.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by a crash
+    return runs
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-stage time, slowest sources, bytes per host and parse counts of one run"""
+    stages = {}
+    sources = []
+    for entry in run.get('timers', []):
+        if entry['name'] == 'stage_seconds':
+            stage = entry['labels'].get('stage', '')
+            total, calls, longest = stages.get(stage, (0.0, 0, 0.0))
+            stages[stage] = (total + entry['total'], calls + entry['count'], max(longest, entry['max']))
+        elif entry['name'] == 'scrape_seconds':
+            sources.append((entry['labels'].get('source', ''), entry['total']))
+    bytes_fetched = {}
+    parsed = {}
+    for entry in run.get('counters', []):
+        if entry['name'] == 'bytes_fetched_total':
+            host = entry['labels'].get('host', '')
+            bytes_fetched[host] = bytes_fetched.get(host, 0) + entry['value']
+        elif entry['name'].endswith('_parsed_total'):
+            kind = entry['name'][:-len('_parsed_total')]
+            parsed[kind] = parsed.get(kind, 0) + entry['value']
+    return {
+        'command': run.get('command'),
+        'timestamp': run.get('timestamp'),
+        'duration': run.get('duration', 0.0),
+        'stages': {stage: {'seconds': round(total, 3), 'calls': calls, 'max': round(longest, 3)}
+                   for stage, (total, calls, longest) in sorted(stages.items(), key=lambda item: -item[1][0])},
+        'slowest_sources': [(source, round(total, 3)) for source, total in sorted(sources, key=lambda s: -s[1])[:5]],
+        'bytes_fetched': bytes_fetched,
+        'parsed': parsed
+    }
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+MedKitt Processed Ledger
+Records which scraped content each consult has already been checked against,
+so repeated runs on unchanged data skip the analysis entirely.
+
+A row is one (source_id, consult_id, source content hash, consult version).
+When the source content or the consult version changes, the pair is new and
+gets analyzed again. Stored in SQLite (WAL) next to the other processed data.
+"""
+
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger("MedKittUpdater")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+    source_id TEXT NOT NULL,
+    consult_id TEXT NOT NULL,
+    source_hash TEXT NOT NULL,
+    consult_version TEXT NOT NULL,
+    outcome TEXT,
+    processed_at TEXT NOT NULL,
+    PRIMARY KEY (source_id, consult_id, source_hash, consult_version)
+);
+CREATE INDEX IF NOT EXISTS processed_content ON processed (source_id, source_hash);
+"""
+
+def source_hash(raw_data: Dict[str, Any]) -> str:
+    """Hash of scraped data, ignoring the scrape timestamp (as the scraper does)"""
+    content = {k: v for k, v in raw_data.items() if k != 'scraped_at'}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+# =============================================================================
+# PROCESSED LEDGER
+# =============================================================================
+
+class ProcessedLedger:
+    """(source hash, consult version) pairs the updater has already handled"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def seen(self, source_id: str, consult_id: str, source_hash: str, consult_version: str) -> bool:
+        """Whether this consult version was already checked against this content"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM processed WHERE source_id = ? AND consult_id = ? "
+                "AND source_hash = ? AND consult_version = ?",
+                (source_id, consult_id, source_hash, consult_version)
+            ).fetchone()
+        return row is not None
+
+    def seen_content(self, source_id: str, source_hash: str) -> bool:
+        """Whether this content of the source was processed for any consult"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM processed WHERE source_id = ? AND source_hash = ? LIMIT 1",
+                (source_id, source_hash)
+            ).fetchone()
+        return row is not None
+
+    def mark(self, source_id: str, consult_id: str, source_hash: str, consult_version: str,
+             outcome: str = ''):
+        """Record that the pair has been handled"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO processed "
+                    "(source_id, consult_id, source_hash, consult_version, outcome, processed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (source_id, consult_id, source_hash, consult_version, outcome, datetime.now().isoformat())
+                )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+MedKitt PubMed Engine
+Runs every PubMed source search in one pass and fetches article details in
+batches, skipping PMIDs that were already parsed on an earlier run.
+
+Flow:
+    1. esearch per source -> PMID lists. After the first successful run a
+       source only asks for records added (EDAT) since its watermark, and the
+       new PMIDs are merged into the set stored for it.
+    2. epost the union of PMIDs not in the local cache -> WebEnv / query_key
+    3. efetch those PMIDs from the history server in batches of batch_size
+    4. parsed articles are cached on disk keyed by PMID
+
+The Entrez client is injected (Bio.Entrez in production), so the engine can be
+driven by a local stand-in in tests. With a fetch.Retrier, transient E-utility
+failures are retried with backoff under the E-utilities host's circuit breaker.
+"""
+
+import json
+import time
+import logging
+from datetime import date
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger("MedKittScraper")
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+@dataclass
+class PubMedSearch:
+    """Outcome of one source's search"""
+    source_id: str
+    query: str
+    pmids: List[str]
+    articles: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    new_pmids: List[str] = field(default_factory=list)
+    incremental: bool = False
+
+# =============================================================================
+# ARTICLE PARSING
+# =============================================================================
+
+def parse_article(article: Dict) -> Optional[Dict[str, Any]]:
+    """Convert an Entrez PubmedArticle record into the scraper's article dict"""
+    try:
+        medline = article.get('MedlineCitation', {})
+        article_data = medline.get('Article', {})
+        
+        # Extract title
+        title_data = article_data.get('ArticleTitle', '')
+        if isinstance(title_data, list):
+            title = ' '.join([str(t) for t in title_data])
+        else:
+            title = str(title_data)
+        
+        # Extract abstract
+        abstract = ''
+        abstract_data = article_data.get('Abstract', {})
+        if abstract_data:
+            abstract_text = abstract_data.get('AbstractText', [])
+            if isinstance(abstract_text, list):
+                abstract = ' '.join([str(a) for a in abstract_text])
+            else:
+                abstract = str(abstract_text)
+        
+        # Extract authors
+        authors = []
+        for author in article_data.get('AuthorList', [])[:3]:  # First 3 authors
+            last_name = author.get('LastName', '')
+            initials = author.get('Initials', '')
+            if last_name:
+                authors.append(f"{last_name} {initials}")
+        
+        # Extract PMID
+        pmid = medline.get('PMID', '')
+        
+        # Extract publication date
+        pub_date = ''
+        journal_issue = article_data.get('Journal', {}).get('JournalIssue', {})
+        pub_date_data = journal_issue.get('PubDate', {})
+        if pub_date_data:
+            year = pub_date_data.get('Year', '')
+            month = pub_date_data.get('Month', '')
+            pub_date = f"{year} {month}".strip()
+        
+        return {
+            'pmid': str(pmid),
+            'title': title,
+            'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
+            'authors': authors,
+            'publication_date': pub_date,
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+        }
+    except Exception as e:
+        logger.warning(f"Error parsing article: {e}")
+        return None
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+class PubMedEngine:
+    """Batched PubMed retrieval with a PMID -> parsed article cache"""
+    
+    def __init__(self, entrez, cache_path: Path, state_path: Optional[Path] = None,
+                 batch_size: int = 200, request_interval: float = 0.34,
+                 max_new_results: int = 500, retrier=None, host: str = 'eutils.ncbi.nlm.nih.gov'):
+        self.entrez = entrez
+        self.retrier = retrier
+        self.host = host
+        self.cache_path = Path(cache_path)
+        self.state_path = Path(state_path) if state_path else None
+        self.batch_size = batch_size
+        # NCBI allows 3 requests/second without an API key
+        self.request_interval = request_interval
+        # retmax for incremental searches, which should return everything new
+        self.max_new_results = max_new_results
+        self.cache = self._load_json(self.cache_path, 'PubMed cache')
+        self.state = self._load_json(self.state_path, 'PubMed watermarks') if self.state_path else {}
+        self._last_request = 0.0
+    
+    def _load_json(self, path: Path, label: str) -> Dict[str, Any]:
+        if path.exists():
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable {label}: {e}")
+        return {}
+    
+    def _save_json(self, path: Path, payload: Dict[str, Any], indent: Optional[int] = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(payload, f, sort_keys=True, indent=indent)
+    
+    def _call(self, method: str, **params) -> Any:
+        """Call an E-utility (with retries when a retrier is set) and parse the reply"""
+        if self.retrier is None:
+            return self._call_once(method, **params)
+        return self.retrier.call(self.host, lambda: self._call_once(method, **params))
+    
+    def _call_once(self, method: str, **params) -> Any:
+        """One E-utility request, respecting the request interval"""
+        wait = self._last_request + self.request_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            handle = getattr(self.entrez, method)(**params)
+            try:
+                return self.entrez.read(handle)
+            finally:
+                handle.close()
+        finally:
+            self._last_request = time.monotonic()
+    
+    def search(self, source_id: str, source_config: Dict, today: str) -> PubMedSearch:
+        """Run one source's esearch
+        
+        With a watermark for the same query, only records whose Entrez date is
+        on or after the watermark are requested and merged into the stored set.
+        They are requested max_new_results at a time, up to esearch's Count.
+        """
+        query = source_config.get('search_query', '')
+        watermark = self.state.get(source_id, {})
+        incremental = bool(watermark.get('last_run')) and watermark.get('query') == query
+        
+        params = {'db': 'pubmed', 'term': query, 'sort': 'date'}
+        if incremental:
+            params.update(
+                datetype='edat',
+                mindate=watermark['last_run'],
+                maxdate=today,
+                retmax=self.max_new_results
+            )
+            logger.info(f"Searching PubMed: {source_id} - new since {watermark['last_run']}")
+        else:
+            params['retmax'] = source_config.get('max_results', 10)
+            logger.info(f"Searching PubMed: {source_id} - Query: {query[:50]}...")
+        
+        record = self._call('esearch', **params)
+        found = [str(p) for p in record.get('IdList', [])]
+        if incremental:
+            # The watermark moves past every record in the window, so page through all of them
+            total = int(record.get('Count', len(found)))
+            while found and len(found) < total:
+                params['retstart'] = len(found)
+                page = [str(p) for p in self._call('esearch', **params).get('IdList', [])]
+                if not page:
+                    break
+                found.extend(page)
+        
+        if incremental:
+            stored = watermark.get('pmids', [])
+            known = set(stored)
+            new_pmids = [pmid for pmid in found if pmid not in known]
+            pmids = new_pmids + stored
+        else:
+            new_pmids = found
+            pmids = found
+        
+        return PubMedSearch(
+            source_id=source_id,
+            query=query,
+            pmids=pmids,
+            new_pmids=new_pmids,
+            incremental=incremental
+        )
+    
+    def fetch(self, pmids: List[str]):
+        """Fetch and cache articles for PMIDs via the history server"""
+        if not pmids:
+            return
+        
+        posted = self._call('epost', db='pubmed', id=','.join(pmids))
+        webenv, query_key = posted['WebEnv'], posted['QueryKey']
+        
+        for start in range(0, len(pmids), self.batch_size):
+            records = self._call(
+                'efetch',
+                db='pubmed',
+                webenv=webenv,
+                query_key=query_key,
+                retstart=start,
+                retmax=self.batch_size,
+                rettype='abstract',
+                retmode='xml'
+            )
+            for article in records.get('PubmedArticle', []):
+                parsed = parse_article(article)
+                if parsed:
+                    self.cache[parsed['pmid']] = parsed
+        
+        logger.info(f"Fetched {len(pmids)} new PubMed articles in "
+                    f"{(len(pmids) + self.batch_size - 1) // self.batch_size} batches")
+    
+    def run(self, sources: Dict[str, Dict], today: Optional[str] = None) -> Dict[str, PubMedSearch]:
+        """Search all sources, fetch unseen PMIDs once, and attach cached articles"""
+        today = today or date.today().strftime('%Y/%m/%d')
+        searches: Dict[str, PubMedSearch] = {}
+        for source_id, source_config in sources.items():
+            try:
+                searches[source_id] = self.search(source_id, source_config, today)
+            except Exception as e:
+                logger.error(f"Error searching PubMed {source_id}: {e}")
+                searches[source_id] = PubMedSearch(
+                    source_id=source_id,
+                    query=source_config.get('search_query', ''),
+                    pmids=[],
+                    error=str(e)
+                )
+        
+        # Union of PMIDs across sources, in first-seen order
+        missing = list(dict.fromkeys(
+            pmid for search in searches.values() for pmid in search.pmids if pmid not in self.cache
+        ))
+        
+        try:
+            self.fetch(missing)
+        except Exception as e:
+            logger.error(f"Error fetching PubMed articles: {e}")
+            for search in searches.values():
+                if any(pmid in missing for pmid in search.pmids):
+                    search.error = str(e)
+        finally:
+            if missing:
+                self._save_json(self.cache_path, self.cache)
+        
+        for search in searches.values():
+            search.articles = [self.cache[pmid] for pmid in search.pmids if pmid in self.cache]
+            if not search.error:
+                self.state[search.source_id] = {
+                    'query': search.query,
+                    'last_run': today,
+                    'pmids': search.pmids
+                }
+        
+        if self.state_path:
+            self._save_json(self.state_path, self.state, indent=2)
+        return searches
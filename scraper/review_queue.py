@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+MedKitt Review Queue
+SQLite-backed queue of update candidates waiting for manual review.
+
+Queuing an item is one indexed INSERT, whatever the size of the backlog, and
+status queries read one page at a time. An item is only queued once per
+(consult_id, source_id, content_hash), where content_hash is the
+processed_ledger.source_hash() of the scraped content it was derived from, so
+re-analyzing the same scrape does not queue duplicates.
+
+The database runs in WAL mode, so the scheduler can queue items while the
+status command reads. Items in an old data/review_queue.json are imported the
+first time the database is opened.
+"""
+
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger("MedKittUpdater")
+
+PENDING = 'pending_review'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    consult_id TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    change_type TEXT NOT NULL,
+    reason TEXT,
+    proposed_changes TEXT,
+    timestamp TEXT,
+    status TEXT NOT NULL DEFAULT 'pending_review',
+    UNIQUE (consult_id, source_id, content_hash)
+);
+CREATE INDEX IF NOT EXISTS review_items_status ON review_items (status, id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_SUMMARY_COLUMNS = 'id, consult_id, source_id, change_type, reason, timestamp, status'
+
+def changes_hash(proposed_changes: Any) -> str:
+    """Stable hash of a candidate's proposed changes (stands in for the content
+    hash of legacy items, which did not record one)"""
+    payload = json.dumps(proposed_changes, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# =============================================================================
+# REVIEW QUEUE
+# =============================================================================
+
+class ReviewQueue:
+    """Deduplicated, paginated review items in a SQLite database"""
+
+    def __init__(self, path: Path, legacy_file: Optional[Path] = None):
+        self.path = Path(path)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use (so merely building an updater creates nothing)"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        if not self.legacy_file or not self.legacy_file.exists():
+            return
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        try:
+            with open(self.legacy_file, 'r') as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not import {self.legacy_file.name}: {e}")
+            return
+        with conn:
+            for item in items:
+                self._insert(conn, {**item, 'content_hash': item.get('content_hash')
+                                    or changes_hash(item.get('proposed_changes', {}))})
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)", (str(len(items)),))
+        logger.info(f"Imported {len(items)} review items from {self.legacy_file.name}")
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, item: Dict[str, Any]) -> bool:
+        proposed = item.get('proposed_changes', {})
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO review_items "
+            "(consult_id, source_id, content_hash, change_type, reason, proposed_changes, timestamp, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                item['consult_id'], item.get('source_id', ''), item['content_hash'],
+                item.get('change_type', 'minor'), item.get('reason', ''),
+                json.dumps(proposed, default=str), item.get('timestamp', ''),
+                item.get('status', PENDING)
+            )
+        )
+        return cursor.rowcount == 1
+
+    def enqueue(self, item: Dict[str, Any]) -> bool:
+        """Queue an item; returns False if the consult already has an item for
+        the same content of the same source"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                return self._insert(conn, item)
+
+    def count(self, status: Optional[str] = PENDING) -> int:
+        """Number of items with a status (all items for None)"""
+        with self._lock:
+            conn = self._connect()
+            if status is None:
+                return conn.execute("SELECT COUNT(*) FROM review_items").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM review_items WHERE status = ?", (status,)).fetchone()[0]
+
+    def page(self, status: Optional[str] = PENDING, limit: int = 20, offset: int = 0,
+             newest_first: bool = True) -> List[Dict[str, Any]]:
+        """One page of item summaries (without proposed_changes)"""
+        order = 'DESC' if newest_first else 'ASC'
+        where, args = ('WHERE status = ?', [status]) if status is not None else ('', [])
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM review_items {where} ORDER BY id {order} LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        """A single item including its proposed changes"""
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM review_items WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            return None
+        item = dict(row)
+        item['proposed_changes'] = json.loads(item['proposed_changes'] or '{}')
+        return item
+
+    def set_status(self, item_id: int, status: str) -> bool:
+        """Mark an item (e.g. approved, rejected); returns whether it exists"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute("UPDATE review_items SET status = ? WHERE id = ?", (status, item_id))
+        return cursor.rowcount == 1
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -5,9 +5,19 @@ Manages scheduled runs of the scraping and update pipeline.
 
 Usage:
     python scraper/scheduler.py --run-now      # Run immediately
+    python scraper/scheduler.py --run-now --due  # Run only sources that are due
     python scraper/scheduler.py --daemon       # Run as scheduled daemon
     python scraper/scheduler.py --cron         # Print crontab entry
     python scraper/scheduler.py --status       # Check last run status
+    python scraper/scheduler.py --run-now --subprocess  # Run each step in its own interpreter
+
+By default the scraper and updater run inside the scheduler process. The
+scraper (HTTP session, browser fetcher, Entrez client) and updater are created
+once and reused for every run of the daemon.
+
+Each source is checked on its own check_frequency (hourly/daily/weekly/
+monthly); the daemon wakes every minute and runs only the sources that are
+due, highest priority and most overdue first.
 """
 
 import os
@@ -19,17 +29,12 @@ import logging
 import subprocess
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, asdict
 
-import yaml
-
-# Try to import schedule module
-try:
-    import schedule
-    SCHEDULE_AVAILABLE = True
-except ImportError:
-    SCHEDULE_AVAILABLE = False
+from source_schedule import SourceSchedule
+from config_loader import load_config
+import metrics
 
 # =============================================================================
 # CONFIGURATION
@@ -41,22 +46,24 @@ DATA_DIR = BASE_DIR / "scraper" / "data"
 STATUS_FILE = DATA_DIR / "scheduler_status.json"
 LOGS_DIR = BASE_DIR / "scraper" / "logs"
 PID_FILE = DATA_DIR / "scheduler.pid"
+SOURCE_SCHEDULE_FILE = DATA_DIR / "source_schedule.json"
+METRICS_FILE = DATA_DIR / "metrics.jsonl"
+PROMETHEUS_FILE = DATA_DIR / "metrics.prom"
 
-# Ensure directories exist
-for d in [DATA_DIR, LOGS_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOGS_DIR / f"scheduler_{datetime.now():%Y%m%d}.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("MedKittScheduler")
 
+def setup_logging(log_file: bool = True):
+    """Log to the console and, for pipeline runs, to the day's file in LOGS_DIR"""
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
+        handlers.insert(0, logging.FileHandler(LOGS_DIR / f"scheduler_{datetime.now():%Y%m%d}.log"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
 # =============================================================================
 # SCHEDULER CLASS
 # =============================================================================
@@ -65,14 +72,17 @@ class MedKittScheduler:
     """Manages scheduled execution of the scraper pipeline"""
     
     def __init__(self, config_path: str = None):
-        self.config = self._load_config(config_path or CONFIG_PATH)
+        self.config = load_config(config_path or CONFIG_PATH)
         self.status = self._load_status()
-        self.scheduler = schedule if SCHEDULE_AVAILABLE else None
-    
-    def _load_config(self, path: Path) -> Dict:
-        """Load YAML configuration"""
-        with open(path, 'r') as f:
-            return yaml.safe_load(f)
+        self.in_process = self.config.get('scheduler', {}).get('in_process', True)
+        # Created on first in-process run and kept warm for later runs
+        self._scraper = None
+        self._updater = None
+        self.source_schedule = SourceSchedule(
+            self.config.get('sources', {}),
+            SOURCE_SCHEDULE_FILE,
+            run_time=self.config.get('scheduler', {}).get('daily_run_time', '02:00')
+        )
     
     def _load_status(self) -> Dict:
         """Load scheduler status"""
@@ -91,6 +101,7 @@ class MedKittScheduler:
     
     def _save_status(self):
         """Save scheduler status"""
+        STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
         with open(STATUS_FILE, 'w') as f:
             json.dump(self.status, f, indent=2)
     
@@ -121,8 +132,9 @@ class MedKittScheduler:
         
         self._save_status()
     
-    def run_pipeline(self, dry_run: bool = False) -> Dict[str, Any]:
-        """Execute the full scraping and update pipeline"""
+    def run_pipeline(self, dry_run: bool = False, source_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Execute the scraping and update pipeline for all sources, or just source_ids"""
+        source_ids = list(source_ids) if source_ids is not None else list(self.config.get('sources', {}))
         result = {
             'success': False,
             'timestamp': datetime.now().isoformat(),
@@ -135,37 +147,63 @@ class MedKittScheduler:
         logger.info("=" * 60)
         logger.info("STARTING MEDKITT SCRAPING PIPELINE")
         logger.info("=" * 60)
+        # In-process steps record into this process's registry; subprocess steps export their own
+        metrics.reset()
         
         try:
             # Step 1: Run scraper
             logger.info("Step 1: Running scraper...")
-            scrape_result = self._run_scraper()
+            if self.in_process:
+                scrape_result = self._run_scraper_in_process(source_ids)
+            else:
+                scrape_result = self._run_scraper(source_ids)
             
             if scrape_result['success']:
                 result['sources_processed'] = scrape_result.get('count', 0)
                 result['changes_detected'] = scrape_result.get('changes', 0)
+                if 'changed' in scrape_result:
+                    result['changed_sources'] = scrape_result['changed']
                 logger.info(f"Scraper completed: {result['sources_processed']} sources, {result['changes_detected']} changes")
+                self.source_schedule.mark_run(source_ids, failed=scrape_result.get('failed', []))
             else:
                 result['errors'].append(f"Scraper failed: {scrape_result.get('error')}")
                 logger.error(f"Scraper failed: {scrape_result.get('error')}")
+                # Retry after RETRY_DELAY rather than on every daemon tick
+                self.source_schedule.mark_run(source_ids, failed=source_ids)
             
-            # Step 2: Run updater (only if scraper found changes or we're not in dry-run)
-            if not dry_run and (result['changes_detected'] > 0 or scrape_result['success']):
-                logger.info("Step 2: Running updater...")
-                update_result = self._run_updater(dry_run=dry_run)
-                
-                if update_result['success']:
-                    result['updates_applied'] = update_result.get('updated', 0)
-                    logger.info(f"Updater completed: {result['updates_applied']} updates applied")
+            # Step 2: Run updater on the sources whose content is not processed yet
+            updated_paths = None
+            if not dry_run and scrape_result['success']:
+                pending = None
+                if self.in_process:
+                    updater = self._get_updater()
+                    pending = [r for r in scrape_result['results'] if updater.needs_processing(r)]
+                if pending == []:
+                    logger.info("Step 2: All scraped content already processed, skipping updater")
                 else:
-                    result['errors'].append(f"Updater failed: {update_result.get('error')}")
-                    logger.error(f"Updater failed: {update_result.get('error')}")
+                    logger.info("Step 2: Running updater...")
+                    if self.in_process:
+                        update_result = self._run_updater_in_process(dry_run=dry_run, scrape_results=pending)
+                    else:
+                        # The updater process consults the ledger itself
+                        update_result = self._run_updater(dry_run=dry_run)
+                    
+                    if update_result['success']:
+                        result['updates_applied'] = update_result.get('updated', 0)
+                        updated_paths = update_result.get('results', {}).get('updated_paths')
+                        logger.info(f"Updater completed: {result['updates_applied']} updates applied")
+                    else:
+                        result['errors'].append(f"Updater failed: {update_result.get('error')}")
+                        logger.error(f"Updater failed: {update_result.get('error')}")
             
             # Step 3: Commit changes (if enabled and updates were applied)
             if not dry_run and result['updates_applied'] > 0:
                 if self.config.get('notifications', {}).get('github', {}).get('auto_commit', False):
                     logger.info("Step 3: Committing changes...")
-                    commit_result = self._run_commit()
+                    if self.in_process:
+                        commit_result = self._run_commit_in_process(updated_paths)
+                    else:
+                        commit_result = self._run_commit()
                     if commit_result['success']:
                         logger.info("Changes committed successfully")
                     else:
@@ -179,6 +217,7 @@ class MedKittScheduler:
         
         # Update status
         self._update_status(result)
+        metrics.export_configured('pipeline', self.config.get('metrics', {}), METRICS_FILE, PROMETHEUS_FILE)
         
         # Send notification if changes detected
         if result['changes_detected'] > 0:
@@ -190,11 +229,70 @@ class MedKittScheduler:
         
         return result
     
-    def _run_scraper(self) -> Dict[str, Any]:
+    def _get_scraper(self):
+        """Scraper instance shared by in-process runs"""
+        if self._scraper is None:
+            from service import MedKittScraper
+            self._scraper = MedKittScraper()
+        return self._scraper
+    
+    def close(self):
+        """Close the shared scraper's browser sessions and HTTP connections, if it was created"""
+        if self._scraper is not None:
+            self._scraper.close()
+            self._scraper = None
+    
+    def _get_updater(self):
+        """Updater instance shared by in-process runs"""
+        if self._updater is None:
+            from updater import MedKittUpdater
+            self._updater = MedKittUpdater()
+        return self._updater
+    
+    def _run_scraper_in_process(self, source_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Run the scraper in this process, keeping the ScrapeResult objects"""
+        try:
+            results = self._get_scraper().scrape_all(source_ids=source_ids)
+            return {
+                'success': True,
+                'count': sum(1 for r in results if r.status in ('success', 'unchanged')),
+                'changes': sum(1 for r in results if r.change_detected),
+                'changed': [r.source_id for r in results if r.change_detected],
+                'failed': [r.source_id for r in results if r.status == 'error'],
+                'results': results
+            }
+        except Exception as e:
+            logger.exception("Scraper failed")
+            return {'success': False, 'error': str(e)}
+    
+    def _run_updater_in_process(self, dry_run: bool = False, scrape_results=None) -> Dict[str, Any]:
+        """Run the updater in this process on the scraper's results"""
+        try:
+            results = self._get_updater().process_all_sources(dry_run=dry_run, scrape_results=scrape_results)
+            return {
+                'success': True,
+                'updated': results['auto_updated'],
+                'results': results
+            }
+        except Exception as e:
+            logger.exception("Updater failed")
+            return {'success': False, 'error': str(e)}
+    
+    def _run_commit_in_process(self, paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Commit changes to git from this process (only paths, when given)"""
+        try:
+            return {'success': self._get_updater().commit_changes(paths=paths)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def _run_scraper(self, source_ids: Optional[List[str]] = None) -> Dict[str, Any]:
         """Run the scraper service"""
         try:
+            cmd = [sys.executable, 'scraper/service.py', '--all']
+            if source_ids is not None:
+                cmd += ['--only', ','.join(source_ids)]
             result = subprocess.run(
-                [sys.executable, 'scraper/service.py', '--all'],
+                cmd,
                 cwd=BASE_DIR,
                 capture_output=True,
                 text=True,
@@ -204,9 +302,10 @@ class MedKittScheduler:
             # Parse output for summary
             output = result.stdout + result.stderr
             
-            # Extract counts from output
+            # Extract counts and failed sources from output
             success_count = 0
             change_count = 0
+            failed = []
             
             for line in output.split('\n'):
                 if 'Successful:' in line:
@@ -219,11 +318,14 @@ class MedKittScheduler:
                         change_count = int(line.split(':')[1].strip())
                     except:
                         pass
+                if line.startswith('Failed sources:'):
+                    failed = [s for s in line.split(':', 1)[1].strip().split(',') if s]
             
             return {
                 'success': result.returncode == 0,
                 'count': success_count,
                 'changes': change_count,
+                'failed': failed,
                 'output': output
             }
             
@@ -376,31 +478,16 @@ Please review the changes in the GitHub repository or review queue.
         except Exception as e:
             logger.error(f"Failed to send Slack notification: {e}")
     
-    def schedule_daily_run(self, run_time: str = None):
-        """Schedule the pipeline to run daily at specified time"""
-        if not SCHEDULE_AVAILABLE:
-            logger.error("Schedule module not available. Install with: pip install schedule")
-            return False
-        
-        scheduler_config = self.config.get('scheduler', {})
-        daily_time = run_time or scheduler_config.get('daily_run_time', '02:00')
-        
-        logger.info(f"Scheduling daily run at {daily_time}")
-        
-        # Parse time
-        hour, minute = map(int, daily_time.split(':'))
-        
-        # Schedule the job
-        self.scheduler.every().day.at(daily_time).do(self.run_pipeline)
-        
-        return True
+    def run_due(self, dry_run: bool = False, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Run the pipeline for the sources that are due, if any"""
+        due = self.source_schedule.due(now)
+        if not due:
+            return None
+        logger.info(f"Sources due: {', '.join(due)}")
+        return self.run_pipeline(dry_run=dry_run, source_ids=due)
     
     def run_daemon(self):
         """Run as a daemon process"""
-        if not SCHEDULE_AVAILABLE:
-            logger.error("Schedule module not available")
-            return
-        
         # Check if already running
         if PID_FILE.exists():
             try:
@@ -412,25 +499,21 @@ Please review the changes in the GitHub repository or review queue.
                 pass  # Process not running, continue
         
         # Write PID file
+        PID_FILE.parent.mkdir(parents=True, exist_ok=True)
         PID_FILE.write_text(str(os.getpid()))
         
         try:
-            # Schedule daily run
-            self.schedule_daily_run()
-            
             logger.info("Scheduler daemon started")
             
-            # Run immediately on startup
-            self.run_pipeline()
-            
-            # Keep running
+            # Sources never run (or overdue) are due on startup
             while True:
-                self.scheduler.run_pending()
+                self.run_due()
                 time.sleep(60)  # Check every minute
                 
         except KeyboardInterrupt:
             logger.info("Scheduler stopped by user")
         finally:
+            self.close()
             if PID_FILE.exists():
                 PID_FILE.unlink()
     
@@ -440,12 +523,11 @@ Please review the changes in the GitHub repository or review queue.
         daily_time = scheduler_config.get('daily_run_time', '02:00')
         timezone = scheduler_config.get('timezone', 'America/Chicago')
         
-        hour, minute = daily_time.split(':')
-        
-        cron_line = f"{minute} {hour} * * * cd {BASE_DIR} && {sys.executable} scraper/scheduler.py --run-now >> scraper/logs/cron.log 2>&1"
+        # Hourly, so hourly sources are honoured; each run only scrapes due sources
+        cron_line = f"0 * * * * cd {BASE_DIR} && {sys.executable} scraper/scheduler.py --run-now --due >> scraper/logs/cron.log 2>&1"
         
         print("\n" + "=" * 60)
-        print("CRONTAB ENTRY (runs daily at 2 AM)")
+        print(f"CRONTAB ENTRY (checks hourly; daily sources run at {daily_time})")
         print("=" * 60)
         print(f"# MedKitt Scraper - Timezone: {timezone}")
         print(cron_line)
@@ -461,11 +543,13 @@ Please review the changes in the GitHub repository or review queue.
         status['pid_file_exists'] = PID_FILE.exists()
         status['scheduler_config'] = self.config.get('scheduler', {})
         status['next_scheduled_run'] = None
+        status['sources'] = self.source_schedule.summary()
+        runs = metrics.read_runs(METRICS_FILE, limit=1)
+        status['metrics'] = metrics.summarize(runs[-1]) if runs else None
         
-        if SCHEDULE_AVAILABLE and self.scheduler:
-            next_run = self.scheduler.next_run()
-            if next_run:
-                status['next_scheduled_run'] = next_run.isoformat()
+        next_run = self.source_schedule.next_wakeup()
+        if next_run:
+            status['next_scheduled_run'] = None if next_run == datetime.min else next_run.isoformat()
         
         return status
 
@@ -480,10 +564,15 @@ def main():
     parser.add_argument('--cron', action='store_true', help='Print crontab entry')
     parser.add_argument('--status', action='store_true', help='Show scheduler status')
     parser.add_argument('--dry-run', action='store_true', help='Run without applying changes')
+    parser.add_argument('--due', action='store_true', help='With --run-now, only run sources that are due')
+    parser.add_argument('--subprocess', action='store_true', help='Run each pipeline step in a separate interpreter')
     
     args = parser.parse_args()
     
+    setup_logging(log_file=bool(args.run_now or args.daemon))
     scheduler = MedKittScheduler()
+    if args.subprocess:
+        scheduler.in_process = False
     
     if args.status:
         status = scheduler.get_status()
@@ -499,6 +588,31 @@ def main():
         if status.get('last_error'):
             print(f"Last error: {status['last_error']}")
         
+        print(f"Next scheduled run: {status.get('next_scheduled_run') or 'Now'}")
+        
+        if status.get('sources'):
+            print("\nSources:")
+            for row in status['sources']:
+                next_due = (row['next_due'] or 'due now')[:16]
+                print(f"  {row['source_id']:<28} {row['priority']:<9} {row['check_frequency']:<8} next: {next_due}")
+        
+        if status.get('metrics'):
+            summary = status['metrics']
+            print(f"\nLast run timings ({summary['command']}, {(summary['timestamp'] or '')[:16]}, "
+                  f"{summary['duration']:.1f}s):")
+            for stage, timing in summary['stages'].items():
+                print(f"  {stage:<12} {timing['seconds']:>8.2f}s  {timing['calls']:>5} calls  "
+                      f"max {timing['max']:.2f}s")
+            if summary['slowest_sources']:
+                print("  Slowest sources: " + ', '.join(f"{source} ({seconds:.1f}s)"
+                                                         for source, seconds in summary['slowest_sources']))
+            if summary['bytes_fetched']:
+                print("  Fetched: " + ', '.join(f"{host} {size / 1024:.0f} KiB"
+                                                for host, size in sorted(summary['bytes_fetched'].items())))
+            if summary['parsed']:
+                print("  Parsed: " + ', '.join(f"{int(total)} {kind}"
+                                               for kind, total in sorted(summary['parsed'].items())))
+        
         if status.get('runs'):
             print("\nRecent runs:")
             for run in status['runs'][-5:]:
@@ -514,8 +628,18 @@ def main():
         scheduler.run_daemon()
     
     elif args.run_now:
-        print("Running pipeline now...")
-        result = scheduler.run_pipeline(dry_run=args.dry_run)
+        try:
+            if args.due:
+                print("Running due sources now...")
+                result = scheduler.run_due(dry_run=args.dry_run)
+            else:
+                print("Running pipeline now...")
+                result = scheduler.run_pipeline(dry_run=args.dry_run)
+        finally:
+            scheduler.close()
+        if result is None:
+            print("No sources are due")
+            return
         
         print("\n" + "=" * 60)
         print("RESULT")
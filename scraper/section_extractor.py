@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+MedKitt Section Extractor
+Streams an HTML page through the standard library HTMLParser and splits its
+content into ordered sections, one per heading, each with its own hash.
+
+Only simple selectors are understood for scoping (`tag`, `.class`, `#id`,
+`tag.class`), which covers the CDC source configuration. Content is taken from
+the outermost elements matching the content selectors, or from the whole body
+when none match. Script, style and navigation chrome are skipped.
+
+Sections let change detection compare only the parts of a long guideline page
+whose hash changed, and report which sections those were.
+"""
+
+import re
+import hashlib
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+HEADINGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+SKIPPED = {'script', 'style', 'noscript', 'template', 'svg', 'nav', 'header', 'footer'}
+VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+        'param', 'source', 'track', 'wbr'}
+BLOCKS = HEADINGS | {'p', 'div', 'li', 'ul', 'ol', 'section', 'article', 'table', 'tr',
+                     'td', 'th', 'br', 'dd', 'dt', 'blockquote', 'main'}
+
+_WS_RE = re.compile(r'\s+')
+
+# =============================================================================
+# SELECTORS
+# =============================================================================
+
+_SIMPLE_SELECTOR_RE = re.compile(r'^([a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)$')
+
+def _compile_selector(selector: str) -> Optional[Callable[[str, Dict[str, str]], bool]]:
+    """Matcher for a simple selector, or None if the selector is not simple"""
+    m = _SIMPLE_SELECTOR_RE.match(selector.strip())
+    if not m or not selector.strip():
+        return None
+    tag = m.group(1).lower() if m.group(1) else None
+    parts = re.findall(r'([.#])([\w-]+)', m.group(2))
+    classes = {name for kind, name in parts if kind == '.'}
+    ids = {name for kind, name in parts if kind == '#'}
+
+    def matches(element_tag: str, attrs: Dict[str, str]) -> bool:
+        if tag and element_tag != tag:
+            return False
+        if classes and not classes <= set((attrs.get('class') or '').split()):
+            return False
+        if ids and attrs.get('id') not in ids:
+            return False
+        return True
+
+    return matches
+
+def _selector_list(selectors: Union[str, Iterable[str]]) -> List[str]:
+    if isinstance(selectors, str) or not selectors:
+        selectors = (selectors or '').split(',')
+    return [sel.strip() for sel in selectors if sel.strip()]
+
+def compile_selectors(selectors: Union[str, Iterable[str]]) -> List[Callable[[str, Dict[str, str]], bool]]:
+    """Matchers for a comma-separated or pre-split selector list (non-simple selectors are ignored)"""
+    compiled = [_compile_selector(sel) for sel in _selector_list(selectors)]
+    return [matcher for matcher in compiled if matcher]
+
+def unsupported_selectors(selectors: Union[str, Iterable[str]]) -> List[str]:
+    """The selectors of a list that compile_selectors() would ignore"""
+    return [sel for sel in _selector_list(selectors) if _compile_selector(sel) is None]
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+@dataclass
+class Section:
+    """Text under one heading"""
+    heading: str
+    level: int
+    text: str
+    hash: str = ''
+
+    def to_dict(self) -> Dict[str, object]:
+        return {'heading': self.heading, 'level': self.level, 'text': self.text, 'hash': self.hash}
+
+@dataclass
+class ExtractedPage:
+    """Everything pulled out of one page in a single parse"""
+    title: str = ''
+    sections: List[Section] = field(default_factory=list)
+    tables: List[List[List[str]]] = field(default_factory=list)
+    last_updated: Optional[str] = None
+    scoped: bool = False  # whether any content selector matched
+
+    @property
+    def content(self) -> str:
+        return '\n\n'.join(
+            f"{section.heading}\n{section.text}" if section.heading else section.text
+            for section in self.sections
+        ).strip()
+
+# =============================================================================
+# EXTRACTOR
+# =============================================================================
+
+def section_hash(heading: str, text: str) -> str:
+    return hashlib.sha256(f"{heading}\n{text}".encode('utf-8')).hexdigest()[:16]
+
+class SectionExtractor(HTMLParser):
+    """Incremental HTML to sections/tables parser; call feed() as data arrives"""
+
+    def __init__(self, content_selectors: Union[str, List[str]] = '',
+                 table_selectors: Union[str, List[str]] = 'table',
+                 update_selectors: Union[str, List[str]] = ''):
+        super().__init__(convert_charrefs=True)
+        self.content_matchers = compile_selectors(content_selectors)
+        self.table_matchers = compile_selectors(table_selectors) or compile_selectors('table')
+        self.update_matchers = compile_selectors(update_selectors)
+
+        self.page = ExtractedPage()
+        self._stack: List[Tuple[str, bool]] = []  # (tag, opened a scope/skip/capture)
+        self._scope_depth = 0        # open elements matching a content selector
+        self._skip_depth = 0         # open script/style/nav elements
+        self._in_title = False
+        self._title_parts: List[str] = []
+
+        # Sections collect both scoped and unscoped text; unscoped is only
+        # used if no content selector matches anywhere on the page
+        self._sections = {True: [], False: []}
+        self._current = {True: None, False: None}
+        self._heading_parts: Optional[List[str]] = None
+        self._heading_level = 0
+
+        self._table_depth = 0
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._table: Optional[List[List[str]]] = None
+
+        self._update_parts: Optional[List[str]] = None
+        self._update_depth = 0
+
+    # -- section bookkeeping ------------------------------------------------
+
+    def _open_section(self, scoped: bool, heading: str, level: int):
+        section = {'heading': heading, 'level': level, 'parts': []}
+        self._sections[scoped].append(section)
+        self._current[scoped] = section
+
+    def _append_text(self, text: str):
+        targets = [False] + ([True] if self._scope_depth else [])
+        for scoped in targets:
+            if self._current[scoped] is None:
+                self._open_section(scoped, '', 0)
+            self._current[scoped]['parts'].append(text)
+
+    def _break(self):
+        for scoped in (True, False):
+            section = self._current[scoped]
+            if section is not None and section['parts'] and section['parts'][-1] != '\n':
+                section['parts'].append('\n')
+
+    # -- HTMLParser callbacks -----------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if tag in VOID:
+            if tag == 'br':
+                self._break()
+            return
+
+        flags = 0
+        if tag in SKIPPED:
+            self._skip_depth += 1
+            flags |= 1
+        elif self.content_matchers and any(m(tag, attrs) for m in self.content_matchers):
+            self._scope_depth += 1
+            self.page.scoped = True
+            flags |= 2
+        if self._update_parts is None and self.page.last_updated is None and \
+                any(m(tag, attrs) for m in self.update_matchers):
+            self._update_parts = []
+            self._update_depth = len(self._stack) + 1
+        self._stack.append((tag, flags))
+
+        if tag == 'title':
+            self._in_title = True
+        elif tag in HEADINGS and not self._skip_depth:
+            self._heading_parts = []
+            self._heading_level = int(tag[1])
+        elif tag == 'table' and any(m(tag, attrs) for m in self.table_matchers):
+            if self._table_depth == 0:
+                self._table = []
+            self._table_depth += 1
+        elif tag == 'tr' and self._table is not None:
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+
+        if tag in BLOCKS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in VOID:
+            return
+        # Close up to the matching open tag (tolerates unclosed <p>, <li>, ...)
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._close(*self._stack.pop())
+
+    def _close(self, tag, flags):
+        if flags & 1:
+            self._skip_depth -= 1
+        if flags & 2:
+            self._scope_depth -= 1
+
+        if self._update_parts is not None and len(self._stack) + 1 == self._update_depth:
+            self.page.last_updated = _WS_RE.sub(' ', ''.join(self._update_parts)).strip() or None
+            self._update_parts = None
+
+        if tag == 'title':
+            self._in_title = False
+            self.page.title = _WS_RE.sub(' ', ''.join(self._title_parts)).strip()
+        elif tag in HEADINGS and self._heading_parts is not None:
+            heading = _WS_RE.sub(' ', ''.join(self._heading_parts)).strip()
+            self._heading_parts = None
+            if heading:
+                targets = [False] + ([True] if self._scope_depth else [])
+                for scoped in targets:
+                    self._open_section(scoped, heading, self._heading_level)
+        elif tag in ('td', 'th') and self._cell is not None:
+            self._row.append(_WS_RE.sub(' ', ''.join(self._cell)).strip())
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._row:
+                self._table.append(self._row)
+            self._row = None
+        elif tag == 'table' and self._table_depth:
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                if self._table:
+                    self.page.tables.append(self._table)
+                self._table = None
+
+        if tag in BLOCKS:
+            self._break()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+            return
+        if self._skip_depth:
+            return
+        if self._update_parts is not None:
+            self._update_parts.append(data)
+        if self._cell is not None:
+            self._cell.append(data)
+        if self._heading_parts is not None:
+            self._heading_parts.append(data)
+            return
+        if data.strip():
+            self._append_text(data)
+
+    # -- results ------------------------------------------------------------
+
+    def finish(self) -> ExtractedPage:
+        """Flush the parser and return the extracted page"""
+        self.close()
+        while self._stack:
+            self._close(*self._stack.pop())
+
+        scoped = self.page.scoped
+        sections = []
+        for raw in self._sections[scoped]:
+            lines = (_WS_RE.sub(' ', line).strip() for line in ''.join(raw['parts']).split('\n'))
+            text = '\n'.join(line for line in lines if line)
+            if not text and not raw['heading']:
+                continue
+            sections.append(Section(raw['heading'], raw['level'], text, section_hash(raw['heading'], text)))
+        self.page.sections = sections
+        return self.page
+
+def extract_sections(chunks: Iterable[str], content_selectors: str = '', table_selectors: str = 'table',
+                     update_selectors: str = '') -> ExtractedPage:
+    """Parse HTML from an iterable of text chunks"""
+    extractor = SectionExtractor(content_selectors, table_selectors, update_selectors)
+    for chunk in chunks:
+        if chunk:
+            extractor.feed(chunk)
+    return extractor.finish()
+
+# =============================================================================
+# SECTION DIFF
+# =============================================================================
+
+def _keyed(sections: List[Dict]) -> Dict[Tuple[str, int], Dict]:
+    """Sections keyed by (heading, occurrence) so repeated headings stay distinct"""
+    seen: Dict[str, int] = {}
+    keyed = {}
+    for section in sections:
+        heading = section.get('heading', '')
+        keyed[(heading, seen.get(heading, 0))] = section
+        seen[heading] = seen.get(heading, 0) + 1
+    return keyed
+
+def diff_sections(old_sections: List[Dict], new_sections: List[Dict],
+                  score: Callable[[str, str], float]) -> Tuple[List[Dict[str, str]], float]:
+    """Changed sections and the overall change fraction
+
+    Only sections whose hash differs are scored; the result is the
+    length-weighted mean of per-section scores (added/removed count as 1.0).
+    """
+    old = _keyed(old_sections)
+    new = _keyed(new_sections)
+    changed = []
+    weighted = 0.0
+    total = 0
+
+    for key in list(new) + [key for key in old if key not in new]:
+        before, after = old.get(key), new.get(key)
+        weight = max(len((before or {}).get('text', '')), len((after or {}).get('text', '')), 1)
+        total += weight
+        if before and after and before.get('hash') == after.get('hash'):
+            continue
+        if before is None:
+            change, fraction = 'added', 1.0
+        elif after is None:
+            change, fraction = 'removed', 1.0
+        else:
+            change, fraction = 'modified', score(before.get('text', ''), after.get('text', ''))
+        weighted += fraction * weight
+        changed.append({'heading': key[0], 'change': change})
+
+    return changed, (weighted / total if total else 0.0)
@@ -15,25 +15,33 @@ import json
 import hashlib
 import logging
 import argparse
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, Tuple, TYPE_CHECKING
+from dataclasses import dataclass, asdict, field
 from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import codecs
+import threading
 import time
 import re
 
-import yaml
-import requests
-from Bio import Entrez
+from change_scoring import build_scorer
+from snapshot_store import SnapshotStore
+from pubmed_engine import PubMedEngine
+from keyword_matcher import KeywordMatcher
+from browser_pool import BrowserPool
+from config_loader import load_config, source_handler, split_selectors
+from fetch import Retrier
+from section_extractor import Section, SectionExtractor, diff_sections, section_hash, unsupported_selectors
+import metrics
 
-# Try to import Scrapling
-try:
-    from scrapling.fetchers import StealthyFetcher
-    SCRAPLING_AVAILABLE = True
-except ImportError:
-    SCRAPLING_AVAILABLE = False
-    print("Warning: Scrapling not available. Install with: pip install scrapling")
+# requests, Bio.Entrez and Scrapling are imported on first use, so
+# importing this module (tests, --list-sources, the scheduler) stays cheap
+if TYPE_CHECKING:
+    import requests
+    from transport import Transport
 
 # =============================================================================
 # CONFIGURATION & SETUP
@@ -42,25 +50,60 @@ except ImportError:
 BASE_DIR = Path(__file__).parent.parent
 CONFIG_PATH = BASE_DIR / "scraper" / "config.yaml"
 DATA_DIR = BASE_DIR / "scraper" / "data"
-RAW_DIR = DATA_DIR / "raw"
+RAW_DIR = DATA_DIR / "raw"  # legacy timestamped snapshots
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"
 HASHES_DIR = DATA_DIR / "hashes"
+VALIDATORS_FILE = DATA_DIR / "http_validators.json"
+FETCH_ROUTES_FILE = DATA_DIR / "fetch_routes.json"
+PUBMED_CACHE_FILE = DATA_DIR / "pubmed_cache.json"
+PUBMED_WATERMARKS_FILE = DATA_DIR / "pubmed_watermarks.json"
+METRICS_FILE = DATA_DIR / "metrics.jsonl"
+PROMETHEUS_FILE = DATA_DIR / "metrics.prom"
 LOGS_DIR = BASE_DIR / "scraper" / "logs"
 
-# Ensure directories exist
-for d in [RAW_DIR, HASHES_DIR, LOGS_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
+# PubMed sources are configured with the pubmed.ncbi.nlm.nih.gov URL, but all
+# traffic actually goes to the E-utilities host
+EUTILS_HOST = "eutils.ncbi.nlm.nih.gov"
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOGS_DIR / f"scraper_{datetime.now():%Y%m%d_%H%M%S}.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("MedKittScraper")
 
+def setup_logging(log_file: bool = True):
+    """Log to the console and, for runs that scrape, to a timestamped file in LOGS_DIR"""
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
+        handlers.insert(0, logging.FileHandler(LOGS_DIR / f"scraper_{datetime.now():%Y%m%d_%H%M%S}.log"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+_UNSET = object()  # lazily created, not built yet
+_scrapling_fetchers: Any = _UNSET
+
+def scrapling_fetchers() -> Optional[Tuple[Any, Any]]:
+    """(StealthyFetcher, StealthySession or None), or None if Scrapling is not installed
+
+    Scrapling pulls in the whole browser stack, so it is only imported when
+    the first page may need rendering.
+    """
+    global _scrapling_fetchers
+    if _scrapling_fetchers is _UNSET:
+        try:
+            from scrapling.fetchers import StealthyFetcher
+        except ImportError:
+            logger.warning("Scrapling not available. Install with: pip install scrapling")
+            _scrapling_fetchers = None
+        else:
+            try:
+                # Persistent browser sessions (Scrapling 0.3+)
+                from scrapling.fetchers import StealthySession
+            except ImportError:
+                StealthySession = None
+            _scrapling_fetchers = (StealthyFetcher, StealthySession)
+    return _scrapling_fetchers
+
 # =============================================================================
 # DATA CLASSES
 # =============================================================================
@@ -79,6 +122,7 @@ class ScrapeResult:
     error: Optional[str] = None
     change_detected: bool = False
     change_percentage: float = 0.0
+    changed_sections: List[Dict[str, str]] = field(default_factory=list)  # {'heading', 'change'}
     
 @dataclass
 class ChangeReport:
@@ -91,6 +135,57 @@ class ChangeReport:
     summary: str
     raw_changes: Dict[str, Any]
     timestamp: str
+    changed_sections: List[Dict[str, str]] = field(default_factory=list)
+
+# =============================================================================
+# POLITENESS
+# =============================================================================
+
+class DomainThrottle:
+    """Per-host politeness budget: up to N requests in flight per host (default 1),
+    with request starts spaced by that host's delay"""
+    
+    def __init__(self, default_delay: float, domain_delays: Optional[Dict[str, float]] = None,
+                 domain_concurrency: Optional[Dict[str, int]] = None):
+        self.default_delay = default_delay
+        self.domain_delays = domain_delays or {}
+        self.domain_concurrency = domain_concurrency or {}
+        self._lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_allowed: Dict[str, float] = {}
+    
+    def delay_for(self, host: str) -> float:
+        """Delay between consecutive requests to a host"""
+        return float(self.domain_delays.get(host, self.default_delay))
+    
+    def concurrency_for(self, host: str) -> int:
+        """Requests allowed in flight at once for a host"""
+        return max(1, int(self.domain_concurrency.get(host, 1)))
+    
+    @contextmanager
+    def slot(self, host: str):
+        """Hold one of the host's slots for the duration of a request"""
+        with self._lock:
+            host_slots = self._host_slots.get(host)
+            if host_slots is None:
+                host_slots = self._host_slots[host] = threading.BoundedSemaphore(self.concurrency_for(host))
+        
+        with host_slots:
+            # Reserve a start time so concurrent requests are still spaced out
+            with self._lock:
+                start = max(time.monotonic(), self._next_allowed.get(host, 0.0))
+                self._next_allowed[host] = start + self.delay_for(host)
+            wait = start - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._next_allowed[host] = max(
+                        self._next_allowed.get(host, 0.0),
+                        time.monotonic() + self.delay_for(host)
+                    )
 
 # =============================================================================
 # SCRAPER CLASS
@@ -100,33 +195,129 @@ class MedKittScraper:
     """Main scraper class using Scrapling for content extraction"""
     
     def __init__(self, config_path: str = None):
-        self.config = self._load_config(config_path or CONFIG_PATH)
-        self.fetcher = None
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': self.config['scraper']['user_agent']
-        })
-        
-        if SCRAPLING_AVAILABLE:
-            self.fetcher = StealthyFetcher(
-                adaptive=True,
-                headless=True
-            )
-            logger.info("Scrapling StealthyFetcher initialized")
-        
-        # Set up PubMed
-        Entrez.email = "medkitt-research@example.com"
-        Entrez.tool = "MedKittScraper/1.0"
+        self.config = load_config(config_path or CONFIG_PATH)
+        # HTTP transport, browser pool and PubMed engine are built on first use
+        self._lazy_lock = threading.RLock()
+        self._transport: Optional['Transport'] = None
+        self._fetcher: Any = _UNSET
+        self._pubmed: Optional[PubMedEngine] = None
+        self.throttle = DomainThrottle(
+            self.config['scraper'].get('request_delay', 2.0),
+            self.config['scraper'].get('domain_delays'),
+            self.config['scraper'].get('domain_concurrency')
+        )
+        self.retrier = Retrier.from_config(self.config['scraper'])
+        self.change_scorer = build_scorer(self.config['scraper'].get('change_scoring', {}))
+        self.snapshots = SnapshotStore(SNAPSHOTS_DIR, legacy_dir=RAW_DIR)
+        self._keyword_matchers: Dict[Tuple[str, ...], KeywordMatcher] = {}
+        for source_config in self.config.get('sources', {}).values():
+            self._keyword_matcher(source_config.get('drug_keywords', []))
+        self.validators = self._load_validators()
+        self._validators_lock = threading.Lock()
+        self.fetch_routes = self._load_fetch_routes()
+        self._fetch_routes_lock = threading.Lock()
+    
+    @property
+    def transport(self) -> 'Transport':
+        """Pooled keep-alive HTTP transport shared by page fetches and E-utilities"""
+        if self._transport is None:
+            with self._lazy_lock:
+                if self._transport is None:
+                    from transport import Transport
+                    self._transport = Transport.from_config(self.config['scraper'])
+        return self._transport
+    
+    @property
+    def session(self) -> 'requests.Session':
+        """HTTP session for static pages and the FDA API"""
+        return self.transport.session
+    
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, new connections and reuse rate per host (empty before any request)"""
+        return self._transport.pool_stats() if self._transport is not None else {}
+    
+    @property
+    def fetcher(self) -> Optional[BrowserPool]:
+        """Scrapling browser pool, or None if Scrapling is not installed"""
+        if self._fetcher is _UNSET:
+            with self._lazy_lock:
+                if self._fetcher is _UNSET:
+                    self._fetcher = self._create_browser_pool()
+        return self._fetcher
+    
+    @fetcher.setter
+    def fetcher(self, value: Optional[BrowserPool]):
+        self._fetcher = value
+    
+    def _create_browser_pool(self) -> Optional[BrowserPool]:
+        if scrapling_fetchers() is None:
+            return None
+        pool_config = self.config['scraper'].get('browser_pool', {})
+        pool = BrowserPool(
+            self._browser_session,
+            size=pool_config.get('size', 2),
+            max_pages=pool_config.get('max_pages', 50),
+            max_memory_mb=pool_config.get('max_memory_mb')
+        )
+        logger.info(f"Scrapling browser pool initialized ({pool.size} sessions)")
+        return pool
+    
+    @property
+    def pubmed(self) -> PubMedEngine:
+        """PubMed search engine, calling the E-utilities over the shared transport"""
+        if self._pubmed is None:
+            with self._lazy_lock:
+                if self._pubmed is None:
+                    from transport import EutilsClient
+                    pubmed_config = self.config['scraper'].get('pubmed', {})
+                    eutils = EutilsClient(
+                        self.transport.session,
+                        email="medkitt-research@example.com",
+                        tool="MedKittScraper/1.0",
+                        api_key=pubmed_config.get('api_key'),
+                        timeout=self.config['scraper']['timeout']
+                    )
+                    self._pubmed = PubMedEngine(
+                        eutils,
+                        PUBMED_CACHE_FILE,
+                        state_path=PUBMED_WATERMARKS_FILE,
+                        batch_size=pubmed_config.get('batch_size', 200),
+                        request_interval=pubmed_config.get('request_interval', 0.34),
+                        max_new_results=pubmed_config.get('max_new_results', 500),
+                        retrier=self.retrier,
+                        host=EUTILS_HOST
+                    )
+        return self._pubmed
     
-    def _load_config(self, path: Path) -> Dict:
-        """Load YAML configuration"""
-        with open(path, 'r') as f:
-            return yaml.safe_load(f)
+    def _browser_session(self):
+        """New browser session for the pool"""
+        StealthyFetcher, StealthySession = scrapling_fetchers()
+        if StealthySession is not None:
+            return StealthySession(headless=True)
+        # Older Scrapling: every fetch launches its own browser
+        return StealthyFetcher(adaptive=True, headless=True)
+    
+    def close(self):
+        """Shut down pooled browser sessions and HTTP connections (without starting any)"""
+        if self._fetcher is not None and self._fetcher is not _UNSET:
+            self._fetcher.close()
+        self._fetcher = None
+        if self._transport is not None:
+            self._transport.close()
+    
+    def export_metrics(self, command: str) -> Optional[Dict[str, Any]]:
+        """Write the timings and counts recorded since the last reset (see metrics.py)"""
+        return metrics.export_configured(command, self.config.get('metrics', {}), METRICS_FILE, PROMETHEUS_FILE)
     
     def _get_hash(self, content: str) -> str:
         """Generate hash for content comparison"""
         return hashlib.sha256(content.encode('utf-8')).hexdigest()
     
+    def _content_hash(self, data: Dict) -> str:
+        """Hash scraped data, ignoring the scrape timestamp so unchanged content hashes equal"""
+        content = {k: v for k, v in data.items() if k != 'scraped_at'}
+        return self._get_hash(json.dumps(content, sort_keys=True, default=str))
+    
     def _get_previous_hash(self, source_id: str) -> Optional[str]:
         """Get previous content hash for a source"""
         hash_file = HASHES_DIR / f"{source_id}.hash"
@@ -136,130 +327,222 @@ class MedKittScraper:
     
     def _save_hash(self, source_id: str, content_hash: str):
         """Save content hash for future comparison"""
+        HASHES_DIR.mkdir(parents=True, exist_ok=True)
         hash_file = HASHES_DIR / f"{source_id}.hash"
         hash_file.write_text(content_hash)
     
+    def _keyword_matcher(self, keywords: List[str]) -> KeywordMatcher:
+        """Compiled matcher for a keyword list, built once per config load"""
+        key = tuple(keywords)
+        if key not in self._keyword_matchers:
+            self._keyword_matchers[key] = KeywordMatcher(keywords)
+        return self._keyword_matchers[key]
+    
+    def _load_validators(self) -> Dict[str, Dict[str, str]]:
+        """Load cached HTTP validators (ETag / Last-Modified) keyed by URL"""
+        if VALIDATORS_FILE.exists():
+            try:
+                with open(VALIDATORS_FILE, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable validator cache: {e}")
+        return {}
+    
+    def _remember_validators(self, url: str, response: 'requests.Response'):
+        """Store the validators of a fully processed response"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        
+        with self._validators_lock:
+            if etag or last_modified:
+                self.validators[url] = {'etag': etag, 'last_modified': last_modified}
+            elif self.validators.pop(url, None) is None:
+                return
+            self._save_validators()
+    
+    def _forget_validators(self, url: str):
+        """Drop a URL's validators (its stored state no longer comes from a plain GET)"""
+        with self._validators_lock:
+            if self.validators.pop(url, None) is not None:
+                self._save_validators()
+    
+    def _save_validators(self):
+        with open(VALIDATORS_FILE, 'w') as f:
+            json.dump(self.validators, f, indent=2, sort_keys=True)
+    
+    def _load_fetch_routes(self) -> Dict[str, Dict[str, str]]:
+        """Load the fetch route (static / rendered) each source needed"""
+        if FETCH_ROUTES_FILE.exists():
+            try:
+                with open(FETCH_ROUTES_FILE, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable fetch routes: {e}")
+        return {}
+    
+    def _fetch_route(self, source_id: str) -> str:
+        """How to fetch a source: 'static' (plain GET) or 'rendered' (browser)
+        
+        Sources that needed the browser are re-probed with a plain GET once
+        their route is older than fetch_routing.rendered_ttl_days.
+        """
+        entry = self.fetch_routes.get(source_id)
+        if not entry or entry.get('route') != 'rendered':
+            return 'static'
+        ttl_days = self.config['scraper'].get('fetch_routing', {}).get('rendered_ttl_days', 7)
+        decided_at = datetime.fromisoformat(entry['decided_at'])
+        if datetime.now() - decided_at > timedelta(days=ttl_days):
+            return 'static'
+        return 'rendered'
+    
+    def _remember_route(self, source_id: str, route: str):
+        """Record the route a source needed
+        
+        'rendered' is always rewritten so its TTL restarts; 'static' only when
+        the route changes.
+        """
+        with self._fetch_routes_lock:
+            if route == 'static' and self.fetch_routes.get(source_id, {}).get('route') == 'static':
+                return
+            self.fetch_routes[source_id] = {'route': route, 'decided_at': datetime.now().isoformat()}
+            with open(FETCH_ROUTES_FILE, 'w') as f:
+                json.dump(self.fetch_routes, f, indent=2, sort_keys=True)
+    
+    def _conditional_get(self, source_id: str, url: str, stream: bool = False) -> Optional['requests.Response']:
+        """GET a page, revalidating with cached validators
+        
+        Transient failures are retried by the shared Retrier. Returns None when
+        the server answers 304 Not Modified. Validators are only sent when a
+        previous hash exists, so there is always a stored state that the 304
+        refers to. With stream=True the body is left unread for iter_content().
+        """
+        headers = {}
+        cached = self.validators.get(url)
+        if cached and self._get_previous_hash(source_id):
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        host = urlparse(url).netloc
+        with metrics.timer('stage_seconds', stage='fetch'):
+            response = self.retrier.get(self.session, host, url, headers=headers,
+                                        timeout=self.config['scraper']['timeout'], stream=stream)
+        if response.status_code == 304:
+            logger.info(f"{source_id} not modified since last run")
+            return None
+        response.raise_for_status()
+        if not stream:
+            metrics.count('bytes_fetched_total', len(response.content), host=host)
+        return response
+    
+    def _unchanged_result(self, source_id: str, source_config: Dict, url: str) -> ScrapeResult:
+        """Result for a source whose content is known not to have changed"""
+        previous_hash = self._get_previous_hash(source_id)
+        return ScrapeResult(
+            source_id=source_id,
+            source_name=source_config['name'],
+            url=url,
+            timestamp=datetime.now().isoformat(),
+            status='unchanged',
+            content_hash=previous_hash or '',
+            previous_hash=previous_hash,
+            data={}
+        )
+    
+    def _store_if_changed(self, source_id: str, data: Dict, content_hash: str,
+                          previous_hash: Optional[str]) -> bool:
+        """Save raw data and hash unless the content is the same as last time"""
+        if content_hash == previous_hash:
+            logger.info(f"{source_id} content unchanged, snapshot kept")
+            return False
+        self._save_raw_data(source_id, data, content_hash)
+        self._save_hash(source_id, content_hash)
+        return True
+    
     def _calculate_change_percentage(self, old_content: str, new_content: str) -> float:
-        """Calculate percentage of content change using difflib"""
-        if not old_content:
-            return 1.0 if new_content else 0.0
-        
-        import difflib
-        seq = difflib.SequenceMatcher(None, old_content, new_content)
-        return 1.0 - seq.ratio()
-    
-    def _save_raw_data(self, source_id: str, data: Dict):
-        """Save raw scraped data"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        raw_file = RAW_DIR / f"{source_id}_{timestamp}.json"
-        with open(raw_file, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
-        logger.info(f"Raw data saved to {raw_file}")
-        return raw_file
+        """Calculate fraction of content changed using the configured scoring engine"""
+        with metrics.timer('stage_seconds', stage='score'):
+            return self.change_scorer.score(old_content, new_content)
+    
+    def _save_raw_data(self, source_id: str, data: Dict, content_hash: str) -> Path:
+        """Save raw scraped data to the snapshot store"""
+        with metrics.timer('stage_seconds', stage='snapshot_io'):
+            blob_path = self.snapshots.put(source_id, data, content_hash)
+        logger.info(f"Raw data for {source_id} stored at {blob_path}")
+        return blob_path
     
     # ======================================================================
     # CDC SCRAPING
     # ======================================================================
     
     def scrape_cdc(self, source_id: str, source_config: Dict) -> ScrapeResult:
-        """Scrape CDC guideline pages"""
+        """Scrape CDC guideline pages
+        
+        A plain GET is tried first; the headless browser is only used when the
+        static HTML does not contain the configured content selectors. The
+        route each source needed is remembered (see _fetch_route).
+        """
         url = source_config['url']
         logger.info(f"Scraping CDC source: {source_id} from {url}")
         
+        response = None
         try:
-            if self.fetcher:
-                # Use Scrapling for adaptive parsing
-                page = self.fetcher.fetch(url, auto_save=True)
-                
-                # Extract content using adaptive CSS selectors
-                content_blocks = []
-                for selector in source_config.get('selectors', {}).get('content', '').split(','):
-                    selector = selector.strip()
-                    if selector:
-                        blocks = page.css(selector, adaptive=True)
-                        content_blocks.extend(blocks)
-                
-                # Extract tables
-                tables = []
-                table_selectors = source_config.get('selectors', {}).get('tables', 'table')
-                for selector in table_selectors.split(','):
-                    selector = selector.strip()
-                    if selector:
-                        table_elements = page.css(selector, adaptive=True)
-                        for table in table_elements:
-                            tables.append(self._parse_table(table))
-                
-                # Get page text content
-                text_content = ' '.join([block.text for block in content_blocks if hasattr(block, 'text')])
-                
-                # Extract last updated date if available
-                last_updated = None
-                for update_selector in source_config.get('selectors', {}).get('updates', '').split(','):
-                    update_selector = update_selector.strip()
-                    if update_selector:
-                        update_elem = page.css_first(update_selector, adaptive=True)
-                        if update_elem:
-                            last_updated = update_elem.text
-                            break
-                
-                data = {
-                    'source': 'cdc',
-                    'url': url,
-                    'title': page.title if hasattr(page, 'title') else '',
-                    'content': text_content,
-                    'tables': tables,
-                    'last_updated': last_updated,
-                    'scraped_at': datetime.now().isoformat()
-                }
-            else:
-                # Fallback to requests + BeautifulSoup
-                response = self.session.get(url, timeout=self.config['scraper']['timeout'])
-                response.raise_for_status()
-                
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Extract content
-                text_content = soup.get_text(separator=' ', strip=True)
-                
-                # Extract tables
-                tables = []
-                for table in soup.find_all('table'):
-                    tables.append(self._parse_table_bs4(table))
+            data = None
+            route = self._fetch_route(source_id) if self.fetcher else 'static'
+            if route == 'static' and not self._static_selectors_usable(source_id, source_config) and self.fetcher:
+                route = 'rendered'
+            
+            if route == 'static':
+                response = self._conditional_get(source_id, url, stream=True)
+                if response is None:
+                    return self._unchanged_result(source_id, source_config, url)
                 
-                data = {
-                    'source': 'cdc',
-                    'url': url,
-                    'title': soup.title.string if soup.title else '',
-                    'content': text_content,
-                    'tables': tables,
-                    'scraped_at': datetime.now().isoformat()
-                }
+                data = self._extract_cdc_static(url, response, source_config, strict=bool(self.fetcher))
+                if data is None:
+                    logger.info(f"{source_id}: content selectors not in static HTML, rendering")
+                    self._remember_route(source_id, 'rendered')
+                    self._forget_validators(url)
+                    response = None
+                elif self.fetcher:
+                    self._remember_route(source_id, 'static')
+            
+            if data is None:
+                data = self._extract_cdc_rendered(url, source_config)
+            metrics.count('sections_parsed_total', len(data.get('sections', [])), source=source_id)
+            metrics.count('tables_parsed_total', len(data.get('tables', [])), source=source_id)
             
             # Calculate hash and detect changes
-            content_str = json.dumps(data, sort_keys=True)
-            content_hash = self._get_hash(content_str)
+            content_hash = self._content_hash(data)
             previous_hash = self._get_previous_hash(source_id)
+            change_detected = content_hash != previous_hash
             
-            # Load previous content for comparison
-            old_content = ""
-            if previous_hash:
-                # Find most recent raw file
-                raw_files = sorted(RAW_DIR.glob(f"{source_id}_*.json"), reverse=True)
-                if raw_files:
+            # Score only what changed: per section when both snapshots have sections
+            change_percentage = 0.0
+            changed_sections: List[Dict[str, str]] = []
+            if change_detected:
+                old_data = {}
+                if previous_hash:
                     try:
-                        with open(raw_files[0], 'r') as f:
-                            old_data = json.load(f)
-                            old_content = old_data.get('content', '')
-                    except:
-                        pass
-            
-            change_percentage = self._calculate_change_percentage(old_content, data['content'])
-            change_detected = content_hash != previous_hash
+                        with metrics.timer('stage_seconds', stage='snapshot_io'):
+                            old_data = self.snapshots.latest(source_id) or {}
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Could not load previous snapshot for {source_id}: {e}")
+                
+                if old_data.get('sections') and data.get('sections'):
+                    with metrics.timer('stage_seconds', stage='score'):
+                        changed_sections, change_percentage = diff_sections(
+                            old_data['sections'], data['sections'], self.change_scorer.score
+                        )
+                else:
+                    change_percentage = self._calculate_change_percentage(
+                        old_data.get('content', ''), data['content']
+                    )
             
-            # Save data and hash
-            self._save_raw_data(source_id, data)
-            self._save_hash(source_id, content_hash)
+            # Save data and hash (only when the content changed)
+            self._store_if_changed(source_id, data, content_hash, previous_hash)
+            if response is not None:
+                self._remember_validators(url, response)
             
             return ScrapeResult(
                 source_id=source_id,
@@ -271,7 +554,8 @@ class MedKittScraper:
                 previous_hash=previous_hash,
                 data=data,
                 change_detected=change_detected,
-                change_percentage=change_percentage
+                change_percentage=change_percentage,
+                changed_sections=changed_sections
             )
             
         except Exception as e:
@@ -288,6 +572,119 @@ class MedKittScraper:
                 error=str(e)
             )
     
+    def _static_selectors_usable(self, source_id: str, source_config: Dict) -> bool:
+        """Whether static HTML can be checked against the source's content selectors
+        
+        The static parser only evaluates simple selectors (tag, .class, #id).
+        When every configured content selector is something else, a static
+        page cannot be told apart from a JavaScript shell.
+        """
+        selectors = split_selectors(source_config.get('selectors', {}).get('content'))
+        unsupported = unsupported_selectors(selectors)
+        if unsupported:
+            logger.warning(f"{source_id}: content selectors not checked in static HTML: {', '.join(unsupported)}")
+        return len(unsupported) < len(selectors) or not selectors
+    
+    def _section_extractor(self, source_config: Dict) -> SectionExtractor:
+        selectors = source_config.get('selectors', {})
+        return SectionExtractor(
+            content_selectors=split_selectors(selectors.get('content')),
+            table_selectors=split_selectors(selectors.get('tables', 'table')),
+            update_selectors=split_selectors(selectors.get('updates'))
+        )
+    
+    def _extract_cdc_static(self, url: str, response: 'requests.Response', source_config: Dict,
+                            strict: bool) -> Optional[Dict[str, Any]]:
+        """Extract a CDC page from static HTML, parsing it as it streams in
+        
+        Returns None when strict and the configured content selectors match
+        nothing (the content is rendered by JavaScript). Otherwise, without
+        selector matches the whole page body is used.
+        """
+        extractor = self._section_extractor(source_config)
+        encoding = response.encoding or 'utf-8'
+        # Body reads are timed as fetch (by metrics.fetched), feeding the parser as parse
+        chunks = metrics.fetched(response.iter_content(chunk_size=64 * 1024), urlparse(url).netloc)
+        parse_seconds = 0.0
+        for chunk in codecs.iterdecode(chunks, encoding, errors='replace'):
+            start = time.perf_counter()
+            extractor.feed(chunk)
+            parse_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        page = extractor.finish()
+        metrics.observe('stage_seconds', parse_seconds + time.perf_counter() - start, stage='parse')
+        
+        if strict and extractor.content_matchers and not page.scoped:
+            return None
+        
+        return {
+            'source': 'cdc',
+            'url': url,
+            'title': page.title,
+            'content': page.content,
+            'sections': [section.to_dict() for section in page.sections],
+            'tables': page.tables,
+            'last_updated': page.last_updated,
+            'scraped_at': datetime.now().isoformat()
+        }
+    
+    def _extract_cdc_rendered(self, url: str, source_config: Dict) -> Dict[str, Any]:
+        """Render a CDC page in the browser pool and extract it"""
+        # Use Scrapling for adaptive parsing
+        with metrics.timer('stage_seconds', stage='fetch'):
+            page = self.retrier.call(urlparse(url).netloc, lambda: self.fetcher.fetch(url, auto_save=True))
+        
+        # Extract content using adaptive CSS selectors
+        selectors = source_config.get('selectors', {})
+        content_blocks = []
+        for selector in split_selectors(selectors.get('content')):
+            blocks = page.css(selector, adaptive=True)
+            content_blocks.extend(blocks)
+        
+        # Extract tables
+        tables = []
+        for selector in split_selectors(selectors.get('tables', 'table')):
+            table_elements = page.css(selector, adaptive=True)
+            for table in table_elements:
+                tables.append(self._parse_table(table))
+        
+        # Get page text content
+        text_content = ' '.join([block.text for block in content_blocks if hasattr(block, 'text')])
+        
+        # Extract last updated date if available
+        last_updated = None
+        for update_selector in split_selectors(selectors.get('updates')):
+            update_elem = page.css_first(update_selector, adaptive=True)
+            if update_elem:
+                last_updated = update_elem.text
+                break
+        
+        # Split the rendered DOM into sections; fall back to one section
+        sections = []
+        html = getattr(page, 'html_content', None)
+        if isinstance(html, str) and html:
+            metrics.count('bytes_fetched_total', len(html.encode('utf-8')), host=urlparse(url).netloc)
+            extractor = self._section_extractor(source_config)
+            with metrics.timer('stage_seconds', stage='parse'):
+                extractor.feed(html)
+                extracted = extractor.finish()
+            if extracted.sections:
+                sections = [section.to_dict() for section in extracted.sections]
+                text_content = extracted.content
+        if not sections and text_content:
+            sections = [Section('', 0, text_content, section_hash('', text_content)).to_dict()]
+        
+        return {
+            'source': 'cdc',
+            'url': url,
+            'title': page.title if hasattr(page, 'title') else '',
+            'content': text_content,
+            'sections': sections,
+            'tables': tables,
+            'last_updated': last_updated,
+            'scraped_at': datetime.now().isoformat()
+        }
+    
     def _parse_table(self, table_element) -> List[List[str]]:
         """Parse HTML table from Scrapling element"""
         rows = []
@@ -321,38 +718,41 @@ class MedKittScraper:
         logger.info(f"Scraping FDA source: {source_id} from {url}")
         
         try:
-            response = self.session.get(url, timeout=self.config['scraper']['timeout'])
-            response.raise_for_status()
+            response = self._conditional_get(source_id, url)
+            if response is None:
+                return self._unchanged_result(source_id, source_config, url)
             
             from bs4 import BeautifulSoup
+            parse_start = time.perf_counter()
             soup = BeautifulSoup(response.content, 'html.parser')
             
             alerts = []
             drug_keywords = source_config.get('drug_keywords', [])
+            drug_matcher = self._keyword_matcher(drug_keywords)
             
             # Extract alerts
             alert_selectors = source_config.get('selectors', {}).get('alerts', '.views-row')
-            for selector in alert_selectors.split(','):
-                selector = selector.strip()
-                if not selector:
-                    continue
-                    
+            for selector in split_selectors(alert_selectors):
                 for alert_elem in soup.select(selector):
                     alert_text = alert_elem.get_text(separator=' ', strip=True)
                     alert_link = alert_elem.find('a')
                     alert_url = urljoin(url, alert_link['href']) if alert_link and alert_link.has_attr('href') else url
                     
                     # Check if alert mentions relevant drugs
-                    mentioned_drugs = [kw for kw in drug_keywords if kw.lower() in alert_text.lower()]
+                    drug_offsets = drug_matcher.offsets(alert_text)
                     
-                    if mentioned_drugs:
+                    if drug_offsets:
                         alerts.append({
                             'title': alert_text[:200],
                             'url': alert_url,
-                            'mentioned_drugs': mentioned_drugs,
+                            'mentioned_drugs': list(drug_offsets),
+                            'drug_offsets': drug_offsets,
                             'full_text': alert_text
                         })
             
+            metrics.observe('stage_seconds', time.perf_counter() - parse_start, stage='parse')
+            metrics.count('alerts_parsed_total', len(alerts), source=source_id)
+            
             data = {
                 'source': 'fda',
                 'url': url,
@@ -363,12 +763,11 @@ class MedKittScraper:
             }
             
             # Hash and save
-            content_str = json.dumps(data, sort_keys=True)
-            content_hash = self._get_hash(content_str)
+            content_hash = self._content_hash(data)
             previous_hash = self._get_previous_hash(source_id)
             
-            self._save_raw_data(source_id, data)
-            self._save_hash(source_id, content_hash)
+            self._store_if_changed(source_id, data, content_hash, previous_hash)
+            self._remember_validators(url, response)
             
             return ScrapeResult(
                 source_id=source_id,
@@ -402,26 +801,30 @@ class MedKittScraper:
     
     def scrape_pubmed(self, source_id: str, source_config: Dict) -> ScrapeResult:
         """Search PubMed for recent evidence"""
-        search_query = source_config.get('search_query', '')
-        max_results = source_config.get('max_results', 10)
-        
-        logger.info(f"Searching PubMed: {source_id} - Query: {search_query[:50]}...")
-        
+        return self.scrape_pubmed_batch({source_id: source_config})[source_id]
+    
+    def scrape_pubmed_batch(self, sources: Dict[str, Dict]) -> Dict[str, ScrapeResult]:
+        """Search several PubMed sources in one pass, sharing article fetches"""
         try:
-            # Search PubMed
-            handle = Entrez.esearch(
-                db='pubmed',
-                term=search_query,
-                retmax=max_results,
-                sort='date'
-            )
-            record = Entrez.read(handle)
-            handle.close()
-            
-            id_list = record.get('IdList', [])
+            with metrics.timer('scrape_seconds', handler='pubmed', source='batch'), \
+                    metrics.timer('stage_seconds', stage='fetch'):
+                searches = self.pubmed.run(sources)
+        except Exception as e:
+            logger.error(f"Error running PubMed searches: {e}")
+            return {
+                source_id: self._pubmed_error(source_id, source_config, str(e))
+                for source_id, source_config in sources.items()
+            }
+        
+        results = {}
+        for source_id, source_config in sources.items():
+            search = searches[source_id]
+            if search.error:
+                results[source_id] = self._pubmed_error(source_id, source_config, search.error)
+                continue
             
-            if not id_list:
-                return ScrapeResult(
+            if not search.pmids:
+                results[source_id] = ScrapeResult(
                     source_id=source_id,
                     source_name=source_config['name'],
                     url=source_config['url'],
@@ -431,92 +834,24 @@ class MedKittScraper:
                     previous_hash=None,
                     data={'articles': [], 'count': 0}
                 )
+                continue
             
-            # Fetch article details
-            handle = Entrez.efetch(
-                db='pubmed',
-                id=id_list,
-                rettype='abstract',
-                retmode='xml'
-            )
-            articles_data = Entrez.read(handle)
-            handle.close()
-            
-            articles = []
-            for article in articles_data.get('PubmedArticle', []):
-                try:
-                    medline = article.get('MedlineCitation', {})
-                    article_data = medline.get('Article', {})
-                    
-                    # Extract title
-                    title = ''
-                    title_data = article_data.get('ArticleTitle', '')
-                    if isinstance(title_data, list):
-                        title = ' '.join([str(t) for t in title_data])
-                    else:
-                        title = str(title_data)
-                    
-                    # Extract abstract
-                    abstract = ''
-                    abstract_data = article_data.get('Abstract', {})
-                    if abstract_data:
-                        abstract_text = abstract_data.get('AbstractText', [])
-                        if isinstance(abstract_text, list):
-                            abstract = ' '.join([str(a) for a in abstract_text])
-                        else:
-                            abstract = str(abstract_text)
-                    
-                    # Extract authors
-                    authors = []
-                    author_list = article_data.get('AuthorList', [])
-                    for author in author_list[:3]:  # First 3 authors
-                        last_name = author.get('LastName', '')
-                        initials = author.get('Initials', '')
-                        if last_name:
-                            authors.append(f"{last_name} {initials}")
-                    
-                    # Extract PMID
-                    pmid = medline.get('PMID', '')
-                    
-                    # Extract publication date
-                    pub_date = ''
-                    journal = article_data.get('Journal', {})
-                    journal_issue = journal.get('JournalIssue', {})
-                    pub_date_data = journal_issue.get('PubDate', {})
-                    if pub_date_data:
-                        year = pub_date_data.get('Year', '')
-                        month = pub_date_data.get('Month', '')
-                        pub_date = f"{year} {month}".strip()
-                    
-                    articles.append({
-                        'pmid': str(pmid),
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'authors': authors,
-                        'publication_date': pub_date,
-                        'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-                    })
-                except Exception as e:
-                    logger.warning(f"Error parsing article: {e}")
-                    continue
-            
+            metrics.count('articles_parsed_total', len(search.articles), source=source_id)
             data = {
                 'source': 'pubmed',
-                'query': search_query,
-                'articles': articles,
-                'count': len(articles),
+                'query': search.query,
+                'articles': search.articles,
+                'count': len(search.articles),
                 'scraped_at': datetime.now().isoformat()
             }
             
             # Hash and save
-            content_str = json.dumps(data, sort_keys=True)
-            content_hash = self._get_hash(content_str)
+            content_hash = self._content_hash(data)
             previous_hash = self._get_previous_hash(source_id)
             
-            self._save_raw_data(source_id, data)
-            self._save_hash(source_id, content_hash)
+            self._store_if_changed(source_id, data, content_hash, previous_hash)
             
-            return ScrapeResult(
+            results[source_id] = ScrapeResult(
                 source_id=source_id,
                 source_name=source_config['name'],
                 url=source_config['url'],
@@ -527,20 +862,23 @@ class MedKittScraper:
                 data=data,
                 change_detected=content_hash != previous_hash
             )
-            
-        except Exception as e:
-            logger.error(f"Error scraping PubMed {source_id}: {e}")
-            return ScrapeResult(
-                source_id=source_id,
-                source_name=source_config['name'],
-                url=source_config['url'],
-                timestamp=datetime.now().isoformat(),
-                status='error',
-                content_hash='',
-                previous_hash=None,
-                data={},
-                error=str(e)
-            )
+        
+        return results
+    
+    def _pubmed_error(self, source_id: str, source_config: Dict, error: str) -> ScrapeResult:
+        """Error result for a PubMed source"""
+        logger.error(f"Error scraping PubMed {source_id}: {error}")
+        return ScrapeResult(
+            source_id=source_id,
+            source_name=source_config['name'],
+            url=source_config['url'],
+            timestamp=datetime.now().isoformat(),
+            status='error',
+            content_hash='',
+            previous_hash=None,
+            data={},
+            error=error
+        )
     
     # ======================================================================
     # MAIN SCRAPING METHODS
@@ -565,16 +903,19 @@ class MedKittScraper:
             )
         
         source_config = sources[source_id]
-        source_type = source_config.get('type', '')
-        
-        # Route to appropriate scraper
-        if source_type.startswith('cdc'):
-            return self.scrape_cdc(source_id, source_config)
-        elif source_type.startswith('fda'):
-            return self.scrape_fda(source_id, source_config)
-        elif source_type.startswith('pubmed'):
+        
+        # Route to appropriate scraper (routing is compiled with the config)
+        handler = self.config.handlers.get(source_id)
+        if handler == 'cdc':
+            with metrics.timer('scrape_seconds', handler='cdc', source=source_id):
+                return self.scrape_cdc(source_id, source_config)
+        elif handler == 'fda':
+            with metrics.timer('scrape_seconds', handler='fda', source=source_id):
+                return self.scrape_fda(source_id, source_config)
+        elif handler == 'pubmed':
             return self.scrape_pubmed(source_id, source_config)
         else:
+            source_type = source_config.get('type', '')
             logger.error(f"Unknown source type: {source_type}")
             return ScrapeResult(
                 source_id=source_id,
@@ -588,22 +929,82 @@ class MedKittScraper:
                 error=f"Unknown source type: {source_type}"
             )
     
-    def scrape_all(self) -> List[ScrapeResult]:
-        """Scrape all configured sources"""
+    def _source_host(self, source_config: Dict) -> str:
+        """Host a source's requests are sent to (used as the politeness key)"""
+        if source_handler(source_config.get('type', '')) == 'pubmed':
+            return EUTILS_HOST
+        return urlparse(source_config.get('url', '')).netloc
+    
+    def _scrape_job(self, host: str, source_ids: List[str]) -> Dict[str, ScrapeResult]:
+        """Scrape a group of sources while holding their host's politeness slot"""
         sources = self.config.get('sources', {})
-        results = []
+        with self.throttle.slot(host):
+            if host == EUTILS_HOST:
+                return self.scrape_pubmed_batch({source_id: sources[source_id] for source_id in source_ids})
+            return {source_id: self.scrape_source(source_id) for source_id in source_ids}
+    
+    def scrape_all(self, concurrent: Optional[bool] = None,
+                   source_ids: Optional[List[str]] = None) -> List[ScrapeResult]:
+        """Scrape all configured sources, or just source_ids
+        
+        Sources on different hosts are fetched in parallel; sources on the same
+        host run one at a time, spaced by that host's request delay. PubMed
+        sources run as a single batch. Results are returned in configuration
+        order, or in the order of source_ids when given.
+        """
+        all_sources = self.config.get('sources', {})
+        if source_ids is None:
+            sources = all_sources
+        else:
+            unknown = [source_id for source_id in source_ids if source_id not in all_sources]
+            if unknown:
+                logger.warning(f"Skipping unknown sources: {', '.join(unknown)}")
+            sources = {source_id: all_sources[source_id] for source_id in source_ids if source_id in all_sources}
+        scraper_config = self.config['scraper']
+        if concurrent is None:
+            concurrent = scraper_config.get('concurrent', True)
         
-        logger.info(f"Starting full scrape of {len(sources)} sources")
+        logger.info(f"Starting scrape of {len(sources)} sources")
         
+        # One job per source, except PubMed which shares one batched job
+        # (queued where its first source appears)
+        jobs: List[Tuple[str, List[str]]] = []
+        pubmed_ids = []
         for source_id, source_config in sources.items():
-            result = self.scrape_source(source_id)
-            results.append(result)
-            
-            # Delay between requests
-            delay = self.config['scraper'].get('request_delay', 2.0)
-            time.sleep(delay)
+            host = self._source_host(source_config)
+            if host == EUTILS_HOST:
+                if not pubmed_ids:
+                    jobs.append((EUTILS_HOST, pubmed_ids))
+                pubmed_ids.append(source_id)
+            else:
+                jobs.append((host, [source_id]))
         
-        return results
+        results: Dict[str, ScrapeResult] = {}
+        if not concurrent:
+            for host, source_ids in jobs:
+                results.update(self._scrape_job(host, source_ids))
+            return [results[source_id] for source_id in sources]
+        
+        # Interleave hosts so workers are not all blocked waiting on one host
+        by_host: Dict[str, List[List[str]]] = {}
+        for host, source_ids in jobs:
+            by_host.setdefault(host, []).append(source_ids)
+        
+        submit_order = []
+        queues = [[(host, ids) for ids in groups] for host, groups in by_host.items()]
+        while any(queues):
+            for queue in queues:
+                if queue:
+                    submit_order.append(queue.pop(0))
+        
+        # Workers beyond each host's concurrency would only wait on its throttle
+        usable = sum(min(self.throttle.concurrency_for(host), len(groups)) for host, groups in by_host.items())
+        max_workers = min(scraper_config.get('max_workers', 4), usable) or 1
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape') as pool:
+            futures = [pool.submit(self._scrape_job, host, source_ids) for host, source_ids in submit_order]
+            for future in futures:
+                results.update(future.result())
+        return [results[source_id] for source_id in sources]
     
     def detect_changes(self, results: List[ScrapeResult]) -> List[ChangeReport]:
         """Analyze scrape results for significant changes"""
@@ -634,6 +1035,10 @@ class MedKittScraper:
                 summary = f"MAJOR: Significant content changes in {result.source_name}"
             else:
                 summary = f"Minor: Content updates in {result.source_name}"
+            if result.changed_sections:
+                headings = [s['heading'] or '(untitled)' for s in result.changed_sections]
+                more = f" (+{len(headings) - 3} more)" if len(headings) > 3 else ''
+                summary += f" - sections: {', '.join(headings[:3])}{more}"
             
             report = ChangeReport(
                 source_id=result.source_id,
@@ -643,7 +1048,8 @@ class MedKittScraper:
                 affected_consults=affected_consults,
                 summary=summary,
                 raw_changes=result.data,
-                timestamp=result.timestamp
+                timestamp=result.timestamp,
+                changed_sections=result.changed_sections
             )
             reports.append(report)
         
@@ -659,9 +1065,12 @@ def main():
     parser.add_argument('--all', action='store_true', help='Scrape all sources')
     parser.add_argument('--test', action='store_true', help='Run test scrape (CDC syphilis)')
     parser.add_argument('--list-sources', action='store_true', help='List configured sources')
+    parser.add_argument('--serial', action='store_true', help='Scrape sources one at a time (with --all)')
+    parser.add_argument('--only', help='Comma-separated source ids to scrape (with --all)')
     
     args = parser.parse_args()
     
+    setup_logging(log_file=bool(args.source or args.all or args.test))
     scraper = MedKittScraper()
     
     if args.list_sources:
@@ -695,32 +1104,53 @@ def main():
             print(f"Change detected: {result.change_detected}")
             if result.change_detected:
                 print(f"Change percentage: {result.change_percentage:.2%}")
+                for section in result.changed_sections:
+                    print(f"  {section['change']}: {section['heading'] or '(untitled)'}")
     
     elif args.all:
         print("Scraping all sources...")
-        results = scraper.scrape_all()
+        results = scraper.scrape_all(
+            concurrent=False if args.serial else None,
+            source_ids=args.only.split(',') if args.only else None
+        )
         
         print("\n" + "=" * 60)
         print("SCRAPING SUMMARY")
         print("=" * 60)
         
-        success_count = sum(1 for r in results if r.status == 'success')
+        success_count = sum(1 for r in results if r.status in ('success', 'unchanged'))
+        unchanged_count = sum(1 for r in results if r.status == 'unchanged')
         error_count = sum(1 for r in results if r.status == 'error')
         change_count = sum(1 for r in results if r.change_detected)
         
         print(f"Total sources: {len(results)}")
         print(f"Successful: {success_count}")
+        print(f"Not modified: {unchanged_count}")
         print(f"Errors: {error_count}")
         print(f"Changes detected: {change_count}")
+        if error_count:
+            # Read by the scheduler's subprocess mode to retry these sooner
+            print(f"Failed sources: {','.join(r.source_id for r in results if r.status == 'error')}")
         
         if change_count > 0:
             print("\nChanges detected in:")
             reports = scraper.detect_changes(results)
             for report in reports:
                 print(f"  - {report.source_name} ({report.change_type}, {report.change_percentage:.1%})")
+        
+        pool_stats = scraper.pool_stats()
+        if pool_stats:
+            print("\nConnection reuse:")
+            for host, stats in sorted(pool_stats.items()):
+                print(f"  {host}: {stats['requests']} requests, {stats['connections']} connections "
+                      f"({stats['reuse_rate']:.0%} reused)")
     
     else:
         parser.print_help()
+    
+    if args.source or args.all or args.test:
+        scraper.export_metrics('scrape')
+    scraper.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+MedKitt Snapshot Store
+Content-addressed, gzip-compressed storage for raw scraped data.
+
+Layout:
+    snapshots/objects/ab/abcdef....json.gz   # one blob per content hash
+    snapshots/manifests/<source_id>.json     # latest / previous hash per source
+
+Identical content is stored once, and the latest or previous snapshot of a
+source is found by reading its manifest instead of scanning a directory.
+"""
+
+import os
+import gzip
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+# =============================================================================
+# SNAPSHOT STORE
+# =============================================================================
+
+class SnapshotStore:
+    """Deduplicated snapshot blobs plus a small manifest per source"""
+    
+    def __init__(self, root: Path, legacy_dir: Optional[Path] = None):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.manifests_dir = self.root / "manifests"
+        # Timestamped <source_id>_*.json files written before the store existed
+        self.legacy_dir = legacy_dir
+    
+    def _blob_path(self, content_hash: str) -> Path:
+        return self.objects_dir / content_hash[:2] / f"{content_hash}.json.gz"
+    
+    def _manifest_path(self, source_id: str) -> Path:
+        return self.manifests_dir / f"{source_id}.json"
+    
+    def _write_atomic(self, path: Path, payload: bytes):
+        """Write via a temporary file so readers never see a partial file"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+    
+    def put(self, source_id: str, data: Dict[str, Any], content_hash: str) -> Path:
+        """Store a snapshot and make it the source's latest version"""
+        blob_path = self._blob_path(content_hash)
+        if not blob_path.exists():
+            payload = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+            self._write_atomic(blob_path, gzip.compress(payload))
+        
+        now = datetime.now().isoformat()
+        manifest = self.manifest(source_id)
+        latest = manifest.get('latest')
+        
+        if latest and latest['hash'] == content_hash:
+            latest['checked_at'] = now
+        else:
+            manifest = {
+                'source_id': source_id,
+                'latest': {'hash': content_hash, 'saved_at': now, 'checked_at': now},
+                'previous': latest
+            }
+        
+        self._write_atomic(self._manifest_path(source_id), json.dumps(manifest, indent=2).encode('utf-8'))
+        return blob_path
+    
+    def manifest(self, source_id: str) -> Dict[str, Any]:
+        """Manifest for a source (empty if it has never been stored)"""
+        path = self._manifest_path(source_id)
+        if path.exists():
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {}
+    
+    def load(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Load a snapshot by content hash"""
+        blob_path = self._blob_path(content_hash)
+        if not blob_path.exists():
+            return None
+        return json.loads(gzip.decompress(blob_path.read_bytes()))
+    
+    def latest(self, source_id: str) -> Optional[Dict[str, Any]]:
+        """Most recent snapshot of a source"""
+        entry = self.manifest(source_id).get('latest')
+        if entry:
+            return self.load(entry['hash'])
+        return self._load_legacy(source_id)
+    
+    def previous(self, source_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot before the most recent one"""
+        entry = self.manifest(source_id).get('previous')
+        return self.load(entry['hash']) if entry else None
+    
+    def _load_legacy(self, source_id: str) -> Optional[Dict[str, Any]]:
+        """Newest pre-store raw file, used until the source is first stored"""
+        if not self.legacy_dir:
+            return None
+        raw_files = sorted(self.legacy_dir.glob(f"{source_id}_*.json"), reverse=True)
+        if not raw_files:
+            return None
+        with open(raw_files[0], 'r') as f:
+            return json.load(f)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+MedKitt Source Schedule
+Tracks when each source is next due from its check_frequency, and orders due
+sources by priority and then by how late they are.
+
+State (data/source_schedule.json):
+    {source_id: {"last_run": iso, "next_due": iso, "last_status": "success"}}
+
+Daily and longer frequencies are aligned to the scheduler's daily_run_time,
+so a daily source checked at 02:03 is next due at 02:00 the following day.
+Sources that fail are retried after RETRY_DELAY instead of a full interval.
+"""
+
+import os
+import json
+import heapq
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Any
+
+logger = logging.getLogger("MedKittScheduler")
+
+FREQUENCIES = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'monthly': timedelta(days=30),
+}
+
+PRIORITY_RANKS = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+RETRY_DELAY = timedelta(hours=1)
+
+# =============================================================================
+# SOURCE SCHEDULE
+# =============================================================================
+
+class SourceSchedule:
+    """Per-source next-due times with a priority/lateness ordered run queue"""
+
+    def __init__(self, sources: Dict[str, Dict], state_path: Path, run_time: str = '02:00'):
+        self.sources = sources
+        self.state_path = Path(state_path)
+        hour, minute = map(int, run_time.split(':'))
+        self.run_time = (hour, minute)
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if self.state_path.exists():
+            try:
+                with open(self.state_path, 'r') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable source schedule: {e}")
+
+    def interval(self, source_id: str) -> timedelta:
+        """Check interval from the source's check_frequency"""
+        frequency = self.sources.get(source_id, {}).get('check_frequency', 'daily')
+        if frequency not in FREQUENCIES:
+            logger.warning(f"Unknown check_frequency '{frequency}' for {source_id}, using daily")
+            return FREQUENCIES['daily']
+        return FREQUENCIES[frequency]
+
+    def priority(self, source_id: str) -> int:
+        """Rank of the source's priority (lower runs first)"""
+        return PRIORITY_RANKS.get(self.sources.get(source_id, {}).get('priority', 'medium'), len(PRIORITY_RANKS))
+
+    def next_due(self, source_id: str) -> datetime:
+        """When a source is next due (never-run sources are due immediately)"""
+        entry = self.state.get(source_id)
+        if entry and entry.get('next_due'):
+            return datetime.fromisoformat(entry['next_due'])
+        return datetime.min
+
+    def due(self, now: Optional[datetime] = None) -> List[str]:
+        """Sources due at `now`, highest priority first, then most overdue first"""
+        now = now or datetime.now()
+        queue = []
+        for source_id in self.sources:
+            next_due = self.next_due(source_id)
+            if next_due <= now:
+                lateness = (now - next_due).total_seconds() if next_due != datetime.min else float('inf')
+                queue.append((self.priority(source_id), -lateness, source_id))
+        heapq.heapify(queue)
+        return [heapq.heappop(queue)[2] for _ in range(len(queue))]
+
+    def next_wakeup(self) -> Optional[datetime]:
+        """Earliest next-due time across all sources"""
+        return min((self.next_due(source_id) for source_id in self.sources), default=None)
+
+    def _schedule_after(self, source_id: str, ran_at: datetime) -> datetime:
+        interval = self.interval(source_id)
+        next_due = ran_at + interval
+        if interval >= timedelta(days=1):
+            hour, minute = self.run_time
+            next_due = next_due.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return next_due
+
+    def mark_run(self, source_ids: Iterable[str], failed: Iterable[str] = (), now: Optional[datetime] = None):
+        """Record a run and schedule each source's next check"""
+        now = now or datetime.now()
+        failed = set(failed)
+        for source_id in source_ids:
+            if source_id in failed:
+                next_due = now + min(RETRY_DELAY, self.interval(source_id))
+            else:
+                next_due = self._schedule_after(source_id, now)
+            self.state[source_id] = {
+                'last_run': now.isoformat(),
+                'next_due': next_due.isoformat(),
+                'last_status': 'error' if source_id in failed else 'success'
+            }
+        self.save()
+
+    def save(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(f".{self.state_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-source schedule, in run order"""
+        rows = []
+        for source_id in sorted(self.sources, key=lambda s: (self.next_due(s), self.priority(s))):
+            entry = self.state.get(source_id, {})
+            rows.append({
+                'source_id': source_id,
+                'priority': self.sources[source_id].get('priority', 'medium'),
+                'check_frequency': self.sources[source_id].get('check_frequency', 'daily'),
+                'last_run': entry.get('last_run'),
+                'last_status': entry.get('last_status'),
+                'next_due': entry.get('next_due')
+            })
+        return rows
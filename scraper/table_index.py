@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+MedKitt Table Index
+Fingerprints scraped treatment tables so row changes are found with set
+operations instead of text searches.
+
+Every cell is normalized (Unicode NFKC, dashes, whitespace, case) before
+hashing, so formatting-only edits do not count as changes. A table is keyed
+by its header hash, and each row by the hash of its cells.
+
+State (data/table_index.json):
+    {source_id: {"updated_at": iso,
+                 "tables": {header_hash: {"headers": [...],
+                                          "rows": {row_hash: [cells]}}}}}
+
+Rows present in only the old or only the new version of a table are removed
+or added. When an added and a removed row share their first cell (the
+regimen, stage or drug name), they are reported as one modified row.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any
+
+logger = logging.getLogger("MedKittUpdater")
+
+_WS_RE = re.compile(r'\s+')
+_DASH_RE = re.compile(r'[\u2010-\u2015\u2212]')
+
+# =============================================================================
+# FINGERPRINTS
+# =============================================================================
+
+def normalize_cell(cell: str) -> str:
+    """Cell text with formatting differences removed"""
+    text = unicodedata.normalize('NFKC', cell or '')
+    text = _DASH_RE.sub('-', text)
+    return _WS_RE.sub(' ', text).strip().lower()
+
+def row_hash(cells: List[str]) -> str:
+    """Hash of a row's normalized cells (also used for header rows)"""
+    joined = '\x1f'.join(normalize_cell(cell) for cell in cells)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()[:16]
+
+def fingerprint_tables(tables: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Tables ({'headers', 'rows'}) keyed by header hash, rows keyed by row hash
+
+    Tables sharing a header are merged, since their rows cannot be told
+    apart by position between versions of a page.
+    """
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    for table in tables:
+        headers = table.get('headers', [])
+        entry = fingerprints.setdefault(row_hash(headers), {'headers': list(headers), 'rows': {}})
+        for row in table.get('rows', []):
+            if any(normalize_cell(cell) for cell in row):
+                entry['rows'][row_hash(row)] = list(row)
+    return fingerprints
+
+def _row_key(cells: List[str]) -> str:
+    return normalize_cell(cells[0]) if cells else ''
+
+def diff_table(old_rows: Dict[str, List[str]], new_rows: Dict[str, List[str]]) -> Dict[str, List]:
+    """Added, removed and modified rows between two fingerprinted tables"""
+    added = {h: new_rows[h] for h in new_rows.keys() - old_rows.keys()}
+    removed = {h: old_rows[h] for h in old_rows.keys() - new_rows.keys()}
+
+    removed_by_key = {}
+    for h, cells in removed.items():
+        removed_by_key.setdefault(_row_key(cells), []).append(h)
+
+    modified = []
+    for h in sorted(added, key=lambda h: added[h]):
+        candidates = removed_by_key.get(_row_key(added[h]))
+        if _row_key(added[h]) and candidates:
+            old_cells = removed.pop(candidates.pop(0))
+            new_cells = added.pop(h)
+            columns = [
+                i for i in range(max(len(old_cells), len(new_cells)))
+                if normalize_cell(old_cells[i] if i < len(old_cells) else '') !=
+                normalize_cell(new_cells[i] if i < len(new_cells) else '')
+            ]
+            modified.append({'before': old_cells, 'after': new_cells, 'columns': columns})
+
+    return {
+        'added_rows': sorted(added.values()),
+        'removed_rows': sorted(removed.values()),
+        'modified_rows': modified
+    }
+
+# =============================================================================
+# TABLE INDEX
+# =============================================================================
+
+class TableIndex:
+    """Last seen table fingerprints per source, persisted as JSON"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable table index: {e}")
+        self._dirty = False
+
+    def has_history(self, source_id: str) -> bool:
+        return source_id in self.state
+
+    def diff(self, source_id: str, tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per-table changes since the source's recorded tables
+
+        Each entry has 'headers', 'status' (new, removed or modified) and the
+        added/removed/modified rows. Unchanged tables are left out. Without
+        recorded history every table is reported as new.
+        """
+        old = self.state.get(source_id, {}).get('tables', {})
+        new = fingerprint_tables(tables)
+        changes = []
+
+        for header_hash, table in new.items():
+            if header_hash not in old:
+                changes.append({
+                    'headers': table['headers'], 'status': 'new',
+                    'added_rows': sorted(table['rows'].values()), 'removed_rows': [], 'modified_rows': []
+                })
+                continue
+            rows = diff_table(old[header_hash]['rows'], table['rows'])
+            if any(rows.values()):
+                changes.append({'headers': table['headers'], 'status': 'modified', **rows})
+
+        for header_hash in old.keys() - new.keys():
+            changes.append({
+                'headers': old[header_hash]['headers'], 'status': 'removed',
+                'added_rows': [], 'removed_rows': sorted(old[header_hash]['rows'].values()),
+                'modified_rows': []
+            })
+        return changes
+
+    def record(self, source_id: str, tables: List[Dict[str, Any]]):
+        """Make these tables the source's baseline for the next diff"""
+        fingerprints = fingerprint_tables(tables)
+        if self.state.get(source_id, {}).get('tables') == fingerprints:
+            return
+        self.state[source_id] = {'updated_at': datetime.now().isoformat(), 'tables': fingerprints}
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
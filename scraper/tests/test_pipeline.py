@@ -3,15 +3,100 @@
 Tests for the MedKitt Scraping Pipeline
 """
 
+import re
+import json
 import sys
+import time
+import random
+import subprocess
+import tempfile
+import urllib.error
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 from pathlib import Path
+from unittest import mock
 
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from service import MedKittScraper
+import service
+from service import MedKittScraper, ScrapeResult, DomainThrottle
+import scheduler
 from updater import MedKittUpdater
+from change_scoring import DifflibScorer, ShingleScorer, build_scorer
+from snapshot_store import SnapshotStore
+from pubmed_engine import PubMedEngine
+from keyword_matcher import KeywordMatcher
+from source_schedule import SourceSchedule
+from browser_pool import BrowserPool
+import browser_pool
+from ts_parser import extract_nodes, parse_declarations
+from section_extractor import extract_sections, diff_sections
+from table_index import TableIndex, normalize_cell
+from consult_index import ConsultIndex
+from review_queue import ReviewQueue
+from processed_ledger import ProcessedLedger
+import processed_ledger
+import updater as updater_module
+import export_consults
+import config_loader
+from config_loader import ConfigError, load_config
+from fetch import Retrier, CircuitBreaker, CircuitOpenError, parse_retry_after
+from transport import Transport, EutilsClient
+import metrics
+
+
+class StubPageHandler(BaseHTTPRequestHandler):
+    """Serves a fixed FDA-like page with an ETag and honours If-None-Match"""
+    
+    etag = '"v1"'
+    body = (b'<html><body><div class="views-row"><a href="/a1">'
+            b'Warfarin safety communication</a></div></body></html>')
+    requests_seen = []
+    
+    def do_GET(self):
+        type(self).requests_seen.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+    
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(handler):
+    """Start a local HTTP server in a background thread, returning (server, base_url)"""
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def isolated_data_dirs(test_case):
+    """Point the scraper's data paths at a temporary directory for one test"""
+    tmp = Path(tempfile.mkdtemp())
+    patches = [
+        mock.patch.object(service, 'RAW_DIR', tmp / 'raw'),
+        mock.patch.object(service, 'SNAPSHOTS_DIR', tmp / 'snapshots'),
+        mock.patch.object(service, 'HASHES_DIR', tmp / 'hashes'),
+        mock.patch.object(service, 'VALIDATORS_FILE', tmp / 'http_validators.json'),
+        mock.patch.object(service, 'FETCH_ROUTES_FILE', tmp / 'fetch_routes.json'),
+    ]
+    for p in patches:
+        p.start()
+        test_case.addCleanup(p.stop)
+    (tmp / 'raw').mkdir()
+    (tmp / 'hashes').mkdir()
+    return tmp
 
 class TestScraper(unittest.TestCase):
     """Test cases for the scraper"""
@@ -86,6 +171,799 @@ class TestScraper(unittest.TestCase):
         # Same content = 0% change
         pct_same = self.scraper._calculate_change_percentage(old, old)
         self.assertEqual(pct_same, 0, "Same content should be 0% change")
+    
+    def test_import_has_no_side_effects(self):
+        """Importing the pipeline loads no heavy clients and writes no files"""
+        with tempfile.TemporaryDirectory() as tmp:
+            code = (
+                "import sys; sys.path.insert(0, sys.argv[1]); "
+                "import service, updater, scheduler; "
+                "print(' '.join(m for m in ('Bio', 'requests', 'scrapling') if m in sys.modules))"
+            )
+            logs_before = set(service.LOGS_DIR.glob('*.log')) if service.LOGS_DIR.exists() else set()
+            output = subprocess.run(
+                [sys.executable, '-c', code, str(Path(service.__file__).parent)],
+                cwd=tmp, capture_output=True, text=True, check=True
+            ).stdout.strip()
+            logs_after = set(service.LOGS_DIR.glob('*.log')) if service.LOGS_DIR.exists() else set()
+        self.assertEqual(output, '')
+        self.assertEqual(logs_after, logs_before)
+    
+    def test_clients_built_on_first_use(self):
+        """HTTP session and PubMed engine are created lazily, once"""
+        scraper = MedKittScraper()
+        self.assertIsNone(scraper._transport)
+        self.assertIsNone(scraper._pubmed)
+        self.assertIs(scraper.session, scraper.session)
+        self.assertEqual(scraper.session.headers['User-Agent'], scraper.config['scraper']['user_agent'])
+        self.assertIs(scraper.pubmed, scraper.pubmed)
+        self.assertIs(scraper.pubmed.entrez.session, scraper.session)
+        scraper.close()
+
+
+class TestChangeScoring(unittest.TestCase):
+    """Test cases for the change scoring engines"""
+    
+    OLD = ("Benzathine penicillin G 2.4 million units IM in a single dose is the "
+           "recommended regimen for primary, secondary and early latent syphilis. ") * 20
+    
+    def test_shingle_bounds(self):
+        """Identical text scores 0, disjoint text scores 1"""
+        scorer = ShingleScorer()
+        self.assertEqual(scorer.score(self.OLD, self.OLD), 0.0)
+        self.assertEqual(scorer.score(self.OLD, "completely unrelated words only here " * 20), 1.0)
+        self.assertEqual(scorer.score("", ""), 0.0)
+        self.assertEqual(scorer.score("", "new"), 1.0)
+    
+    def test_shingle_tracks_difflib(self):
+        """Small edits score low and larger edits score higher, like difflib"""
+        small = self.OLD.replace("single dose", "two doses", 1)
+        large = self.OLD.replace("penicillin", "doxycycline")
+        shingle, reference = ShingleScorer(), DifflibScorer()
+        
+        self.assertLess(shingle.score(self.OLD, small), 0.1)
+        self.assertLess(shingle.score(self.OLD, small), shingle.score(self.OLD, large))
+        self.assertLess(reference.score(self.OLD, small), reference.score(self.OLD, large))
+    
+    def test_minhash_estimate(self):
+        """MinHash estimate stays close to the exact shingle score"""
+        new = self.OLD.replace("penicillin", "doxycycline", 10)
+        exact = ShingleScorer(3).score(self.OLD, new)
+        estimate = ShingleScorer(3, minhash_permutations=256).score(self.OLD, new)
+        self.assertAlmostEqual(exact, estimate, delta=0.15)
+    
+    def test_build_scorer(self):
+        """Engines are selected from config"""
+        self.assertIsInstance(build_scorer({'engine': 'difflib'}), DifflibScorer)
+        self.assertEqual(build_scorer({'shingle_size': 2}).shingle_size, 2)
+        with self.assertRaises(ValueError):
+            build_scorer({'engine': 'nope'})
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    """Test cases for the compiled multi-keyword matcher"""
+    
+    def setUp(self):
+        self.matcher = KeywordMatcher(['stroke', 'ischemic stroke', 'PE', 'lumbar', 'lumbar puncture', 'FTA-ABS'])
+    
+    def test_whole_word_case_insensitive(self):
+        """Keywords match whole words regardless of case"""
+        self.assertEqual(self.matcher.matched_keywords("Acute PE on CT"), ['PE'])
+        self.assertEqual(self.matcher.matched_keywords("prescription pending"), [])
+        self.assertEqual(self.matcher.matched_keywords("reactive fta-abs"), ['FTA-ABS'])
+    
+    def test_overlapping_keywords(self):
+        """Overlapping keywords are all reported, in configuration order"""
+        text = "Ischemic stroke after lumbar puncture"
+        self.assertEqual(
+            self.matcher.matched_keywords(text),
+            ['stroke', 'ischemic stroke', 'lumbar', 'lumbar puncture']
+        )
+    
+    def test_offsets(self):
+        """Match offsets point at the keyword in the original text"""
+        text = "PE ruled out; repeat PE study"
+        offsets = self.matcher.offsets(text)
+        self.assertEqual(offsets, {'PE': [(0, 2), (21, 23)]})
+        self.assertTrue(all(text[s:e] == 'PE' for s, e in offsets['PE']))
+    
+    def test_unicode_case_folding(self):
+        """Non-ASCII characters that fold to a keyword's letters still report it"""
+        matcher = KeywordMatcher(['sepsis', 'ketamine', 'lumbar', 'lumbar puncture'])
+        self.assertEqual(matcher.matched_keywords("Early ſepſis bundle"), ['sepsis'])
+        self.assertEqual(matcher.offsets("\u212aetamine 1 mg/kg"), {'ketamine': [(0, 8)]})
+        self.assertEqual(matcher.matched_keywords("SEPS\u0130S, lumbar puncture"), ['sepsis', 'lumbar', 'lumbar puncture'])
+
+
+class TestTSParser(unittest.TestCase):
+    """Test cases for the TypeScript decision tree parser"""
+    
+    def test_nested_objects_and_escapes(self):
+        """Nested objects, escaped quotes and unicode escapes are parsed in full"""
+        source = """
+import type { DecisionNode } from '../../models/types.js';
+// leading comment, with a { brace
+export const DEMO_NODES: DecisionNode[] = [
+  {
+    id: 'demo-start',
+    type: 'question',
+    module: 1,
+    title: 'Patient\\'s Status',
+    body: 'First line\\nSecond \\u2014 line' + " (continued)",
+    citation: [1, 2],
+    options: [
+      { label: 'Stable', next: 'demo-end', urgency: 'routine' },
+      { label: "Unstable, {braces}", next: 'demo-end', },
+    ],
+  },
+  {
+    id: 'demo-end',
+    type: 'result',
+    title: `Done`,
+    confidence: 'recommended',
+    treatment: { firstLine: { drug: 'X', dose: '1 mg/kg' } },
+  },
+];
+"""
+        nodes = extract_nodes(source)
+        self.assertEqual([n['id'] for n in nodes], ['demo-start', 'demo-end'])
+        start = nodes[0]
+        self.assertEqual(start['title'], "Patient's Status")
+        self.assertEqual(start['body'], "First line\nSecond — line (continued)")
+        self.assertEqual(start['citation'], [1, 2])
+        self.assertEqual(start['options'][1]['label'], "Unstable, {braces}")
+        self.assertEqual(nodes[1]['treatment']['firstLine']['dose'], '1 mg/kg')
+        self.assertEqual(nodes[1]['title'], 'Done')
+    
+    def test_unresolved_expressions_kept_as_source(self):
+        """Identifiers and calls are returned as their source text"""
+        declarations = parse_declarations("export const X = { a: OTHER.b, c: f(1, [2]), d: null };")
+        self.assertEqual(declarations['X'], {'a': 'OTHER.b', 'c': 'f(1, [2])', 'd': None})
+    
+    def test_all_trees_parse(self):
+        """Every tree in the repo parses quickly with unique node ids"""
+        trees_dir = Path(__file__).parent.parent.parent / "src" / "data" / "trees"
+        tree_files = [p for p in trees_dir.glob("*.ts") if p.name != "index.ts"]
+        if not tree_files:
+            self.skipTest("No decision trees found")
+        
+        for path in tree_files:
+            source = path.read_text()
+            start = time.perf_counter()
+            nodes = extract_nodes(source)
+            elapsed = time.perf_counter() - start
+            
+            self.assertTrue(nodes, path.name)
+            ids = [node['id'] for node in nodes]
+            self.assertEqual(len(ids), len(set(ids)), path.name)
+            if "_NODES" in source:
+                # Top-level node ids only; nested objects (calculatorLinks) have ids too
+                self.assertEqual(len(ids), len(re.findall(r"^    id: '", source, re.M)), path.name)
+            self.assertLess(elapsed, 0.5, path.name)
+
+
+class TestExportConsults(unittest.TestCase):
+    """Test cases for the consult JSON exporter"""
+    
+    def test_discovers_all_trees(self):
+        """Every tree file except index.ts is exported, with configured names"""
+        consults = export_consults.discover_consults()
+        ids = [consult[1] for consult in consults]
+        expected = sorted(p.stem for p in export_consults.TREES_DIR.glob("*.ts") if p.name != "index.ts")
+        self.assertEqual(ids, expected)
+        names = {consult[1]: consult[2] for consult in consults}
+        self.assertEqual(names.get('pep'), 'Post Exposure Prophylaxis')
+    
+    def test_export_full_nodes(self):
+        """Exported JSON carries the parsed nodes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = Path(tmp) / "pep.json"
+            exported = export_consults.export_consult(
+                export_consults.TREES_DIR / "pep.ts", 'pep', 'PEP', output_path
+            )
+            self.assertTrue(exported)
+            data = json.loads(output_path.read_text())
+            self.assertEqual(data['node_count'], len(data['nodes']))
+            self.assertEqual(data['nodes'][0]['id'], 'pep-start')
+            self.assertIn('options', data['nodes'][0])
+    
+    def test_incremental_export(self):
+        """Unchanged trees are skipped and keep their last_updated"""
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            with mock.patch.object(export_consults, 'BASE_DIR', tmp), \
+                 mock.patch.object(export_consults, 'CONSULTS_DIR', tmp / "consults"):
+                manifest_path = tmp / "export_manifest.json"
+                manifest = export_consults.ExportManifest(manifest_path)
+                
+                first = export_consults.export_all(['pep', 'stroke'], verbose=False, manifest=manifest)
+                self.assertEqual(sorted(r['consult_id'] for r in first), ['pep', 'stroke'])
+                self.assertTrue(all(r['changed'] for r in first))
+                
+                # Manifest says both are current
+                again = export_consults.export_all(
+                    ['pep', 'stroke'], verbose=False, manifest=export_consults.ExportManifest(manifest_path)
+                )
+                self.assertEqual(again, [])
+                
+                # Forced re-export rewrites nothing and keeps the timestamp
+                forced = export_consults.export_all(
+                    ['pep'], verbose=False, force=True, manifest=export_consults.ExportManifest(manifest_path)
+                )
+                self.assertFalse(forced[0]['changed'])
+                pep_first = next(r for r in first if r['consult_id'] == 'pep')
+                self.assertEqual(forced[0]['last_updated'], pep_first['last_updated'])
+                
+                # Editing the output invalidates the manifest entry
+                output_path = Path(pep_first['output'])
+                output_path.write_text(output_path.read_text().replace('pep-start', 'pep-begin', 1))
+                redone = export_consults.export_all(
+                    ['pep'], verbose=False, manifest=export_consults.ExportManifest(manifest_path)
+                )
+                self.assertTrue(redone[0]['changed'])
+
+
+class TestSnapshotStore(unittest.TestCase):
+    """Test cases for the content-addressed snapshot store"""
+    
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.store = SnapshotStore(self.tmp / 'snapshots', legacy_dir=self.tmp / 'raw')
+    
+    def test_dedup_and_manifest(self):
+        """Identical content is stored once and the manifest tracks latest/previous"""
+        self.store.put('src', {'content': 'a'}, 'aa11')
+        self.store.put('src', {'content': 'a'}, 'aa11')
+        self.assertEqual(len(list(self.store.objects_dir.rglob('*.json.gz'))), 1)
+        self.assertIsNone(self.store.manifest('src')['previous'])
+        
+        self.store.put('src', {'content': 'b'}, 'bb22')
+        manifest = self.store.manifest('src')
+        self.assertEqual(manifest['latest']['hash'], 'bb22')
+        self.assertEqual(manifest['previous']['hash'], 'aa11')
+        self.assertEqual(self.store.latest('src'), {'content': 'b'})
+        self.assertEqual(self.store.previous('src'), {'content': 'a'})
+    
+    def test_legacy_fallback(self):
+        """Sources never stored fall back to the newest legacy raw file"""
+        (self.tmp / 'raw').mkdir()
+        (self.tmp / 'raw' / 'src_20260101_000000.json').write_text('{"content": "old"}')
+        (self.tmp / 'raw' / 'src_20260102_000000.json').write_text('{"content": "new"}')
+        self.assertEqual(self.store.latest('src'), {'content': 'new'})
+        self.assertIsNone(self.store.latest('other'))
+    
+    def test_hash_ignores_scrape_time(self):
+        """Content hash does not change when only scraped_at differs"""
+        scraper = MedKittScraper()
+        first = scraper._content_hash({'content': 'x', 'scraped_at': '2026-01-01T00:00:00'})
+        second = scraper._content_hash({'content': 'x', 'scraped_at': '2026-01-02T00:00:00'})
+        self.assertEqual(first, second)
+
+
+class FakeHandle:
+    """Handle returned by FakeEntrez; carries the prepared record"""
+    
+    def __init__(self, record):
+        self.record = record
+    
+    def close(self):
+        pass
+
+
+class FakeEntrez:
+    """Local stand-in for Bio.Entrez serving canned search results and articles"""
+    
+    def __init__(self, results):
+        self.results = results  # query -> list of PMIDs
+        self.calls = []
+    
+    def esearch(self, **params):
+        self.calls.append(('esearch', params))
+        pmids = self.results[params['term']]
+        start = params.get('retstart', 0)
+        return FakeHandle({'IdList': pmids[start:start + params.get('retmax', len(pmids))],
+                           'Count': str(len(pmids))})
+    
+    def epost(self, **params):
+        self.calls.append(('epost', params))
+        self.posted = params['id'].split(',')
+        return FakeHandle({'WebEnv': 'env1', 'QueryKey': '1'})
+    
+    def efetch(self, **params):
+        self.calls.append(('efetch', params))
+        batch = self.posted[params['retstart']:params['retstart'] + params['retmax']]
+        return FakeHandle({'PubmedArticle': [
+            {'MedlineCitation': {'PMID': pmid, 'Article': {'ArticleTitle': f"Article {pmid}"}}}
+            for pmid in batch
+        ]})
+    
+    def read(self, handle):
+        return handle.record
+
+
+class TestPubMedEngine(unittest.TestCase):
+    """Test cases for batched PubMed retrieval"""
+    
+    SOURCES = {
+        'pubmed_a': {'search_query': 'query a', 'max_results': 10},
+        'pubmed_b': {'search_query': 'query b', 'max_results': 10},
+    }
+    
+    def setUp(self):
+        self.cache_path = Path(tempfile.mkdtemp()) / 'pubmed_cache.json'
+        self.entrez = FakeEntrez({'query a': ['1', '2', '3'], 'query b': ['3', '4', '5']})
+    
+    def _methods(self):
+        return [name for name, _ in self.entrez.calls]
+    
+    def test_batched_fetch_of_union(self):
+        """Overlapping PMIDs are posted once and fetched in batches"""
+        engine = PubMedEngine(self.entrez, self.cache_path, batch_size=2, request_interval=0)
+        searches = engine.run(self.SOURCES)
+        
+        self.assertEqual(self._methods(), ['esearch', 'esearch', 'epost', 'efetch', 'efetch', 'efetch'])
+        self.assertEqual(self.entrez.posted, ['1', '2', '3', '4', '5'])
+        self.assertEqual([a['pmid'] for a in searches['pubmed_b'].articles], ['3', '4', '5'])
+        self.assertEqual(searches['pubmed_a'].articles[0]['title'], 'Article 1')
+    
+    def test_cached_pmids_not_refetched(self):
+        """A second run only searches; cached articles are reused from disk"""
+        PubMedEngine(self.entrez, self.cache_path, request_interval=0).run(self.SOURCES)
+        self.entrez.calls = []
+        
+        engine = PubMedEngine(self.entrez, self.cache_path, request_interval=0)
+        searches = engine.run(self.SOURCES)
+        self.assertEqual(self._methods(), ['esearch', 'esearch'])
+        self.assertEqual(len(searches['pubmed_a'].articles), 3)
+    
+    def test_incremental_search_merges_new_records(self):
+        """After a successful run only records added since the watermark are requested"""
+        state_path = self.cache_path.with_name('watermarks.json')
+        PubMedEngine(self.entrez, self.cache_path, state_path, request_interval=0).run(
+            self.SOURCES, today='2026/10/17')
+        
+        self.entrez.results['query a'] = ['6', '1']
+        self.entrez.calls = []
+        engine = PubMedEngine(self.entrez, self.cache_path, state_path, request_interval=0)
+        searches = engine.run(self.SOURCES, today='2026/10/18')
+        
+        params = self.entrez.calls[0][1]
+        self.assertEqual(params['datetype'], 'edat')
+        self.assertEqual(params['mindate'], '2026/10/17')
+        self.assertEqual(params['maxdate'], '2026/10/18')
+        self.assertEqual(searches['pubmed_a'].pmids, ['6', '1', '2', '3'])
+        self.assertEqual(searches['pubmed_a'].new_pmids, ['6'])
+        self.assertEqual(self.entrez.posted, ['6'])
+        self.assertEqual(engine.state['pubmed_a']['last_run'], '2026/10/18')
+    
+    def test_incremental_search_pages_past_max_new_results(self):
+        """New records beyond max_new_results are paged in, not dropped behind the watermark"""
+        state_path = self.cache_path.with_name('watermarks.json')
+        PubMedEngine(self.entrez, self.cache_path, state_path, request_interval=0).run(
+            self.SOURCES, today='2026/10/17')
+        
+        self.entrez.results['query a'] = ['10', '9', '8', '7', '6']
+        self.entrez.calls = []
+        engine = PubMedEngine(self.entrez, self.cache_path, state_path, request_interval=0,
+                              max_new_results=2)
+        searches = engine.run({'pubmed_a': self.SOURCES['pubmed_a']}, today='2026/10/18')
+        
+        starts = [params.get('retstart', 0) for name, params in self.entrez.calls if name == 'esearch']
+        self.assertEqual(starts, [0, 2, 4])
+        self.assertEqual(searches['pubmed_a'].new_pmids, ['10', '9', '8', '7', '6'])
+        self.assertEqual(engine.state['pubmed_a']['last_run'], '2026/10/18')
+    
+    def test_changed_query_resets_watermark(self):
+        """Editing a source's query falls back to a full search"""
+        state_path = self.cache_path.with_name('watermarks.json')
+        PubMedEngine(self.entrez, self.cache_path, state_path, request_interval=0).run(
+            self.SOURCES, today='2026/10/17')
+        
+        self.entrez.results['query a2'] = ['9']
+        self.entrez.calls = []
+        engine = PubMedEngine(self.entrez, self.cache_path, state_path, request_interval=0)
+        searches = engine.run({'pubmed_a': {'search_query': 'query a2', 'max_results': 10}})
+        
+        self.assertNotIn('mindate', self.entrez.calls[0][1])
+        self.assertEqual(searches['pubmed_a'].pmids, ['9'])
+    
+    def test_search_error_is_per_source(self):
+        """A failing search marks only that source as failed"""
+        engine = PubMedEngine(self.entrez, self.cache_path, request_interval=0)
+        sources = dict(self.SOURCES, pubmed_c={'search_query': 'missing'})
+        searches = engine.run(sources)
+        self.assertIsNotNone(searches['pubmed_c'].error)
+        self.assertIsNone(searches['pubmed_a'].error)
+
+
+class TestConcurrentScrape(unittest.TestCase):
+    """Test cases for per-domain concurrent scraping"""
+    
+    def setUp(self):
+        self.scraper = MedKittScraper()
+        self.scraper.throttle = DomainThrottle(0.0)
+        self.active = {}
+        self.overlap = False
+        self.lock = threading.Lock()
+    
+    def _fake_scrape(self, source_id):
+        host = self.scraper._source_host(self.scraper.config['sources'][source_id])
+        with self.lock:
+            if self.active.get(host):
+                self.overlap = True
+            self.active[host] = True
+        time.sleep(0.01)
+        with self.lock:
+            self.active[host] = False
+        return ScrapeResult(
+            source_id=source_id, source_name='', url='', timestamp='',
+            status='success', content_hash='', previous_hash=None, data={}
+        )
+    
+    def _fake_batch(self, sources):
+        return {source_id: self._fake_scrape(source_id) for source_id in sources}
+    
+    def test_results_in_config_order(self):
+        """Concurrent scrape returns results in configuration order"""
+        with mock.patch.object(self.scraper, 'scrape_source', side_effect=self._fake_scrape), \
+                mock.patch.object(self.scraper, 'scrape_pubmed_batch', side_effect=self._fake_batch):
+            results = self.scraper.scrape_all(concurrent=True)
+        
+        self.assertEqual(
+            [r.source_id for r in results],
+            list(self.scraper.config['sources'].keys())
+        )
+        self.assertFalse(self.overlap, "Two requests to the same host were in flight at once")
+    
+    def test_throttle_spaces_same_host(self):
+        """Consecutive requests to one host wait for that host's delay"""
+        throttle = DomainThrottle(0.0, {'slow.example': 0.05})
+        start = time.monotonic()
+        for _ in range(3):
+            with throttle.slot('slow.example'):
+                pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        
+        start = time.monotonic()
+        for _ in range(3):
+            with throttle.slot('fast.example'):
+                pass
+        self.assertLess(time.monotonic() - start, 0.05)
+    
+    def test_throttle_host_concurrency(self):
+        """A host with concurrency N has at most N requests in flight"""
+        throttle = DomainThrottle(0.0, domain_concurrency={'www.cdc.gov': 2})
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+        
+        def request():
+            with throttle.slot('www.cdc.gov'):
+                with lock:
+                    in_flight.append(1)
+                    peak.append(len(in_flight))
+                time.sleep(0.02)
+                with lock:
+                    in_flight.pop()
+        
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(max(peak), 2)
+
+
+class FakeBrowserSession:
+    """Browser session stand-in that records its lifecycle"""
+    
+    instances = []
+    
+    def __init__(self, fail_on=None):
+        self.started = False
+        self.closed = False
+        self.thread = None
+        self.close_thread = None
+        self.fail_on = fail_on
+        FakeBrowserSession.instances.append(self)
+    
+    def start(self):
+        self.started = True
+        self.thread = threading.get_ident()
+    
+    def fetch(self, url, **kwargs):
+        # Sessions must only be used from the thread that started them
+        assert threading.get_ident() == self.thread
+        if url == self.fail_on:
+            raise RuntimeError("render failed")
+        time.sleep(0.02)
+        return f"page:{url}"
+    
+    def close(self):
+        self.closed = True
+        self.close_thread = threading.get_ident()
+
+
+class TestBrowserPool(unittest.TestCase):
+    """Test cases for the pooled browser sessions"""
+    
+    def setUp(self):
+        FakeBrowserSession.instances = []
+    
+    def test_parallel_bounded_rendering(self):
+        """Pages render in parallel on at most `size` reused sessions"""
+        pool = BrowserPool(FakeBrowserSession, size=2, max_pages=0)
+        self.addCleanup(pool.close)
+        with ThreadPoolExecutor(max_workers=4) as callers:
+            start = time.monotonic()
+            pages = list(callers.map(pool.fetch, [f"u{i}" for i in range(4)]))
+            elapsed = time.monotonic() - start
+        
+        self.assertEqual(pages, [f"page:u{i}" for i in range(4)])
+        self.assertEqual(len(FakeBrowserSession.instances), 2)
+        self.assertLess(elapsed, 0.08)
+        self.assertEqual(pool.stats()['pages_served'], 4)
+    
+    def test_recycles_after_max_pages(self):
+        """A session is closed and replaced after max_pages"""
+        pool = BrowserPool(FakeBrowserSession, size=1, max_pages=2)
+        for i in range(5):
+            pool.fetch(f"u{i}")
+        pool.close()
+        
+        self.assertEqual(len(FakeBrowserSession.instances), 3)
+        self.assertTrue(all(session.closed for session in FakeBrowserSession.instances))
+        self.assertEqual(pool.stats()['recycled'], 2)
+    
+    def test_sessions_closed_on_their_own_threads(self):
+        """close() shuts every session down on the worker that started it"""
+        pool = BrowserPool(FakeBrowserSession, size=3, max_pages=0)
+        with ThreadPoolExecutor(max_workers=3) as callers:
+            list(callers.map(pool.fetch, [f"u{i}" for i in range(6)]))
+        pool.close()
+        
+        self.assertEqual(len(FakeBrowserSession.instances), 3)
+        for session in FakeBrowserSession.instances:
+            self.assertTrue(session.closed)
+            self.assertEqual(session.close_thread, session.thread)
+        self.assertEqual(pool.stats()['open_sessions'], 0)
+        with self.assertRaises(RuntimeError):
+            pool.fetch('late')
+    
+    def test_serial_fetches_reuse_one_session(self):
+        """An idle session is reused before another browser is started"""
+        pool = BrowserPool(FakeBrowserSession, size=2, max_pages=0)
+        self.addCleanup(pool.close)
+        for i in range(3):
+            pool.fetch(f"u{i}")
+        self.assertEqual(len(FakeBrowserSession.instances), 1)
+    
+    def test_memory_measured_per_session(self):
+        """Only the processes a session spawned count against max_memory_mb"""
+        spawned = iter([set(), {101, 102}, {101, 102}, {101, 102, 201}])
+        memory = {frozenset({101, 102}): 300.0, frozenset({201}): 50.0}
+        with mock.patch.object(browser_pool, 'PSUTIL_AVAILABLE', True), \
+             mock.patch.object(browser_pool, '_child_pids', side_effect=lambda: next(spawned)), \
+             mock.patch.object(browser_pool, '_processes_memory_mb',
+                               side_effect=lambda pids: memory[frozenset(pids)]):
+            pool = BrowserPool(FakeBrowserSession, size=1, max_pages=0, max_memory_mb=200)
+            pool.fetch('u0')  # first session's browsers use 300 MB: recycled
+            pool.fetch('u1')  # the second session only has 201
+            pool.close()
+        self.assertEqual(len(FakeBrowserSession.instances), 2)
+        self.assertEqual(pool.stats()['recycled'], 1)
+    
+    def test_failed_render_replaces_session(self):
+        """A session that fails a render is discarded"""
+        pool = BrowserPool(lambda: FakeBrowserSession(fail_on='bad'), size=1)
+        self.addCleanup(pool.close)
+        with self.assertRaises(RuntimeError):
+            pool.fetch('bad')
+        self.assertEqual(pool.fetch('good'), 'page:good')
+        self.assertTrue(FakeBrowserSession.instances[0].closed)
+        self.assertEqual(len(FakeBrowserSession.instances), 2)
+
+
+class TestConditionalFetch(unittest.TestCase):
+    """Test cases for ETag / Last-Modified revalidation"""
+    
+    def setUp(self):
+        self.tmp = isolated_data_dirs(self)
+        self.server, self.base_url = start_stub_server(StubPageHandler)
+        self.addCleanup(self.server.shutdown)
+        StubPageHandler.requests_seen = []
+        self.scraper = MedKittScraper()
+        self.source_config = {
+            'name': 'Stub FDA',
+            'url': f"{self.base_url}/alerts",
+            'selectors': {'alerts': '.views-row'},
+            'drug_keywords': ['warfarin'],
+        }
+    
+    def test_not_modified_returns_unchanged(self):
+        """A 304 answer yields an unchanged result without writing raw data"""
+        first = self.scraper.scrape_fda('stub_fda', self.source_config)
+        self.assertEqual(first.status, 'success')
+        self.assertEqual(first.data['alerts'][0]['drug_offsets'], {'warfarin': [(0, 8)]})
+        self.assertNotIn('If-None-Match', StubPageHandler.requests_seen[0])
+        manifest = self.scraper.snapshots.manifest('stub_fda')
+        
+        second = self.scraper.scrape_fda('stub_fda', self.source_config)
+        self.assertEqual(StubPageHandler.requests_seen[1].get('If-None-Match'), '"v1"')
+        self.assertEqual(second.status, 'unchanged')
+        self.assertFalse(second.change_detected)
+        self.assertEqual(second.content_hash, first.content_hash)
+        self.assertEqual(self.scraper.snapshots.manifest('stub_fda'), manifest)
+    
+    def test_no_validators_without_previous_hash(self):
+        """Validators are not sent when there is no stored state to fall back on"""
+        self.scraper.scrape_fda('stub_fda', self.source_config)
+        (self.tmp / 'hashes' / 'stub_fda.hash').unlink()
+        
+        result = self.scraper.scrape_fda('stub_fda', self.source_config)
+        self.assertEqual(result.status, 'success')
+        self.assertNotIn('If-None-Match', StubPageHandler.requests_seen[1])
+
+
+class CDCPageHandler(BaseHTTPRequestHandler):
+    """Serves a static page (/static) and a JavaScript shell (/app)"""
+    
+    pages = {
+        '/static': b'<html><head><title>STI</title></head><body><nav>Menu</nav>'
+                   b'<main><p>Benzathine penicillin G 2.4 million units</p>'
+                   b'<table><tr><td>Stage</td><td>Dose</td></tr></table></main></body></html>',
+        '/app': b'<html><body><div id="root"></div><script src="app.js"></script></body></html>',
+    }
+    requests_seen = []
+    
+    def do_GET(self):
+        type(self).requests_seen.append(self.path)
+        body = self.pages[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+class FakeRenderedPage:
+    """Scrapling page stand-in returning fixed content blocks"""
+    
+    title = 'Rendered'
+    
+    def css(self, selector, adaptive=False):
+        return [mock.Mock(text='Rendered guideline text')] if selector == 'main' else []
+    
+    def css_first(self, selector, adaptive=False):
+        return None
+
+
+class TestFetchRouting(unittest.TestCase):
+    """Test cases for static-first CDC fetch routing"""
+    
+    def setUp(self):
+        self.tmp = isolated_data_dirs(self)
+        self.server, self.base_url = start_stub_server(CDCPageHandler)
+        self.addCleanup(self.server.shutdown)
+        CDCPageHandler.requests_seen = []
+        self.scraper = MedKittScraper()
+        self.scraper.fetcher = mock.Mock()
+        self.scraper.fetcher.fetch.return_value = FakeRenderedPage()
+    
+    def _config(self, path):
+        return {'name': 'Stub CDC', 'url': f"{self.base_url}{path}", 'selectors': {'content': 'main'}}
+    
+    def test_static_page_skips_browser(self):
+        """Pages whose selectors match in static HTML never reach the browser"""
+        result = self.scraper.scrape_cdc('stub_static', self._config('/static'))
+        self.assertEqual(result.status, 'success')
+        self.assertIn('Benzathine penicillin', result.data['content'])
+        self.assertNotIn('Menu', result.data['content'])
+        self.assertEqual(result.data['tables'], [[['Stage', 'Dose']]])
+        self.scraper.fetcher.fetch.assert_not_called()
+        self.assertEqual(self.scraper.fetch_routes['stub_static']['route'], 'static')
+    
+    def test_rendered_route_is_remembered(self):
+        """A page needing the browser is rendered directly on later runs"""
+        first = self.scraper.scrape_cdc('stub_app', self._config('/app'))
+        self.assertEqual(first.data['content'], 'Rendered guideline text')
+        self.assertEqual(CDCPageHandler.requests_seen, ['/app'])
+        
+        reloaded = MedKittScraper()
+        reloaded.fetcher = self.scraper.fetcher
+        reloaded.scrape_cdc('stub_app', self._config('/app'))
+        self.assertEqual(CDCPageHandler.requests_seen, ['/app'])
+        self.assertEqual(self.scraper.fetcher.fetch.call_count, 2)
+    
+    def test_rendered_route_expires(self):
+        """After the TTL a browser-routed source is probed statically again"""
+        self.scraper.scrape_cdc('stub_app', self._config('/app'))
+        self.scraper.fetch_routes['stub_app']['decided_at'] = (datetime.now() - timedelta(days=30)).isoformat()
+        self.assertEqual(self.scraper._fetch_route('stub_app'), 'static')
+    
+    def test_uncompilable_selectors_render(self):
+        """Content selectors the static parser cannot evaluate send the page to the browser"""
+        config = {**self._config('/static'), 'selectors': {'content': 'main > article, [role=main]'}}
+        with self.assertLogs('MedKittScraper', level='WARNING') as logs:
+            result = self.scraper.scrape_cdc('stub_complex', config)
+        self.assertEqual(result.status, 'success')
+        self.assertEqual(CDCPageHandler.requests_seen, [])
+        self.scraper.fetcher.fetch.assert_called_once()
+        self.assertIn('main > article, [role=main]', '\n'.join(logs.output))
+    
+    def test_unchanged_content_is_not_rewritten(self):
+        """A scrape with the same content keeps the stored snapshot and hash"""
+        with mock.patch.object(self.scraper, '_save_raw_data', wraps=self.scraper._save_raw_data) as save:
+            first = self.scraper.scrape_cdc('stub_static', self._config('/static'))
+            second = self.scraper.scrape_cdc('stub_static', self._config('/static'))
+        self.assertTrue(first.change_detected)
+        self.assertFalse(second.change_detected)
+        self.assertEqual(save.call_count, 1)
+    
+    def test_changed_sections_reported(self):
+        """A second scrape reports only the section whose text changed"""
+        page = (b'<html><body><main><h2>Screening</h2><p>Screen annually</p>'
+                b'<h2>Treatment</h2><p>%s</p></main></body></html>')
+        self.addCleanup(CDCPageHandler.pages.pop, '/sections')
+        CDCPageHandler.pages['/sections'] = page % b'Penicillin G 2.4 million units'
+        first = self.scraper.scrape_cdc('stub_sections', self._config('/sections'))
+        self.assertEqual([s['heading'] for s in first.data['sections']], ['Screening', 'Treatment'])
+        
+        CDCPageHandler.pages['/sections'] = page % b'Doxycycline 100 mg twice daily for 14 days'
+        second = self.scraper.scrape_cdc('stub_sections', self._config('/sections'))
+        self.assertTrue(second.change_detected)
+        self.assertEqual(second.changed_sections, [{'heading': 'Treatment', 'change': 'modified'}])
+        reports = self.scraper.detect_changes([second])
+        self.assertEqual(reports[0].changed_sections, second.changed_sections)
+
+
+class TestSectionExtractor(unittest.TestCase):
+    """Test cases for streaming section extraction and section diffs"""
+    
+    html = ('<html><head><title>Syphilis</title><script>var x = "<h2>no</h2>";</script></head>'
+            '<body><nav>Home | Menu</nav><div class="content"><h2>Diagnosis</h2><p>RPR and VDRL</p>'
+            '<h2>Treatment</h2><p>Benzathine penicillin</p><table><tr><th>Stage</th><th>Dose</th></tr>'
+            '<tr><td>Primary</td><td>2.4 MU</td></tr></table></div>'
+            '<p class="updated">Last Reviewed: May 1, 2024</p><footer>Contact</footer></body></html>')
+    
+    def test_sections_from_chunks(self):
+        """Sections, tables and dates come out the same however the HTML is chunked"""
+        chunks = [self.html[i:i + 7] for i in range(0, len(self.html), 7)]
+        page = extract_sections(chunks, content_selectors='div.content', update_selectors='.updated')
+        self.assertEqual(page.title, 'Syphilis')
+        self.assertTrue(page.scoped)
+        self.assertEqual([s.heading for s in page.sections], ['Diagnosis', 'Treatment'])
+        self.assertEqual(page.sections[0].text, 'RPR and VDRL')
+        self.assertEqual(page.tables, [[['Stage', 'Dose'], ['Primary', '2.4 MU']]])
+        self.assertEqual(page.last_updated, 'Last Reviewed: May 1, 2024')
+        self.assertEqual(page, extract_sections([self.html], 'div.content', 'table', '.updated'))
+    
+    def test_unscoped_page_skips_chrome(self):
+        """Without a selector match the body is used, minus scripts and navigation"""
+        page = extract_sections([self.html], content_selectors='#missing')
+        self.assertFalse(page.scoped)
+        self.assertIn('Last Reviewed', page.content)
+        self.assertNotIn('Menu', page.content)
+        self.assertNotIn('Contact', page.content)
+        self.assertNotIn('no', [s.heading for s in page.sections])
+    
+    def test_diff_sections(self):
+        """Only sections whose hash changed are scored and reported"""
+        old = [s.to_dict() for s in extract_sections([self.html], 'div.content').sections]
+        new = [dict(s) for s in old]
+        new[1] = dict(new[1], text='Doxycycline', hash='changed')
+        new.append({'heading': 'Follow-up', 'text': 'Repeat titers', 'hash': 'x'})
+        scored = []
+        changed, fraction = diff_sections(old, new, lambda a, b: scored.append((a, b)) or 1.0)
+        self.assertEqual(changed, [{'heading': 'Treatment', 'change': 'modified'},
+                                   {'heading': 'Follow-up', 'change': 'added'}])
+        self.assertEqual(scored, [(old[1]['text'], 'Doxycycline')])
+        self.assertGreater(fraction, 0.0)
+        self.assertLess(fraction, 1.0)
+        self.assertEqual(diff_sections(old, old, lambda a, b: 1.0), ([], 0.0))
 
 
 class TestUpdater(unittest.TestCase):
@@ -93,12 +971,26 @@ class TestUpdater(unittest.TestCase):
     
     @classmethod
     def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.index_patch = mock.patch.object(updater_module, 'CONSULT_INDEX_FILE',
+                                            Path(cls.tmp.name) / 'consult_index.json')
+        cls.index_patch.start()
         cls.updater = MedKittUpdater()
+        cls.updater.review_queue = ReviewQueue(Path(cls.tmp.name) / 'review_queue.db')
+        cls.updater.ledger = ProcessedLedger(Path(cls.tmp.name) / 'ledger.db')
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.updater.review_queue.close()
+        cls.updater.ledger.close()
+        cls.index_patch.stop()
+        cls.tmp.cleanup()
     
     def test_review_queue_loading(self):
         """Test that review queue can be loaded"""
-        # Should return list (empty or with items)
-        self.assertIsInstance(self.updater.review_queue, list)
+        # Should be a queue with a count (empty or with items)
+        self.assertIsInstance(self.updater.review_queue, ReviewQueue)
+        self.assertIsInstance(self.updater.get_status()['pending_reviews'], int)
     
     def test_consult_loading(self):
         """Test loading a consult"""
@@ -111,6 +1003,887 @@ class TestUpdater(unittest.TestCase):
                 self.assertEqual(consult.consult_id, consult_id)
                 self.assertIsNotNone(consult.content)
                 self.assertIsInstance(consult.nodes, list)
+    
+    def test_process_scrape_results_in_memory(self):
+        """Scraped data passed in is analyzed without re-reading snapshots"""
+        result = ScrapeResult(
+            source_id='cdc_syphilis_detail',
+            source_name='CDC Syphilis Information',
+            url='https://www.cdc.gov/syphilis/about/index.html',
+            timestamp='2024-01-01T00:00:00',
+            status='success',
+            content_hash='abc',
+            previous_hash=None,
+            data={'content': 'Neurosyphilis: RPR and VDRL testing', 'tables': []}
+        )
+        with mock.patch.object(self.updater.snapshots, 'latest') as latest:
+            results = self.updater.process_all_sources(dry_run=True, scrape_results=[result])
+        latest.assert_not_called()
+        self.assertEqual(results['processed'], 1)
+        self.assertEqual(results['errors'], 0)
+    
+    def test_processed_content_is_skipped(self):
+        """A second run on the same content does not re-apply or re-queue anything"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        result = ScrapeResult(
+            source_id='cdc_syphilis_detail',
+            source_name='CDC Syphilis Information',
+            url='https://www.cdc.gov/syphilis/about/index.html',
+            timestamp='2024-01-01T00:00:00',
+            status='success',
+            content_hash='abc',
+            previous_hash=None,
+            data={'content': f"Neurosyphilis: RPR and VDRL testing {tmp.name}", 'tables': []}
+        )
+        with mock.patch.object(self.updater, 'table_index', TableIndex(Path(tmp.name) / 'tables.json')), \
+             mock.patch.object(self.updater, 'apply_minor_update', return_value=True) as apply:
+            first = self.updater.process_all_sources(dry_run=False, scrape_results=[result])
+            second = self.updater.process_all_sources(dry_run=False, scrape_results=[result])
+            forced = self.updater.process_all_sources(dry_run=False, scrape_results=[result], force=True)
+        
+        self.assertEqual(first['auto_updated'], 1)
+        self.assertEqual(second['already_processed'], 1)
+        self.assertEqual(second['auto_updated'], 0)
+        self.assertEqual(forced['auto_updated'], 1)
+        self.assertEqual(apply.call_count, 2)
+        
+        # A new consult version is checked against the same content again
+        consult = self.updater._load_consult('neurosyphilis')
+        content_hash = processed_ledger.source_hash(result.data)
+        self.assertTrue(self.updater.ledger.seen('cdc_syphilis_detail', 'neurosyphilis', content_hash, consult.version))
+        self.assertFalse(self.updater.ledger.seen('cdc_syphilis_detail', 'neurosyphilis', content_hash, '9.9.9'))
+    
+    def test_candidates_carry_source_content_hash(self):
+        """Review items are keyed on the hash of the content they were derived from"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        data = {'content': f"Neurosyphilis: RPR and VDRL testing {tmp.name}", 'tables': [],
+                'scraped_at': '2024-01-01T00:00:00'}
+        with mock.patch.object(self.updater, 'table_index', TableIndex(Path(tmp.name) / 'tables.json')):
+            candidates = self.updater.analyze_changes('cdc_syphilis_detail', raw_data=data, skip_processed=False)
+        self.assertTrue(candidates)
+        for candidate in candidates:
+            self.assertEqual(candidate.content_hash, processed_ledger.source_hash(data))
+    
+    def test_unchanged_processed_result_is_skipped(self):
+        """An unchanged result whose content was processed loads nothing"""
+        result = ScrapeResult(
+            source_id='cdc_syphilis_detail', source_name='CDC Syphilis Information',
+            url='https://www.cdc.gov/syphilis/about/index.html', timestamp='2024-01-01T00:00:00',
+            status='unchanged', content_hash='seen-hash', previous_hash='seen-hash', data={}
+        )
+        self.updater.ledger.mark('cdc_syphilis_detail', 'neurosyphilis', 'seen-hash', '1.0')
+        with mock.patch.object(self.updater.snapshots, 'latest') as latest, \
+             mock.patch.object(self.updater, '_load_consult') as load:
+            results = self.updater.process_all_sources(dry_run=True, scrape_results=[result])
+        latest.assert_not_called()
+        load.assert_not_called()
+        self.assertEqual(results['already_processed'], 1)
+        self.assertEqual(results['processed'], 0)
+    
+    def test_unprocessed_unchanged_content_needs_processing(self):
+        """Content saved by a run whose update never finished is still handed to the updater"""
+        result = ScrapeResult(
+            source_id='cdc_syphilis_detail', source_name='CDC Syphilis Information',
+            url='https://www.cdc.gov/syphilis/about/index.html', timestamp='2024-01-01T00:00:00',
+            status='unchanged', content_hash='orphaned-hash', previous_hash='orphaned-hash', data={}
+        )
+        self.assertTrue(self.updater.needs_processing(result))
+        self.updater.ledger.mark('cdc_syphilis_detail', 'neurosyphilis', 'orphaned-hash', '1.0')
+        self.assertFalse(self.updater.needs_processing(result))
+        result.status = 'error'
+        result.change_detected = True
+        self.assertFalse(self.updater.needs_processing(result))
+    
+    def test_table_row_changes(self):
+        """A changed dose in a recorded treatment table is reported row by row"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        table_index = TableIndex(Path(tmp.name) / 'table_index.json')
+        
+        def raw(dose):
+            return {'content': 'Syphilis treatment', 'tables': [
+                [['Stage', 'Regimen', 'Dose'],
+                 ['Primary', 'Benzathine penicillin G', dose],
+                 ['Late latent', 'Benzathine penicillin G', '7.2 million units']]
+            ]}
+        
+        with mock.patch.object(self.updater, 'table_index', table_index):
+            self.updater.analyze_changes('cdc_syphilis_detail', raw_data=raw('2.4 million units'))
+            candidates = self.updater.analyze_changes('cdc_syphilis_detail', raw_data=raw('2.4 million units IM'))
+        
+        self.assertTrue(candidates)
+        changes = candidates[0].proposed_changes
+        self.assertEqual(changes['new_tables'], [])
+        self.assertEqual(len(changes['table_changes']), 1)
+        modified = changes['table_changes'][0]['modified_rows']
+        self.assertEqual(modified, [{
+            'before': ['Primary', 'Benzathine penicillin G', '2.4 million units'],
+            'after': ['Primary', 'Benzathine penicillin G', '2.4 million units IM'],
+            'columns': [2]
+        }])
+        self.assertIn('1 changed treatment table rows', candidates[0].reason)
+        self.assertIn('standard-latent-treatment', changes['table_changes'][0]['nodes'])
+    
+    def test_alert_reaches_consults_through_index(self):
+        """An FDA alert on a drug finds the consult nodes that mention it"""
+        raw = {'alerts': [{'title': 'Benzathine penicillin G shortage', 'url': 'https://fda.example/1',
+                           'mentioned_drugs': ['benzathine'], 'full_text': 'Benzathine penicillin G shortage'}]}
+        candidates = self.updater.analyze_changes('fda_safety_alerts', raw_data=raw)
+        by_consult = {c.consult_id: c for c in candidates}
+        self.assertIn('neurosyphilis', by_consult)
+        alert_nodes = by_consult['neurosyphilis'].proposed_changes['alert_nodes']
+        self.assertIn('standard-latent-treatment', alert_nodes[0]['nodes'])
+
+
+class TestReviewQueue(unittest.TestCase):
+    """Test cases for the SQLite review queue"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.queue = ReviewQueue(self.dir / 'review_queue.db')
+        self.addCleanup(self.queue.close)
+    
+    def _item(self, consult_id='neurosyphilis', source_id='cdc_syphilis_detail', dose='2.4 MU'):
+        return {'consult_id': consult_id, 'source_id': source_id, 'change_type': 'major',
+                'reason': 'table changed', 'proposed_changes': {'dose': dose},
+                'timestamp': datetime.now().isoformat(),
+                'content_hash': processed_ledger.source_hash({'source_id': source_id, 'dose': dose})}
+    
+    def test_duplicates_are_ignored(self):
+        """An item is queued once per consult, source and source content"""
+        self.assertTrue(self.queue.enqueue(self._item()))
+        self.assertFalse(self.queue.enqueue(self._item()))
+        self.assertTrue(self.queue.enqueue(self._item(dose='3 MU')))
+        self.assertTrue(self.queue.enqueue(self._item(source_id='pubmed_syphilis')))
+        self.assertEqual(self.queue.count(), 3)
+    
+    def test_dedupe_uses_source_content_hash(self):
+        """Different proposed changes for the same source content are not queued again"""
+        self.assertTrue(self.queue.enqueue(self._item()))
+        reanalyzed = {**self._item(), 'proposed_changes': {'dose': '2.4 MU', 'note': 'rescored'}}
+        self.assertFalse(self.queue.enqueue(reanalyzed))
+        self.assertEqual(self.queue.count(), 1)
+    
+    def test_pagination_and_status(self):
+        """Pages come newest first, and reviewed items leave the pending count"""
+        for i in range(12):
+            self.queue.enqueue(self._item(dose=f"{i} MU"))
+        first = self.queue.page(limit=5)
+        self.assertEqual(len(first), 5)
+        self.assertNotIn('proposed_changes', first[0])
+        self.assertEqual(len(self.queue.page(limit=5, offset=10)), 2)
+        self.assertEqual(self.queue.get(first[0]['id'])['proposed_changes'], {'dose': '11 MU'})
+        
+        self.assertTrue(self.queue.set_status(first[0]['id'], 'approved'))
+        self.assertEqual(self.queue.count(), 11)
+        self.assertEqual(self.queue.count(None), 12)
+        self.assertEqual(self.queue.page('approved')[0]['id'], first[0]['id'])
+    
+    def test_wal_and_legacy_import(self):
+        """The database uses WAL and imports an old JSON queue once"""
+        legacy = self.dir / 'review_queue.json'
+        old_item = {key: value for key, value in self._item().items() if key != 'content_hash'}
+        legacy.write_text(json.dumps([old_item, old_item]))
+        queue = ReviewQueue(self.dir / 'migrated.db', legacy_file=legacy)
+        self.addCleanup(queue.close)
+        self.assertEqual(queue.count(), 1)
+        mode = queue._connect().execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+        
+        queue.close()
+        legacy.write_text(json.dumps([self._item(dose='new')]))
+        self.assertEqual(ReviewQueue(self.dir / 'migrated.db', legacy_file=legacy).count(), 1)
+
+
+class TestConsultIndex(unittest.TestCase):
+    """Test cases for the term/drug index over tree nodes"""
+    
+    tree = """
+export const DEMO_NODES: DecisionNode[] = [
+  { id: 'demo-treat', type: 'result', title: 'Treatment',
+    body: 'Benzathine penicillin G 2.4 million units IM once', next: 'demo-dose' },
+  { id: 'demo-dose', type: 'info', title: 'Allergy',
+    body: 'Doxycycline 100 mg orally twice daily for 14 days' },
+];
+"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.trees = Path(tmp.name) / 'trees'
+        self.trees.mkdir()
+        (self.trees / 'demo.ts').write_text(self.tree)
+        (self.trees / 'index.ts').write_text('export * from "./demo";')
+        self.path = Path(tmp.name) / 'consult_index.json'
+        self.drugs = ['Benzathine penicillin G', 'Doxycycline']
+        self.index = ConsultIndex(self.path, self.trees, self.drugs)
+        self.index.refresh()
+    
+    def test_search_finds_node(self):
+        """Text is matched to the node covering its terms and drug names"""
+        hits = self.index.search('benzathine penicillin g 2.4 million units')
+        self.assertEqual([(h['consult_id'], h['node_id']) for h in hits], [('demo', 'demo-treat')])
+        self.assertIn('drug:benzathine penicillin g', hits[0]['terms'])
+        self.assertEqual(self.index.search('unrelated words entirely'), [])
+        self.assertEqual(self.index.search('doxycycline', consult_ids=['other']), [])
+    
+    def test_drug_lookup(self):
+        """Drug names map to the nodes mentioning them"""
+        self.assertEqual([h['node_id'] for h in self.index.nodes_for_drugs(['doxycycline'])], ['demo-dose'])
+        self.assertEqual(self.index.consults_for_drugs(['Doxycycline']), ['demo'])
+    
+    def test_incremental_refresh(self):
+        """Unchanged trees are not re-parsed; edited and deleted trees are re-indexed"""
+        reloaded = ConsultIndex(self.path, self.trees, self.drugs)
+        self.assertFalse(reloaded.refresh())
+        self.assertEqual(reloaded.nodes_for_drugs(['doxycycline'])[0]['node_id'], 'demo-dose')
+        
+        (self.trees / 'demo.ts').write_text(self.tree.replace('Doxycycline', 'Tetracycline'))
+        self.assertTrue(reloaded.refresh())
+        self.assertEqual(reloaded.nodes_for_drugs(['doxycycline']), [])
+        self.assertTrue(reloaded.search('tetracycline'))
+        
+        (self.trees / 'demo.ts').unlink()
+        self.assertTrue(reloaded.refresh())
+        self.assertEqual(reloaded.postings, {})
+
+
+class TestTableIndex(unittest.TestCase):
+    """Test cases for table fingerprints and row diffs"""
+    
+    headers = ['Regimen', 'Dose']
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'table_index.json'
+        self.index = TableIndex(self.path)
+    
+    def _table(self, *rows, headers=None):
+        return {'headers': headers or self.headers, 'rows': [list(row) for row in rows]}
+    
+    def test_formatting_is_not_a_change(self):
+        """Whitespace, case and dash style do not change a row's fingerprint"""
+        self.assertEqual(normalize_cell('  Doxycycline\u00a0100 mg \u2013 PO '), 'doxycycline 100 mg - po')
+        self.index.record('src', [self._table(['Doxycycline', '100 mg - PO'])])
+        self.assertEqual(self.index.diff('src', [self._table(['DOXYCYCLINE', '100  mg \u2013 PO'])]), [])
+    
+    def test_added_removed_and_modified_rows(self):
+        """Rows are matched by hash, and by first cell when modified"""
+        self.index.record('src', [self._table(['Doxycycline', '100 mg'], ['Ceftriaxone', '1 g'])])
+        changes = self.index.diff('src', [self._table(['Doxycycline', '200 mg'], ['Azithromycin', '1 g'])])
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['status'], 'modified')
+        self.assertEqual(changes[0]['added_rows'], [['Azithromycin', '1 g']])
+        self.assertEqual(changes[0]['removed_rows'], [['Ceftriaxone', '1 g']])
+        self.assertEqual(changes[0]['modified_rows'][0]['columns'], [1])
+    
+    def test_new_and_removed_tables(self):
+        """Tables are keyed by header, so a new header is a new table"""
+        self.index.record('src', [self._table(['Doxycycline', '100 mg'])])
+        changes = self.index.diff('src', [self._table(['Stage 1', 'Yes'], headers=['Stage', 'Screen'])])
+        self.assertEqual(sorted(c['status'] for c in changes), ['new', 'removed'])
+    
+    def test_history_persists(self):
+        """Recorded tables survive a reload and are only written when changed"""
+        self.index.record('src', [self._table(['Doxycycline', '100 mg'])])
+        self.index.save()
+        reloaded = TableIndex(self.path)
+        self.assertTrue(reloaded.has_history('src'))
+        self.assertFalse(reloaded.has_history('other'))
+        self.assertEqual(reloaded.diff('src', [self._table(['Doxycycline', '100 mg'])]), [])
+        reloaded.record('src', [self._table(['Doxycycline', '100 mg'])])
+        self.assertFalse(reloaded._dirty)
+
+
+class TestScheduler(unittest.TestCase):
+    """Test cases for the in-process pipeline"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for name in ('STATUS_FILE', 'SOURCE_SCHEDULE_FILE', 'METRICS_FILE', 'PROMETHEUS_FILE'):
+            patcher = mock.patch.object(scheduler, name, Path(tmp.name) / f"{name.lower()}.json")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_in_process_pipeline_reuses_instances(self):
+        """Scrape results go straight to the updater and instances stay warm"""
+        results = [mock.Mock(source_id='a', status='success', change_detected=True)]
+        fake_scraper = mock.Mock()
+        fake_scraper.scrape_all.return_value = results
+        fake_updater = mock.Mock()
+        fake_updater.process_all_sources.return_value = {'auto_updated': 0}
+        
+        pipeline = scheduler.MedKittScheduler()
+        pipeline.in_process = True
+        with mock.patch('service.MedKittScraper', return_value=fake_scraper) as scraper_cls, \
+             mock.patch('updater.MedKittUpdater', return_value=fake_updater) as updater_cls, \
+             mock.patch.object(pipeline, '_run_scraper', side_effect=AssertionError("subprocess used")):
+            for _ in range(2):
+                outcome = pipeline.run_pipeline()
+                self.assertTrue(outcome['success'])
+                self.assertEqual(outcome['changes_detected'], 1)
+        
+        self.assertEqual(scraper_cls.call_count, 1)
+        self.assertEqual(updater_cls.call_count, 1)
+        self.assertEqual(fake_scraper.scrape_all.call_count, 2)
+        fake_updater.process_all_sources.assert_called_with(dry_run=False, scrape_results=results)
+    
+    def test_only_unprocessed_sources_reach_updater_and_commit(self):
+        """Runs with nothing new skip the updater; new content's consult files are committed"""
+        quiet = [mock.Mock(source_id='a', status='success', change_detected=False)]
+        changed = quiet + [mock.Mock(source_id='b', status='success', change_detected=True)]
+        fake_scraper = mock.Mock()
+        fake_scraper.scrape_all.side_effect = [quiet, changed]
+        fake_updater = mock.Mock()
+        fake_updater.needs_processing.side_effect = lambda r: r.change_detected
+        fake_updater.process_all_sources.return_value = {
+            'auto_updated': 1, 'updated_paths': ['src/data/trees/pep.ts']
+        }
+        
+        pipeline = scheduler.MedKittScheduler()
+        pipeline.in_process = True
+        pipeline.config = dict(pipeline.config, notifications={'github': {'auto_commit': True}})
+        pipeline._scraper, pipeline._updater = fake_scraper, fake_updater
+        with mock.patch.object(pipeline, '_send_notification'):
+            first = pipeline.run_pipeline()
+            fake_updater.process_all_sources.assert_not_called()
+            second = pipeline.run_pipeline()
+        
+        self.assertTrue(first['success'])
+        self.assertEqual(second['changed_sources'], ['b'])
+        fake_updater.process_all_sources.assert_called_once_with(dry_run=False, scrape_results=changed[1:])
+        fake_updater.commit_changes.assert_called_once_with(paths=['src/data/trees/pep.ts'])
+    
+    def test_daemon_exit_closes_scraper(self):
+        """Stopping the daemon closes the warm scraper's browser and HTTP pools"""
+        pipeline = scheduler.MedKittScheduler()
+        fake_scraper = mock.Mock()
+        pipeline._scraper = fake_scraper
+        pid_file = scheduler.STATUS_FILE.with_name('scheduler.pid')
+        with mock.patch.object(scheduler, 'PID_FILE', pid_file), \
+             mock.patch.object(pipeline, 'run_due', side_effect=KeyboardInterrupt):
+            pipeline.run_daemon()
+        fake_scraper.close.assert_called_once_with()
+        self.assertIsNone(pipeline._scraper)
+        self.assertFalse(pid_file.exists())
+        pipeline.close()  # nothing left to close
+    
+    def test_failed_scrape_reschedules_sources(self):
+        """When the whole scrape fails its sources are retried later, not on every tick"""
+        pipeline = scheduler.MedKittScheduler()
+        sources = list(pipeline.config['sources'])
+        with mock.patch.object(pipeline, '_run_scraper_in_process',
+                               return_value={'success': False, 'error': 'Scraper timed out'}):
+            outcome = pipeline.run_pipeline(source_ids=sources[:2])
+        self.assertFalse(outcome['success'])
+        due_now = pipeline.source_schedule.due(datetime.now())
+        for source_id in sources[:2]:
+            self.assertNotIn(source_id, due_now)
+            self.assertEqual(pipeline.source_schedule.state[source_id]['last_status'], 'error')
+            self.assertIn(source_id, pipeline.source_schedule.due(datetime.now() + timedelta(hours=2)))
+    
+    def test_subprocess_failed_sources_retry_sooner(self):
+        """Sources the scraper subprocess reports as failed are retried after the retry delay"""
+        pipeline = scheduler.MedKittScheduler()
+        pipeline.in_process = False
+        sources = list(pipeline.config['sources'])
+        summary = (f"Total sources: 2\nSuccessful: 1\nNot modified: 0\nErrors: 1\n"
+                   f"Changes detected: 0\nFailed sources: {sources[1]}\n")
+        completed = subprocess.CompletedProcess([], 0, stdout=summary, stderr='')
+        with mock.patch.object(scheduler.subprocess, 'run', return_value=completed), \
+             mock.patch.object(pipeline, '_run_updater', return_value={'success': True, 'updated': 0}):
+            outcome = pipeline.run_pipeline(source_ids=sources[:2])
+        
+        self.assertEqual(outcome['sources_processed'], 1)
+        state = pipeline.source_schedule.state
+        self.assertEqual(state[sources[0]]['last_status'], 'success')
+        self.assertEqual(state[sources[1]]['last_status'], 'error')
+        self.assertIn(sources[1], pipeline.source_schedule.due(datetime.now() + timedelta(hours=2)))
+    
+    def test_run_due_scrapes_only_due_sources(self):
+        """Only due sources are scraped, and they are then scheduled ahead"""
+        pipeline = scheduler.MedKittScheduler()
+        now = datetime(2024, 1, 1, 12, 0)
+        sources = list(pipeline.config['sources'])
+        pipeline.source_schedule.mark_run(sources[1:], now=now)
+        
+        with mock.patch.object(pipeline, 'run_pipeline', return_value={'success': True}) as run:
+            pipeline.run_due(now=now + timedelta(hours=2))
+            run.assert_called_once_with(dry_run=False, source_ids=[sources[0]])
+            
+            pipeline.source_schedule.mark_run(sources[:1], now=now)
+            self.assertIsNone(pipeline.run_due(now=now + timedelta(hours=2)))
+
+
+class TestConfigLoader(unittest.TestCase):
+    """Test cases for the validated, cached config"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config_path = Path(tmp.name) / "config.yaml"
+        self.config_path.write_text(config_loader.CONFIG_PATH.read_text())
+    
+    def test_compiled_lookups(self):
+        """Routing, split selectors and reverse maps are built with the config"""
+        config = load_config(self.config_path)
+        self.assertEqual(config.handlers['cdc_sti_guidelines'], 'cdc')
+        self.assertEqual(config.handlers['fda_drug_shortages'], 'fda')
+        self.assertEqual(config.handlers['pubmed_pe'], 'pubmed')
+        self.assertEqual(
+            config['sources']['cdc_sti_guidelines']['selectors']['content'],
+            ['.cdc-textblock', '.card-body', '. guideline-content']
+        )
+        self.assertEqual(config.consult_sources['pe-treatment'], ['pubmed_pe'])
+        self.assertIn('cdc_syphilis_detail', config.consult_sources['neurosyphilis'])
+        self.assertEqual(config.tree_consults['pep'], ['pep'])
+        for consult_id, source_ids in config.consult_sources.items():
+            self.assertTrue(source_ids, consult_id)
+    
+    def test_unchanged_config_loads_from_cache(self):
+        """A second load of the same bytes skips YAML parsing; an edit reparses"""
+        first = load_config(self.config_path)
+        self.assertTrue(config_loader.cache_path(self.config_path).exists())
+        
+        import yaml
+        with mock.patch.object(yaml, 'safe_load', side_effect=AssertionError("parsed again")):
+            cached = load_config(self.config_path)
+        self.assertEqual(cached, first)
+        self.assertEqual(cached.handlers, first.handlers)
+        self.assertEqual(cached.consult_sources, first.consult_sources)
+        
+        self.config_path.write_text(self.config_path.read_text().replace('timeout: 30', 'timeout: 45'))
+        self.assertEqual(load_config(self.config_path)['scraper']['timeout'], 45)
+    
+    def test_cache_written_under_other_rules_is_ignored(self):
+        """A cached config is revalidated when the loader's rules change"""
+        load_config(self.config_path)
+        with mock.patch.object(config_loader, 'rules_digest', return_value='older rules'), \
+             mock.patch.object(config_loader, 'validate', return_value=['new rule broken']):
+            with self.assertRaises(ConfigError) as caught:
+                load_config(self.config_path)
+        self.assertEqual(caught.exception.errors, ['new rule broken'])
+    
+    def test_invalid_config_fails_fast(self):
+        """Every problem is reported at load time"""
+        text = self.config_path.read_text()
+        text = text.replace('type: "fda_shortage"', 'type: "rss_feed"')
+        text = text.replace('check_frequency: "weekly"', 'check_frequency: "fortnightly"', 1)
+        text = text.replace('      - pe-treatment\n', '      - pe-management\n', 1)
+        self.config_path.write_text(text)
+        
+        with self.assertRaises(ConfigError) as caught:
+            load_config(self.config_path)
+        errors = '\n'.join(caught.exception.errors)
+        self.assertIn("sources.fda_drug_shortages.type 'rss_feed' has no handler", errors)
+        self.assertIn("sources.pubmed_syphilis.check_frequency", errors)
+        self.assertIn("unknown consult 'pe-management'", errors)
+        self.assertFalse(config_loader.cache_path(self.config_path).exists())
+        
+        self.config_path.write_text("sources: [unclosed")
+        with self.assertRaises(ConfigError):
+            load_config(self.config_path)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Fails the first `failures` requests to a path with `status`, then serves a page"""
+    
+    failures = {}      # path -> number of failing answers left (-1 = always fail)
+    status = 503
+    retry_after = '0'
+    hits = []
+    body = (b'<html><body><div class="views-row"><a href="/a1">'
+            b'Warfarin safety communication</a></div></body></html>')
+    
+    def do_GET(self):
+        cls = type(self)
+        cls.hits.append(self.path)
+        left = cls.failures.get(self.path, 0)
+        if left:
+            cls.failures[self.path] = left - 1 if left > 0 else left
+            self.send_response(cls.status)
+            if cls.retry_after is not None:
+                self.send_header('Retry-After', cls.retry_after)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(cls.body)))
+        self.end_headers()
+        self.wfile.write(cls.body)
+    
+    def log_message(self, *args):
+        pass
+
+
+class TestFetchLayer(unittest.TestCase):
+    """Test cases for retries, backoff and the circuit breaker"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base_url = start_stub_server(FlakyHandler)
+        cls.host = cls.base_url.split('//')[1]
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+    
+    def setUp(self):
+        import requests
+        FlakyHandler.failures = {}
+        FlakyHandler.status = 503
+        FlakyHandler.retry_after = '0'
+        FlakyHandler.hits = []
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        self.sleeps = []
+        self.now = [0.0]
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=lambda: self.now[0])
+        self.retrier = Retrier(max_retries=3, breaker=self.breaker, sleep=self.sleeps.append,
+                               rng=random.Random(1))
+    
+    def _get(self, path):
+        return self.retrier.get(self.session, self.host, f"{self.base_url}{path}", timeout=5)
+    
+    def test_transient_failures_are_retried(self):
+        """503s are retried, honouring Retry-After, until the page is served"""
+        FlakyHandler.failures = {'/page': 2}
+        response = self._get('/page')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FlakyHandler.hits, ['/page'] * 3)
+        self.assertEqual(self.sleeps, [0.0, 0.0])
+        self.assertEqual(self.breaker.state(self.host), 'closed')
+    
+    def test_backoff_is_exponential_with_jitter(self):
+        """Without Retry-After the wait is drawn from a doubling, capped window"""
+        FlakyHandler.failures = {'/page': 3}
+        FlakyHandler.retry_after = None
+        self.retrier.breaker = CircuitBreaker(failure_threshold=10)
+        self.assertEqual(self._get('/page').status_code, 200)
+        self.assertEqual(len(self.sleeps), 3)
+        for attempt, delay in enumerate(self.sleeps):
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(self.retrier.backoff_max, self.retrier.backoff_base * 2 ** attempt))
+        self.assertEqual(len(set(self.sleeps)), 3)
+    
+    def test_exhausted_retries_return_last_response(self):
+        """After max_retries the failing response is handed back for raise_for_status"""
+        FlakyHandler.failures = {'/page': -1}
+        self.retrier.breaker = CircuitBreaker(failure_threshold=10)
+        response = self._get('/page')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(FlakyHandler.hits), 4)
+    
+    def test_long_retry_after_gives_up(self):
+        """A Retry-After beyond max_retry_after is not waited for"""
+        FlakyHandler.failures = {'/page': 1}
+        FlakyHandler.retry_after = '3600'
+        self.assertEqual(self._get('/page').status_code, 503)
+        self.assertEqual(len(FlakyHandler.hits), 1)
+        self.assertEqual(self.sleeps, [])
+    
+    def test_client_errors_are_not_retried(self):
+        """A 404 is an answer, not a host failure"""
+        FlakyHandler.failures = {'/page': 1}
+        FlakyHandler.status = 404
+        self.assertEqual(self._get('/page').status_code, 404)
+        self.assertEqual(len(FlakyHandler.hits), 1)
+        self.assertEqual(self.breaker.state(self.host), 'closed')
+    
+    def test_circuit_opens_then_recovers(self):
+        """Repeated failures open the host's circuit; a trial request closes it"""
+        FlakyHandler.failures = {'/page': -1}
+        self.assertEqual(self._get('/page').status_code, 503)
+        self.assertEqual(len(FlakyHandler.hits), 3)
+        self.assertEqual(self.breaker.state(self.host), 'open')
+        
+        with self.assertRaises(CircuitOpenError):
+            self._get('/other')
+        self.assertEqual(len(FlakyHandler.hits), 3)
+        
+        self.now[0] += 61
+        FlakyHandler.failures = {}
+        self.assertEqual(self._get('/page').status_code, 200)
+        self.assertEqual(self.breaker.state(self.host), 'closed')
+    
+    def test_failed_trial_reopens_circuit(self):
+        """In half-open state one failure is enough to open the circuit again"""
+        for _ in range(3):
+            self.breaker.record_failure(self.host)
+        self.now[0] += 61
+        self.assertEqual(self.breaker.state(self.host), 'half_open')
+        FlakyHandler.failures = {'/page': -1}
+        self.assertEqual(self._get('/page').status_code, 503)
+        self.assertEqual(len(FlakyHandler.hits), 1)
+        self.assertEqual(self.breaker.state(self.host), 'open')
+    
+    def test_connection_errors_are_retried(self):
+        """Exceptions such as timeouts are retried like 5xx answers"""
+        calls = []
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise TimeoutError("read timed out")
+            return 'ok'
+        self.assertEqual(self.retrier.call('example.org', flaky), 'ok')
+        self.assertEqual(len(calls), 3)
+        
+        with self.assertRaises(ValueError):
+            self.retrier.call('example.org', lambda: int('x'))
+    
+    def test_parse_retry_after(self):
+        """Retry-After is accepted as seconds or as an HTTP date"""
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        now = datetime(2026, 10, 18, 12, 0, 0, tzinfo=timezone.utc)
+        self.assertEqual(parse_retry_after('Sun, 18 Oct 2026 12:01:30 GMT', now), 90.0)
+        self.assertIsNone(parse_retry_after('soon'))
+    
+    def test_scraper_retries_fda_page(self):
+        """A source that fails transiently still succeeds within one run"""
+        isolated_data_dirs(self)
+        scraper = MedKittScraper()
+        scraper.retrier = self.retrier
+        FlakyHandler.failures = {'/alerts': 2}
+        result = scraper.scrape_fda('stub_fda', {
+            'name': 'Stub FDA', 'url': f"{self.base_url}/alerts",
+            'selectors': {'alerts': '.views-row'}, 'drug_keywords': ['warfarin'],
+        })
+        self.assertEqual(result.status, 'success')
+        self.assertEqual(len(result.data['alerts']), 1)
+        self.assertEqual(len(FlakyHandler.hits), 3)
+    
+    def test_pubmed_engine_retries_eutils(self):
+        """E-utility calls are retried through the retrier"""
+        entrez = FakeEntrez({'query a': ['1']})
+        esearch = entrez.esearch
+        failures = [urllib.error.HTTPError('https://eutils', 503, 'Busy', {'Retry-After': '0'}, None)]
+        def flaky_esearch(**params):
+            if failures:
+                raise failures.pop()
+            return esearch(**params)
+        entrez.esearch = flaky_esearch
+        engine = PubMedEngine(entrez, Path(tempfile.mkdtemp()) / 'cache.json', request_interval=0,
+                              retrier=self.retrier, host='eutils')
+        searches = engine.run({'pubmed_a': {'search_query': 'query a'}})
+        self.assertIsNone(searches['pubmed_a'].error)
+        self.assertEqual(searches['pubmed_a'].pmids, ['1'])
+        self.assertEqual(self.sleeps, [0.0])
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 stub serving pages and E-utilities replies over persistent connections"""
+    
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+    esearch_xml = (
+        b'<?xml version="1.0" encoding="UTF-8" ?>\n'
+        b'<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+        b'"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+        b'<eSearchResult><Count>2</Count><RetMax>2</RetMax><RetStart>0</RetStart>'
+        b'<IdList><Id>11</Id><Id>22</Id></IdList></eSearchResult>'
+    )
+    
+    def do_GET(self):
+        type(self).requests_seen.append(self.path)
+        body = self.esearch_xml if self.path.startswith('/eutils/esearch.fcgi') else b'<html>ok</html>'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+class TestTransport(unittest.TestCase):
+    """Test cases for the pooled HTTP transport"""
+    
+    def setUp(self):
+        # One thread per connection, so open keep-alive connections don't block shutdown
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        KeepAliveHandler.requests_seen = []
+        self.transport = Transport('MedKitt-Test/1.0', hosts=2, per_host=2)
+        self.addCleanup(self.transport.close)
+    
+    def test_connections_are_reused(self):
+        """Sequential requests to a host share one keep-alive connection"""
+        for i in range(5):
+            response = self.transport.session.get(f"{self.base_url}/page{i}", timeout=5)
+            self.assertEqual(response.status_code, 200)
+        stats = self.transport.pool_stats()[self.base_url.split('//')[1]]
+        self.assertEqual(stats, {'requests': 5, 'connections': 1, 'reuse_rate': 0.8})
+        self.assertEqual(KeepAliveHandler.requests_seen[-1], '/page4')
+    
+    def test_pool_size_from_config(self):
+        """Per-host pool size defaults to the largest domain concurrency"""
+        transport = Transport.from_config({'user_agent': 'x', 'domain_concurrency': {'a': 3, 'b': 2}})
+        self.addCleanup(transport.close)
+        self.assertEqual(transport.adapter._pool_maxsize, 3)
+        transport = Transport.from_config({'user_agent': 'x', 'connection_pool': {'hosts': 5, 'per_host': 8}})
+        self.addCleanup(transport.close)
+        self.assertEqual((transport.adapter._pool_connections, transport.adapter._pool_maxsize), (5, 8))
+    
+    def test_eutils_client_shares_the_pool(self):
+        """E-utilities replies come over the session and parse like Bio.Entrez records"""
+        self.transport.session.get(f"{self.base_url}/page", timeout=5)
+        client = EutilsClient(self.transport.session, email='a@b.c', tool='test',
+                              base_url=f"{self.base_url}/eutils/")
+        record = client.read(client.esearch(db='pubmed', term='syphilis', retmax=2))
+        self.assertEqual(record['IdList'], ['11', '22'])
+        self.assertIn('tool=test', KeepAliveHandler.requests_seen[-1])
+        self.assertIn('term=syphilis', KeepAliveHandler.requests_seen[-1])
+        self.assertEqual(self.transport.pool_stats()[self.base_url.split('//')[1]]['connections'], 1)
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for run timings and their export"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+    
+    def test_export_and_summary(self):
+        """A run is appended as one JSON line and written as Prometheus text"""
+        ticks = iter([0.0, 1.5, 2.0, 2.25])
+        registry = metrics.Metrics(clock=lambda: next(ticks))
+        with registry.timer('stage_seconds', stage='fetch'):
+            pass
+        with registry.timer('stage_seconds', stage='parse'):
+            pass
+        registry.count('bytes_fetched_total', 2048, host='www.cdc.gov')
+        registry.count('tables_parsed_total', 3, source='cdc_sti')
+        
+        jsonl, prom = self.tmp / 'metrics.jsonl', self.tmp / 'metrics.prom'
+        for _ in range(2):
+            metrics.export_run('scrape', jsonl, prom, metrics=registry)
+        runs = metrics.read_runs(jsonl)
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(runs[-1]['command'], 'scrape')
+        
+        text = prom.read_text()
+        self.assertIn('medkitt_stage_seconds_sum{stage="fetch"} 1.5', text)
+        self.assertIn('medkitt_stage_seconds_count{stage="parse"} 1', text)
+        self.assertIn('medkitt_bytes_fetched_total{host="www.cdc.gov"} 2048', text)
+        self.assertEqual(text.count('# TYPE medkitt_stage_seconds summary'), 1)
+        
+        summary = metrics.summarize(runs[-1])
+        self.assertEqual(list(summary['stages']), ['fetch', 'parse'])
+        self.assertEqual(summary['stages']['parse'], {'seconds': 0.25, 'calls': 1, 'max': 0.25})
+        self.assertEqual(summary['bytes_fetched'], {'www.cdc.gov': 2048})
+        self.assertEqual(summary['parsed'], {'tables': 3})
+    
+    def test_scrape_records_stages(self):
+        """A static CDC scrape records fetch and parse time, bytes read and parse counts"""
+        isolated_data_dirs(self)
+        server, base_url = start_stub_server(CDCPageHandler)
+        self.addCleanup(server.shutdown)
+        scraper = MedKittScraper()
+        self.addCleanup(scraper.close)
+        scraper.fetcher = None
+        
+        result = scraper.scrape_cdc('stub_cdc', {'name': 'Stub CDC', 'url': f"{base_url}/static",
+                                                 'selectors': {'content': 'main'}})
+        self.assertEqual(result.status, 'success')
+        
+        run = metrics.snapshot()
+        stages = {entry['labels']['stage']: entry['count'] for entry in run['timers']}
+        self.assertEqual(stages['fetch'], 2)  # the request, then the streamed body reads
+        self.assertEqual(stages['parse'], 1)
+        self.assertEqual(stages['snapshot_io'], 1)
+        counters = {entry['name']: entry['value'] for entry in run['counters']}
+        self.assertEqual(counters['bytes_fetched_total'], len(CDCPageHandler.pages['/static']))
+        self.assertEqual(counters['tables_parsed_total'], 1)
+    
+    def test_scheduler_status_summarizes_last_run(self):
+        """scheduler --status reads the last exported run"""
+        for name in ('STATUS_FILE', 'SOURCE_SCHEDULE_FILE', 'METRICS_FILE', 'PROMETHEUS_FILE'):
+            patcher = mock.patch.object(scheduler, name, self.tmp / name.lower())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        pipeline = scheduler.MedKittScheduler()
+        self.assertIsNone(pipeline.get_status()['metrics'])
+        
+        metrics.observe('stage_seconds', 0.5, stage='ts_parse')
+        metrics.observe('scrape_seconds', 2.0, handler='cdc', source='cdc_sti')
+        metrics.export_configured('pipeline', {}, scheduler.METRICS_FILE, scheduler.PROMETHEUS_FILE)
+        
+        summary = pipeline.get_status()['metrics']
+        self.assertEqual(summary['command'], 'pipeline')
+        self.assertEqual(summary['stages']['ts_parse']['seconds'], 0.5)
+        self.assertEqual(summary['slowest_sources'], [('cdc_sti', 2.0)])
+        self.assertTrue(scheduler.PROMETHEUS_FILE.exists())
+        
+        # Nothing recorded, or export switched off: no new run is written
+        metrics.reset()
+        self.assertIsNone(metrics.export_configured('pipeline', {}, scheduler.METRICS_FILE, None))
+        metrics.count('ts_nodes_parsed_total', 10)
+        self.assertIsNone(metrics.export_configured('pipeline', {'enabled': False}, scheduler.METRICS_FILE, None))
+        self.assertEqual(len(metrics.read_runs(scheduler.METRICS_FILE)), 1)
+
+
+class TestSourceSchedule(unittest.TestCase):
+    """Test cases for per-source scheduling"""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.state_path = Path(tmp.name) / "schedule.json"
+        self.sources = {
+            'pubmed': {'priority': 'medium', 'check_frequency': 'weekly'},
+            'cdc': {'priority': 'high', 'check_frequency': 'daily'},
+            'fda': {'priority': 'critical', 'check_frequency': 'hourly'},
+            'cdc_other': {'priority': 'high', 'check_frequency': 'daily'},
+        }
+        self.schedule = SourceSchedule(self.sources, self.state_path, run_time='02:00')
+    
+    def test_never_run_sources_due_by_priority(self):
+        """Everything is due at first, critical before high before medium"""
+        self.assertEqual(self.schedule.due(datetime(2024, 1, 1)), ['fda', 'cdc', 'cdc_other', 'pubmed'])
+    
+    def test_frequencies(self):
+        """Hourly sources come due without the daily and weekly ones"""
+        ran = datetime(2024, 1, 1, 2, 3)
+        self.schedule.mark_run(list(self.sources), now=ran)
+        
+        self.assertEqual(self.schedule.due(ran + timedelta(minutes=30)), [])
+        self.assertEqual(self.schedule.due(ran + timedelta(hours=1)), ['fda'])
+        # Daily sources are aligned to daily_run_time
+        self.assertEqual(self.schedule.next_due('cdc'), datetime(2024, 1, 2, 2, 0))
+        self.assertEqual(self.schedule.due(datetime(2024, 1, 2, 2, 0)), ['fda', 'cdc', 'cdc_other'])
+        self.assertEqual(self.schedule.next_due('pubmed'), datetime(2024, 1, 8, 2, 0))
+        
+        # State survives a restart
+        reloaded = SourceSchedule(self.sources, self.state_path, run_time='02:00')
+        self.assertEqual(reloaded.next_due('pubmed'), datetime(2024, 1, 8, 2, 0))
+    
+    def test_lateness_breaks_priority_ties(self):
+        """Among equal priorities the most overdue source runs first"""
+        self.schedule.mark_run(['cdc'], now=datetime(2024, 1, 1, 2, 0))
+        self.schedule.mark_run(['cdc_other'], now=datetime(2024, 1, 1, 1, 0))
+        self.schedule.mark_run(['fda', 'pubmed'], now=datetime(2024, 1, 3, 2, 0))
+        self.schedule.state['cdc_other']['next_due'] = datetime(2024, 1, 1, 23, 0).isoformat()
+        self.assertEqual(self.schedule.due(datetime(2024, 1, 3, 2, 30)), ['cdc_other', 'cdc'])
+    
+    def test_failed_sources_retry_sooner(self):
+        """A failed source is retried after the retry delay, not a full interval"""
+        ran = datetime(2024, 1, 1, 2, 0)
+        self.schedule.mark_run(['pubmed'], failed=['pubmed'], now=ran)
+        self.assertEqual(self.schedule.next_due('pubmed'), ran + timedelta(hours=1))
 
 
 def run_tests():
@@ -119,7 +1892,27 @@ def run_tests():
     suite = unittest.TestSuite()
     
     suite.addTests(loader.loadTestsFromTestCase(TestScraper))
+    suite.addTests(loader.loadTestsFromTestCase(TestChangeScoring))
+    suite.addTests(loader.loadTestsFromTestCase(TestKeywordMatcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestTSParser))
+    suite.addTests(loader.loadTestsFromTestCase(TestExportConsults))
+    suite.addTests(loader.loadTestsFromTestCase(TestSnapshotStore))
+    suite.addTests(loader.loadTestsFromTestCase(TestPubMedEngine))
+    suite.addTests(loader.loadTestsFromTestCase(TestConcurrentScrape))
+    suite.addTests(loader.loadTestsFromTestCase(TestBrowserPool))
+    suite.addTests(loader.loadTestsFromTestCase(TestConditionalFetch))
+    suite.addTests(loader.loadTestsFromTestCase(TestFetchRouting))
+    suite.addTests(loader.loadTestsFromTestCase(TestSectionExtractor))
     suite.addTests(loader.loadTestsFromTestCase(TestUpdater))
+    suite.addTests(loader.loadTestsFromTestCase(TestTableIndex))
+    suite.addTests(loader.loadTestsFromTestCase(TestConsultIndex))
+    suite.addTests(loader.loadTestsFromTestCase(TestReviewQueue))
+    suite.addTests(loader.loadTestsFromTestCase(TestScheduler))
+    suite.addTests(loader.loadTestsFromTestCase(TestSourceSchedule))
+    suite.addTests(loader.loadTestsFromTestCase(TestConfigLoader))
+    suite.addTests(loader.loadTestsFromTestCase(TestFetchLayer))
+    suite.addTests(loader.loadTestsFromTestCase(TestTransport))
+    suite.addTests(loader.loadTestsFromTestCase(TestMetrics))
     
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+MedKitt Transport
+One pooled HTTP session for every request the scraper makes: CDC and FDA
+pages, and the NCBI E-utilities (through EutilsClient instead of Biopython's
+own urllib calls, which open a new connection per request).
+
+Connections are kept alive per host, up to per_host of them, so repeated
+requests to a host reuse the TCP connection and its TLS session instead of
+handshaking again. requests speaks HTTP/1.1 only; connection reuse is what
+this layer provides.
+
+pool_stats() reports, per host, how many requests were sent and how many new
+connections they needed, so the reuse rate of a run can be checked.
+"""
+
+import io
+import logging
+import threading
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger("MedKittScraper")
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+# =============================================================================
+# POOLED SESSION
+# =============================================================================
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter that counts requests and newly opened connections per host"""
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Connections already counted per pool (pools can be evicted and rebuilt)
+        self._counted: 'weakref.WeakKeyDictionary[Any, int]' = weakref.WeakKeyDictionary()
+        self._local = threading.local()  # pool used by this thread's current send()
+        super().__init__(*args, **kwargs)
+
+    def get_connection_with_tls_context(self, *args, **kwargs):
+        # send() looks its pool up here from requests 2.32.2 on (hence the pin)
+        pool = super().get_connection_with_tls_context(*args, **kwargs)
+        self._local.pool = pool
+        return pool
+
+    def send(self, request, *args, **kwargs):
+        self._local.pool = None
+        try:
+            return super().send(request, *args, **kwargs)
+        finally:
+            if self._local.pool is not None:
+                self._record(request.url, self._local.pool)
+
+    def _record(self, url: str, pool):
+        host = urlparse(url).netloc
+        with self._stats_lock:
+            opened = pool.num_connections - self._counted.get(pool, 0)
+            self._counted[pool] = pool.num_connections
+            stats = self._stats.setdefault(host, {'requests': 0, 'connections': 0})
+            stats['requests'] += 1
+            stats['connections'] += opened
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._stats_lock:
+            return {host: dict(stats) for host, stats in self._stats.items()}
+
+class Transport:
+    """requests.Session with keep-alive connection pools sized from config"""
+
+    def __init__(self, user_agent: str, hosts: int = 10, per_host: int = 4, block: bool = False):
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        # Retries are the Retrier's job (see fetch.py), not urllib3's
+        self.adapter = PooledAdapter(pool_connections=hosts, pool_maxsize=per_host,
+                                     max_retries=0, pool_block=block)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    @classmethod
+    def from_config(cls, scraper_config: Dict[str, Any]) -> 'Transport':
+        """Transport for the `scraper` section of config.yaml"""
+        pool = scraper_config.get('connection_pool', {})
+        # A host never needs more connections than requests it may have in flight
+        per_host = pool.get('per_host', max([1] + list((scraper_config.get('domain_concurrency') or {}).values())))
+        return cls(scraper_config['user_agent'], hosts=pool.get('hosts', 10), per_host=per_host,
+                   block=pool.get('block', False))
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """{host: {'requests', 'connections', 'reuse_rate'}} since the transport was created"""
+        stats = self.adapter.stats()
+        for entry in stats.values():
+            requests_sent = entry['requests']
+            entry['reuse_rate'] = round(1 - entry['connections'] / requests_sent, 3) if requests_sent else 0.0
+        return stats
+
+    def close(self):
+        self.session.close()
+
+# =============================================================================
+# E-UTILITIES CLIENT
+# =============================================================================
+
+class EutilsClient:
+    """The Bio.Entrez calls PubMedEngine uses, sent over a pooled session
+
+    Replies are parsed with Bio.Entrez.read, so records look exactly as they
+    do when Bio.Entrez fetches them itself.
+    """
+
+    def __init__(self, session: requests.Session, email: str, tool: str,
+                 api_key: Optional[str] = None, base_url: str = EUTILS_URL, timeout: float = 30):
+        self.session = session
+        self.base_url = base_url
+        self.timeout = timeout
+        self.params = {'email': email, 'tool': tool}
+        if api_key:
+            self.params['api_key'] = api_key
+
+    def _request(self, utility: str, params: Dict[str, Any], post: bool = False) -> io.BytesIO:
+        params = dict(self.params, **{key: value for key, value in params.items() if value is not None})
+        url = f"{self.base_url}{utility}.fcgi"
+        if post:
+            response = self.session.post(url, data=params, timeout=self.timeout)
+        else:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        metrics.count('bytes_fetched_total', len(response.content), host=urlparse(url).netloc)
+        return io.BytesIO(response.content)
+
+    def esearch(self, **params) -> io.BytesIO:
+        return self._request('esearch', params)
+
+    def epost(self, **params) -> io.BytesIO:
+        # PMID lists can be long, so they go in the body
+        return self._request('epost', params, post=True)
+
+    def efetch(self, **params) -> io.BytesIO:
+        return self._request('efetch', params, post=True)
+
+    def read(self, handle: io.BytesIO) -> Any:
+        from Bio import Entrez
+        return Entrez.read(handle)
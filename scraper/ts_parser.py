@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+MedKitt TypeScript Tree Parser
+One-pass tokenizer and parser for the object/array literals in
+src/data/trees/*.ts, used to extract decision tree nodes without evaluating
+TypeScript.
+
+Supported: objects (incl. nested), arrays, single/double-quoted strings with
+escapes, template strings, numbers, true/false/null/undefined, string
+concatenation with '+', comments, trailing commas, type annotations and
+'as'/'satisfies' casts. Any other expression (identifiers, calls, arrows) is
+kept as its raw source text.
+
+Usage:
+    nodes = extract_nodes(path.read_text())
+    nodes = parse_file(path)          # cached on (path, mtime, size)
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# =============================================================================
+# TOKENIZER
+# =============================================================================
+
+_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<template>`(?:[^`\\$]|\\.|\$(?!\{)|\$\{[^}]*\})*`)
+  | (?P<number>0[xX][0-9a-fA-F_]+|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<punct>\.\.\.|=>|[{}\[\](),:;=<>?!.|&+\-*/%@\#^~])
+''', re.VERBOSE | re.DOTALL)
+
+_ESCAPE_RE = re.compile(r'\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\r\n|[\s\S])')
+
+_SIMPLE_ESCAPES = {
+    'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0',
+    '\n': '', '\r\n': '', '\u2028': '', '\u2029': '',
+}
+
+class TSParseError(ValueError):
+    """Raised when a tree file cannot be parsed"""
+
+def _unescape(body: str) -> str:
+    """Decode JavaScript string escapes"""
+    if '\\' not in body:
+        return body
+
+    def replace(m):
+        esc = m.group(1)
+        if esc.startswith('u{'):
+            return chr(int(esc[2:-1], 16))
+        if esc[0] in 'ux' and len(esc) > 1:
+            return chr(int(esc[1:], 16))
+        return _SIMPLE_ESCAPES.get(esc, esc)
+
+    text = _ESCAPE_RE.sub(replace, body)
+    # Escaped surrogate pairs (\uD83D\uDE00) decode to two halves; join them
+    if any('\ud800' <= ch <= '\udfff' for ch in text):
+        text = text.encode('utf-16', 'surrogatepass').decode('utf-16')
+    return text
+
+def tokenize(source: str) -> List[Tuple[str, str, int]]:
+    """Split source into (kind, text, offset) tokens, dropping whitespace and comments"""
+    tokens = []
+    pos = 0
+    length = len(source)
+    match = _TOKEN_RE.match
+    while pos < length:
+        m = match(source, pos)
+        if not m:
+            line = source.count('\n', 0, pos) + 1
+            raise TSParseError(f"Unexpected character {source[pos]!r} at line {line}")
+        kind = m.lastgroup
+        if kind not in ('ws', 'comment'):
+            tokens.append((kind, m.group(), pos))
+        pos = m.end()
+    return tokens
+
+# =============================================================================
+# PARSER
+# =============================================================================
+
+_TERMINATORS = {',', '}', ']', ')', ';'}
+_CONSTANTS = {'true': True, 'false': False, 'null': None, 'undefined': None}
+
+class _Parser:
+    """Recursive-descent parser over the token list"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = tokenize(source)
+        self.pos = 0
+
+    def _peek(self, offset: int = 0) -> Tuple[str, str, int]:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else ('eof', '', len(self.source))
+
+    def _next(self) -> Tuple[str, str, int]:
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _expect(self, text: str):
+        kind, value, offset = self._next()
+        if value != text:
+            line = self.source.count('\n', 0, offset) + 1
+            raise TSParseError(f"Expected {text!r} but found {value!r} at line {line}")
+
+    def _skip_balanced(self, stop: set):
+        """Skip tokens until one in `stop` at depth 0 (not consumed)"""
+        depth = 0
+        while True:
+            kind, value, _ = self._peek()
+            if kind == 'eof':
+                return
+            if depth == 0 and value in stop:
+                return
+            if value in '{[(' and kind == 'punct':
+                depth += 1
+            elif value in '}])' and kind == 'punct':
+                if depth == 0:
+                    return
+                depth -= 1
+            self.pos += 1
+
+    def _raw_expression(self, start_offset: int) -> str:
+        """Consume the rest of an expression and return its source text"""
+        self._skip_balanced(_TERMINATORS)
+        end_offset = self._peek()[2]
+        return self.source[start_offset:end_offset].strip()
+
+    def parse_value(self) -> Any:
+        start = self.pos
+        start_offset = self._peek()[2]
+        value = self._parse_primary()
+
+        # String concatenation: 'a' + 'b'
+        while self._peek()[1] == '+' and isinstance(value, str):
+            self.pos += 1
+            right = self._parse_primary()
+            if not isinstance(right, str):
+                self.pos = start
+                return self._raw_expression(start_offset)
+            value += right
+
+        # Type casts do not change the value
+        if self._peek()[1] in ('as', 'satisfies'):
+            self._skip_balanced(_TERMINATORS)
+
+        if self._peek()[1] not in _TERMINATORS and self._peek()[0] != 'eof':
+            self.pos = start
+            return self._raw_expression(start_offset)
+        return value
+
+    def _parse_primary(self) -> Any:
+        kind, value, offset = self._peek()
+        if kind == 'punct' and value == '{':
+            return self._parse_object()
+        if kind == 'punct' and value == '[':
+            return self._parse_array()
+        if kind == 'string':
+            self.pos += 1
+            return _unescape(value[1:-1])
+        if kind == 'template':
+            self.pos += 1
+            return _unescape(value[1:-1])
+        if kind == 'number':
+            self.pos += 1
+            text = value.replace('_', '')
+            if text.lower().startswith('0x'):
+                return int(text, 16)
+            return float(text) if any(c in text for c in '.eE') else int(text)
+        if kind == 'punct' and value == '-' and self._peek(1)[0] == 'number':
+            self.pos += 1
+            return -self._parse_primary()
+        if kind == 'ident' and value in _CONSTANTS and self._peek(1)[1] in _TERMINATORS | {'as', 'satisfies'}:
+            self.pos += 1
+            return _CONSTANTS[value]
+        return self._raw_expression(offset)
+
+    def _parse_object(self) -> Dict[str, Any]:
+        self._expect('{')
+        obj: Dict[str, Any] = {}
+        while self._peek()[1] != '}':
+            kind, value, offset = self._next()
+            if kind == 'eof':
+                raise TSParseError("Unterminated object literal")
+            if value == '...':
+                # Spread of another object; cannot be resolved statically
+                self._skip_balanced({',', '}'})
+            elif kind in ('ident', 'number') or kind == 'string':
+                key = _unescape(value[1:-1]) if kind == 'string' else value
+                if self._peek()[1] == ':':
+                    self.pos += 1
+                    obj[key] = self.parse_value()
+                else:
+                    # Shorthand property or method; keep its source text
+                    obj[key] = self._raw_expression(offset)
+            elif value == '[':
+                # Computed key
+                self._skip_balanced({']'})
+                self._expect(']')
+                self._expect(':')
+                self.parse_value()
+            else:
+                line = self.source.count('\n', 0, offset) + 1
+                raise TSParseError(f"Unexpected {value!r} in object at line {line}")
+
+            if self._peek()[1] == ',':
+                self.pos += 1
+            elif self._peek()[1] != '}':
+                line = self.source.count('\n', 0, self._peek()[2]) + 1
+                raise TSParseError(f"Expected ',' or '}}' in object at line {line}")
+        self._expect('}')
+        return obj
+
+    def _parse_array(self) -> List[Any]:
+        self._expect('[')
+        items: List[Any] = []
+        while self._peek()[1] != ']':
+            if self._peek()[0] == 'eof':
+                raise TSParseError("Unterminated array literal")
+            if self._peek()[1] == '...':
+                self.pos += 1
+                self._skip_balanced({',', ']'})
+            else:
+                items.append(self.parse_value())
+
+            if self._peek()[1] == ',':
+                self.pos += 1
+            elif self._peek()[1] != ']':
+                line = self.source.count('\n', 0, self._peek()[2]) + 1
+                raise TSParseError(f"Expected ',' or ']' in array at line {line}")
+        self._expect(']')
+        return items
+
+    def parse_declarations(self) -> Dict[str, Any]:
+        """Parse every top-level `const NAME (: Type)? = value` declaration"""
+        declarations: Dict[str, Any] = {}
+        depth = 0
+        while self._peek()[0] != 'eof':
+            kind, value, _ = self._next()
+            if kind == 'punct' and value in '{[(':
+                depth += 1
+            elif kind == 'punct' and value in '}])':
+                depth -= 1
+            elif depth == 0 and kind == 'ident' and value == 'const' and self._peek()[0] == 'ident':
+                name = self._next()[1]
+                if self._peek()[1] == ':':
+                    self._skip_balanced({'='})
+                if self._peek()[1] != '=':
+                    continue
+                self.pos += 1
+                declarations[name] = self.parse_value()
+        return declarations
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+
+def parse_declarations(source: str) -> Dict[str, Any]:
+    """Parse all top-level const declarations in a TypeScript source file"""
+    return _Parser(source).parse_declarations()
+
+def _flatten_tree(node: Dict[str, Any], nodes: List[Dict[str, Any]]):
+    """Flatten a nested ConsultTree root into a node list, children as ids"""
+    children = node.get('children') or []
+    flat = {k: v for k, v in node.items() if k != 'children'}
+    if children:
+        flat['children'] = [child.get('id') for child in children if isinstance(child, dict)]
+    nodes.append(flat)
+    for child in children:
+        if isinstance(child, dict):
+            _flatten_tree(child, nodes)
+
+def extract_nodes(source: str) -> List[Dict[str, Any]]:
+    """Decision nodes from a tree file
+
+    Reads the `*_NODES: DecisionNode[]` array, or for files in the nested
+    ConsultTree format, flattens the `root` node and its children.
+    """
+    declarations = parse_declarations(source)
+
+    for name, value in declarations.items():
+        if name.endswith('_NODES') and isinstance(value, list):
+            return [node for node in value if isinstance(node, dict) and 'id' in node]
+
+    for value in declarations.values():
+        if isinstance(value, dict) and isinstance(value.get('root'), dict):
+            nodes: List[Dict[str, Any]] = []
+            _flatten_tree(value['root'], nodes)
+            return nodes
+
+    return []
+
+_FILE_CACHE: Dict[Path, Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+
+def parse_file(path: Path) -> List[Dict[str, Any]]:
+    """Decision nodes from a tree file, cached until the file changes"""
+    path = Path(path)
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _FILE_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    nodes = extract_nodes(path.read_text())
+    _FILE_CACHE[path] = (key, nodes)
+    return nodes
+
+def find_tree_metadata(source: str) -> Dict[str, Optional[str]]:
+    """Id, title and version of a tree file, where declared"""
+    declarations = parse_declarations(source)
+    for value in declarations.values():
+        if isinstance(value, dict) and isinstance(value.get('root'), dict):
+            return {
+                'id': value.get('id'),
+                'title': value.get('title'),
+                'version': value.get('version')
+            }
+    return {'id': None, 'title': None, 'version': None}
@@ -20,8 +20,18 @@ from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 import subprocess
+import time
 
-import yaml
+from snapshot_store import SnapshotStore
+from keyword_matcher import KeywordMatcher
+from ts_parser import extract_nodes, TSParseError
+from export_consults import ExportManifest, write_export, file_hash, TREES_DIR
+from table_index import TableIndex
+from consult_index import ConsultIndex, load_drug_names
+from review_queue import ReviewQueue, PENDING, changes_hash
+from processed_ledger import ProcessedLedger, source_hash
+from config_loader import load_config
+import metrics
 
 # =============================================================================
 # CONFIGURATION & SETUP
@@ -30,27 +40,39 @@ import yaml
 BASE_DIR = Path(__file__).parent.parent
 CONFIG_PATH = BASE_DIR / "scraper" / "config.yaml"
 DATA_DIR = BASE_DIR / "scraper" / "data"
-RAW_DIR = DATA_DIR / "raw"
+RAW_DIR = DATA_DIR / "raw"  # legacy timestamped snapshots
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"
 PROCESSED_DIR = DATA_DIR / "processed"
-REVIEW_QUEUE_FILE = DATA_DIR / "review_queue.json"
+LEDGER_DB = PROCESSED_DIR / "ledger.db"
+REVIEW_QUEUE_DB = DATA_DIR / "review_queue.db"
+REVIEW_QUEUE_FILE = DATA_DIR / "review_queue.json"  # legacy, imported into the database once
+TABLE_INDEX_FILE = DATA_DIR / "table_index.json"
+CONSULT_INDEX_FILE = DATA_DIR / "consult_index.json"
+METRICS_FILE = DATA_DIR / "metrics.jsonl"
+PROMETHEUS_FILE = DATA_DIR / "metrics.prom"
 LOGS_DIR = BASE_DIR / "scraper" / "logs"
 SRC_DIR = BASE_DIR / "src"
+DRUG_STORE_FILE = SRC_DIR / "data" / "drug-store.ts"
 
-# Ensure directories exist
-for d in [PROCESSED_DIR, LOGS_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
+# Share of a table's indexed terms a node must contain to count as covering it
+TABLE_COVERAGE = 0.8
+# ... and for a changed row to count as touching the node
+ROW_COVERAGE = 0.5
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOGS_DIR / f"updater_{datetime.now():%Y%m%d_%H%M%S}.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("MedKittUpdater")
 
+def setup_logging(log_file: bool = True):
+    """Log to the console and, for runs that process sources, to a timestamped file in LOGS_DIR"""
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
+        handlers.insert(0, logging.FileHandler(LOGS_DIR / f"updater_{datetime.now():%Y%m%d_%H%M%S}.log"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
 # =============================================================================
 # DATA CLASSES
 # =============================================================================
@@ -68,6 +90,7 @@ class UpdateCandidate:
     timestamp: str
     auto_approved: bool = False
     requires_review: bool = False
+    content_hash: str = ''  # source_hash() of the scraped content it was derived from
 
 @dataclass
 class ConsultData:
@@ -88,25 +111,20 @@ class MedKittUpdater:
     """Handles comparing scraped data to consults and managing updates"""
     
     def __init__(self, config_path: str = None):
-        self.config = self._load_config(config_path or CONFIG_PATH)
-        self.review_queue = self._load_review_queue()
-    
-    def _load_config(self, path: Path) -> Dict:
-        """Load YAML configuration"""
-        with open(path, 'r') as f:
-            return yaml.safe_load(f)
-    
-    def _load_review_queue(self) -> List[Dict]:
-        """Load pending review queue"""
-        if REVIEW_QUEUE_FILE.exists():
-            with open(REVIEW_QUEUE_FILE, 'r') as f:
-                return json.load(f)
-        return []
-    
-    def _save_review_queue(self):
-        """Save review queue to disk"""
-        with open(REVIEW_QUEUE_FILE, 'w') as f:
-            json.dump(self.review_queue, f, indent=2)
+        self.config = load_config(config_path or CONFIG_PATH)
+        self.review_queue = ReviewQueue(REVIEW_QUEUE_DB, legacy_file=REVIEW_QUEUE_FILE)
+        self.snapshots = SnapshotStore(SNAPSHOTS_DIR, legacy_dir=RAW_DIR)
+        self.table_index = TableIndex(TABLE_INDEX_FILE)
+        self._consult_index: Optional[ConsultIndex] = None
+        self.ledger = ProcessedLedger(LEDGER_DB)
+        # source_id -> (content hash, {consult_id: version}) analyzed but not yet recorded
+        self._ledger_pending: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self.keyword_matchers = {
+            consult_id: KeywordMatcher(consult_config.get('keywords', []))
+            for consult_id, consult_config in self.config.get('consults', {}).items()
+        }
+        # Parsed consults keyed by id, reused until the file's mtime/size change
+        self._consult_cache: Dict[str, Tuple[Tuple[int, int], ConsultData]] = {}
     
     def _load_consult(self, consult_id: str) -> Optional[ConsultData]:
         """Load a consult from TypeScript file"""
@@ -123,16 +141,22 @@ class MedKittUpdater:
             logger.error(f"Consult file not found: {file_path}")
             return None
         
+        stat = file_path.stat()
+        cache_key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._consult_cache.get(consult_id)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+        
         content = file_path.read_text()
         
         # Parse nodes from TypeScript file
-        nodes = self._parse_ts_nodes(content)
+        nodes = self._parse_ts_nodes(content, consult_id)
         
         # Extract version
         version_match = re.search(r'version:\s*[\'"]([\d.]+)[\'"]', content)
         version = version_match.group(1) if version_match else '1.0'
         
-        return ConsultData(
+        consult = ConsultData(
             consult_id=consult_id,
             name=consult_config['name'],
             file_path=file_path,
@@ -141,54 +165,18 @@ class MedKittUpdater:
             version=version,
             keywords=consult_config.get('keywords', [])
         )
+        self._consult_cache[consult_id] = (cache_key, consult)
+        return consult
     
-    def _parse_ts_nodes(self, content: str) -> List[Dict]:
+    def _parse_ts_nodes(self, content: str, consult_id: str = '') -> List[Dict]:
         """Extract nodes from TypeScript decision tree file"""
-        nodes = []
-        
-        # Find the NODES array
-        match = re.search(r'export\s+const\s+\w+_NODES\s*:\s*DecisionNode\[\]\s*=\s*(\[[\s\S]*?\]);', content)
-        if not match:
-            return nodes
-        
-        # Simple parsing - extract node objects
-        node_pattern = r'\{\s*id:\s*[\'"]([^\'"]+)[\'"]'
-        for m in re.finditer(node_pattern, content):
-            node_id = m.group(1)
-            # Find the full node object (simplified)
-            node_start = m.start()
-            node_end = content.find('},', node_start)
-            if node_end == -1:
-                node_end = content.find('}\n', node_start)
-            
-            node_content = content[node_start:node_end+1]
-            
-            # Extract key fields
-            node = {'id': node_id}
-            
-            # Type
-            type_match = re.search(r'type:\s*[\'](\w+)[\']', node_content)
-            if type_match:
-                node['type'] = type_match.group(1)
-            
-            # Title
-            title_match = re.search(r'title:\s*[\']([^\']+)[\']', node_content)
-            if title_match:
-                node['title'] = title_match.group(1)
-            
-            # Body
-            body_match = re.search(r'body:\s*[\']([^\']+)[\']', node_content)
-            if body_match:
-                node['body'] = body_match.group(1)
-            
-            # Citations
-            citation_match = re.search(r'citation:\s*\[([^\]]+)\]', node_content)
-            if citation_match:
-                citations_str = citation_match.group(1)
-                node['citations'] = [int(c.strip()) for c in citations_str.split(',')]
-            
-            nodes.append(node)
-        
+        try:
+            with metrics.timer('stage_seconds', stage='ts_parse'):
+                nodes = extract_nodes(content)
+        except TSParseError as e:
+            logger.error(f"Could not parse decision tree nodes: {e}")
+            return []
+        metrics.count('ts_nodes_parsed_total', len(nodes), consult=consult_id)
         return nodes
     
     def _extract_treatment_tables(self, raw_data: Dict) -> List[Dict]:
@@ -255,41 +243,87 @@ class MedKittUpdater:
         
         return updates
     
-    def _compare_with_consult(self, consult: ConsultData, raw_data: Dict) -> Dict[str, Any]:
-        """Compare scraped data with existing consult data"""
+    def consult_index(self) -> ConsultIndex:
+        """Term/drug index over all tree nodes, re-indexing trees that changed"""
+        if self._consult_index is None:
+            drugs = load_drug_names(DRUG_STORE_FILE)
+            for source_config in self.config.get('sources', {}).values():
+                drugs.extend(source_config.get('drug_keywords', []))
+            self._consult_index = ConsultIndex(CONSULT_INDEX_FILE, TREES_DIR, drugs)
+        self._consult_index.refresh()
+        return self._consult_index
+    
+    def _consults_for_alerts(self, raw_data: Dict) -> List[str]:
+        """Configured consults with a node mentioning a drug named in the alerts"""
+        drugs = {drug for alert in raw_data.get('alerts', []) for drug in alert.get('mentioned_drugs', [])}
+        if not drugs:
+            return []
+        tree_ids = self.consult_index().consults_for_drugs(drugs)
+        return [consult_id for tree_id in tree_ids for consult_id in self.config.tree_consults.get(tree_id, [])]
+    
+    def _touched_nodes(self, index: ConsultIndex, consult: ConsultData, rows: List[List[str]]) -> List[str]:
+        """Ids of the consult's nodes that any of the rows is about"""
+        node_ids = set()
+        for row in rows:
+            for hit in index.search(' '.join(row), [consult.file_path.stem], min_score=ROW_COVERAGE):
+                node_ids.add(hit['node_id'])
+        return sorted(node_ids)
+    
+    def _compare_with_consult(self, consult: ConsultData, raw_data: Dict,
+                              treatment_tables: Optional[List[Dict]] = None,
+                              table_changes: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Compare scraped data with existing consult data
+        
+        table_changes is the source's row-level table diff from the table
+        index. Without it (no history for the source yet) a table counts as
+        new when no node of the consult covers its terms. The nodes that new
+        or changed rows and FDA alerts touch are looked up in the consult index.
+        """
         differences = {
             'new_tables': [],
+            'table_changes': [],
             'modified_content': [],
             'new_citations': [],
             'keyword_matches': []
         }
+        index = self.consult_index()
+        tree_id = consult.file_path.stem
         
         # Extract treatment tables from scraped data
-        treatment_tables = self._extract_treatment_tables(raw_data)
-        
-        # Compare with existing consult content
-        consult_text = consult.content.lower()
-        
-        for table in treatment_tables:
-            table_text = ' '.join([' '.join(row) for row in table['rows']]).lower()
-            
-            # Check if table content is new
-            is_new = True
-            for existing_node in consult.nodes:
-                existing_body = existing_node.get('body', '').lower()
-                # Simple similarity check
-                if table_text[:100] in existing_body:
-                    is_new = False
-                    break
-            
-            if is_new:
-                differences['new_tables'].append(table)
+        if treatment_tables is None:
+            treatment_tables = self._extract_treatment_tables(raw_data)
+        
+        if table_changes is not None:
+            for change in table_changes:
+                if change['status'] == 'new':
+                    table = {'headers': change['headers'], 'rows': change['added_rows']}
+                    table['nodes'] = self._touched_nodes(index, consult, table['rows'])
+                    differences['new_tables'].append(table)
+                else:
+                    rows = change['added_rows'] + change['removed_rows'] + [m['after'] for m in change['modified_rows']]
+                    differences['table_changes'].append(dict(change, nodes=self._touched_nodes(index, consult, rows)))
+        else:
+            for table in treatment_tables:
+                table_text = ' '.join([' '.join(row) for row in table['rows']])
+                if not index.search(table_text, [tree_id], min_score=TABLE_COVERAGE, limit=1):
+                    differences['new_tables'].append(dict(table, nodes=self._touched_nodes(index, consult, table['rows'])))
+        
+        # FDA alerts: the nodes that mention an alerted drug
+        alert_nodes = []
+        for alert in raw_data.get('alerts', []):
+            hits = index.nodes_for_drugs(alert.get('mentioned_drugs', []), [tree_id])
+            if hits:
+                alert_nodes.append({
+                    'title': alert.get('title', ''),
+                    'url': alert.get('url', ''),
+                    'nodes': [hit['node_id'] for hit in hits]
+                })
+        if alert_nodes:
+            differences['alert_nodes'] = alert_nodes
         
         # Check for keyword matches in scraped content
-        content = raw_data.get('content', '').lower()
-        for keyword in consult.keywords:
-            if keyword.lower() in content:
-                differences['keyword_matches'].append(keyword)
+        matcher = self.keyword_matchers.get(consult.consult_id) or KeywordMatcher(consult.keywords)
+        differences['keyword_matches'] = matcher.matched_keywords(raw_data.get('content', ''))
         
         # Extract CDC updates
         cdc_updates = self._extract_cdc_updates(raw_data)
@@ -298,8 +332,15 @@ class MedKittUpdater:
         
         return differences
     
-    def analyze_changes(self, source_id: str, raw_data_file: Optional[Path] = None) -> List[UpdateCandidate]:
-        """Analyze changes from a scraped source and identify update candidates"""
+    def analyze_changes(self, source_id: str, raw_data_file: Optional[Path] = None,
+                        raw_data: Optional[Dict] = None, skip_processed: bool = True) -> List[UpdateCandidate]:
+        """Analyze changes from a scraped source and identify update candidates
+        
+        raw_data can be passed in directly (e.g. from an in-process scrape);
+        otherwise it is read from raw_data_file or the latest snapshot.
+        Consults already checked against the same content at their current
+        version (see record_processed) are skipped unless skip_processed is False.
+        """
         candidates = []
         
         # Get source config
@@ -311,30 +352,56 @@ class MedKittUpdater:
         source_config = sources[source_id]
         affected_consults = source_config.get('consults', [])
         
-        if not affected_consults:
+        # Drug alert sources without a mapping reach consults through the index
+        if not affected_consults and not source_config.get('drug_keywords'):
             logger.info(f"No consults mapped to source {source_id}")
             return candidates
         
         # Load raw data
-        if raw_data_file is None:
-            # Find most recent raw file
-            raw_files = sorted(RAW_DIR.glob(f"{source_id}_*.json"), reverse=True)
-            if not raw_files:
+        if raw_data is None and raw_data_file is not None:
+            with open(raw_data_file, 'r') as f:
+                raw_data = json.load(f)
+        elif raw_data is None:
+            raw_data = self.snapshots.latest(source_id)
+            if raw_data is None:
                 logger.error(f"No raw data found for {source_id}")
                 return candidates
-            raw_data_file = raw_files[0]
         
-        with open(raw_data_file, 'r') as f:
-            raw_data = json.load(f)
+        if not affected_consults:
+            affected_consults = self._consults_for_alerts(raw_data)
+            if not affected_consults:
+                logger.info(f"No consults mention drugs alerted by {source_id}")
+                return candidates
         
-        # Analyze each affected consult
+        # Skip consults already checked against exactly this content
+        content_hash = source_hash(raw_data)
+        pending: Dict[str, ConsultData] = {}
         for consult_id in affected_consults:
             consult = self._load_consult(consult_id)
             if not consult:
                 continue
-            
+            if skip_processed and self.ledger.seen(source_id, consult_id, content_hash, consult.version):
+                logger.info(f"{consult_id} v{consult.version} already checked against this {source_id} content")
+                continue
+            pending[consult_id] = consult
+        self._ledger_pending[source_id] = (
+            content_hash, {consult_id: consult.version for consult_id, consult in pending.items()}
+        )
+        if not pending:
+            return candidates
+        
+        # Diff treatment tables against the source's last recorded tables once,
+        # then make these tables the new baseline
+        treatment_tables = self._extract_treatment_tables(raw_data)
+        table_changes = None
+        if self.table_index.has_history(source_id):
+            table_changes = self.table_index.diff(source_id, treatment_tables)
+        self.table_index.record(source_id, treatment_tables)
+        
+        # Analyze each affected consult
+        for consult_id, consult in pending.items():
             # Compare data
-            differences = self._compare_with_consult(consult, raw_data)
+            differences = self._compare_with_consult(consult, raw_data, treatment_tables, table_changes)
             
             # Determine if update is needed
             if not any(differences.values()):
@@ -343,6 +410,10 @@ class MedKittUpdater:
             
             # Calculate change metrics
             new_tables_count = len(differences.get('new_tables', []))
+            changed_rows_count = sum(
+                len(change['added_rows']) + len(change['removed_rows']) + len(change['modified_rows'])
+                for change in differences.get('table_changes', [])
+            )
             keyword_match_count = len(differences.get('keyword_matches', []))
             
             # Determine change type based on rules
@@ -354,7 +425,7 @@ class MedKittUpdater:
             auto_approve = False
             requires_review = False
             
-            if new_tables_count > 0:
+            if new_tables_count > 0 or changed_rows_count > 0:
                 # Check treatment table rules
                 for rule in update_rules:
                     if rule.get('type') == 'treatment_table':
@@ -370,6 +441,8 @@ class MedKittUpdater:
             
             # Create update candidate
             reason = f"Detected {new_tables_count} new treatment tables, {keyword_match_count} keyword matches"
+            if changed_rows_count:
+                reason += f", {changed_rows_count} changed treatment table rows"
             if differences.get('cdc_updates'):
                 reason += f", {len(differences['cdc_updates'])} CDC guideline updates"
             
@@ -383,26 +456,35 @@ class MedKittUpdater:
                 reason=reason,
                 timestamp=datetime.now().isoformat(),
                 auto_approved=auto_approve,
-                requires_review=requires_review
+                requires_review=requires_review,
+                content_hash=content_hash
             )
             
             candidates.append(candidate)
         
         return candidates
     
-    def queue_for_review(self, candidate: UpdateCandidate):
-        """Add an update candidate to the review queue"""
-        self.review_queue.append({
+    def queue_for_review(self, candidate: UpdateCandidate) -> bool:
+        """Add an update candidate to the review queue
+        
+        Returns False when an item for the same content of the same source is
+        already queued for this consult.
+        """
+        queued = self.review_queue.enqueue({
             'consult_id': candidate.consult_id,
             'source_id': candidate.source_id,
             'change_type': candidate.change_type,
             'reason': candidate.reason,
             'proposed_changes': candidate.proposed_changes,
             'timestamp': candidate.timestamp,
-            'status': 'pending_review'
+            'status': PENDING,
+            'content_hash': candidate.content_hash or changes_hash(candidate.proposed_changes)
         })
-        self._save_review_queue()
-        logger.info(f"Queued {candidate.consult_id} for review")
+        if queued:
+            logger.info(f"Queued {candidate.consult_id} for review")
+        else:
+            logger.info(f"{candidate.consult_id} already queued for this {candidate.source_id} content")
+        return queued
     
     def apply_minor_update(self, candidate: UpdateCandidate, dry_run: bool = True) -> bool:
         """Apply a minor update to a consult"""
@@ -440,14 +522,18 @@ class MedKittUpdater:
         logger.info(f"Applied update to {candidate.consult_id}")
         return True
     
-    def _export_consult_json(self, consult: ConsultData):
-        """Export consult to JSON format for PWA consumption"""
-        consults_config = self.config.get('consults', {})
-        consult_config = consults_config.get(consult.consult_id, {})
-        json_path = BASE_DIR / consult_config.get('json_output', f'src/data/consults/{consult.consult_id}.json')
+    def _json_path(self, consult_id: str) -> Path:
+        """Where a consult's JSON export is written"""
+        consult_config = self.config.get('consults', {}).get(consult_id, {})
+        return BASE_DIR / consult_config.get('json_output', f'src/data/consults/{consult_id}.json')
+    
+    def _export_consult_json(self, consult: ConsultData) -> bool:
+        """Export consult to JSON format for PWA consumption
         
-        # Ensure directory exists
-        json_path.parent.mkdir(parents=True, exist_ok=True)
+        The file is left alone (and last_updated kept) when nothing but the
+        timestamp would change. Returns whether the JSON changed.
+        """
+        json_path = self._json_path(consult.consult_id)
         
         # Export data
         export_data = {
@@ -455,33 +541,113 @@ class MedKittUpdater:
             'name': consult.name,
             'version': consult.version,
             'last_updated': datetime.now().isoformat(),
+            'node_count': len(consult.nodes),
             'nodes': consult.nodes,
             'keywords': consult.keywords
         }
         
-        with open(json_path, 'w') as f:
-            json.dump(export_data, f, indent=2)
+        changed, output_hash = write_export(export_data, json_path)
+        
+        manifest = ExportManifest()
+        manifest.record(consult.consult_id, {
+            'name': consult.name,
+            'source': str(consult.file_path),
+            'source_hash': file_hash(consult.file_path),
+            'output': str(json_path),
+            'output_hash': output_hash,
+            'last_updated': export_data['last_updated']
+        })
+        manifest.save()
         
-        logger.info(f"Exported {consult.consult_id} to {json_path}")
+        if changed:
+            logger.info(f"Exported {consult.consult_id} to {json_path}")
+        else:
+            logger.info(f"{consult.consult_id} JSON unchanged")
+        return changed
+    
+    def _add_updated_paths(self, paths: List[str], consult_id: str):
+        """Add a consult's .ts and JSON files (repo-relative) to paths"""
+        consult_config = self.config.get('consults', {}).get(consult_id, {})
+        if not consult_config.get('file'):
+            return
+        for path in (BASE_DIR / consult_config['file'], self._json_path(consult_id)):
+            relative = path.relative_to(BASE_DIR).as_posix()
+            if relative not in paths:
+                paths.append(relative)
+    
+    def record_processed(self, source_id: str, outcomes: Optional[Dict[str, str]] = None):
+        """Record the consults last analyzed for a source as handled for its content
+        
+        outcomes maps consult_id to what was done (default 'no_changes').
+        """
+        content_hash, versions = self._ledger_pending.pop(source_id, (None, {}))
+        for consult_id, version in versions.items():
+            self.ledger.mark(source_id, consult_id, content_hash, version,
+                             (outcomes or {}).get(consult_id, 'no_changes'))
+    
+    def needs_processing(self, result: Any) -> bool:
+        """Whether a scrape result carries content the updater has not processed yet
+        
+        Changed content always does. Unchanged content does too when it was
+        never recorded in the ledger (e.g. the run that scraped it failed
+        before the updater finished).
+        """
+        if result.status == 'error':
+            return False
+        if result.change_detected:
+            return True
+        return bool(result.content_hash) and not self.ledger.seen_content(result.source_id, result.content_hash)
     
-    def process_all_sources(self, dry_run: bool = True) -> Dict[str, Any]:
-        """Process all sources and handle updates"""
+    def process_all_sources(self, dry_run: bool = True, scrape_results: Optional[List[Any]] = None,
+                            force: bool = False) -> Dict[str, Any]:
+        """Process all sources and handle updates
+        
+        With scrape_results (ScrapeResult objects from the same process), only
+        those sources are processed and their scraped data is used directly
+        instead of being re-read from the snapshot store. Results that did not
+        change are skipped without loading anything, unless their content was
+        never processed (e.g. an earlier run failed). Content already processed
+        for a consult's current version is skipped unless force.
+        
+        results['updated_paths'] lists the consult files written (relative to
+        the repository root), for commit_changes.
+        """
         results = {
             'processed': 0,
             'auto_updated': 0,
             'queued_for_review': 0,
             'no_changes': 0,
+            'already_processed': 0,
             'errors': 0,
-            'details': []
+            'details': [],
+            'updated_paths': []
         }
+        started = time.perf_counter()
         
-        sources = self.config.get('sources', {})
-        
-        for source_id in sources:
+        if scrape_results is None:
+            sources = {source_id: None for source_id in self.config.get('sources', {})}
+        else:
+            sources = {}
+            for result in scrape_results:
+                if result.status == 'error':
+                    continue
+                if not force and not self.needs_processing(result):
+                    results['already_processed'] += 1
+                    continue
+                # Unchanged results (304 Not Modified) carry no data; use the snapshot
+                sources[result.source_id] = result.data if result.status == 'success' and result.data else None
+        
+        for source_id, raw_data in sources.items():
             try:
-                candidates = self.analyze_changes(source_id)
+                candidates = self.analyze_changes(source_id, raw_data=raw_data, skip_processed=not force)
                 results['processed'] += 1
                 
+                content_hash, versions = self._ledger_pending.get(source_id, (None, {}))
+                if content_hash and not versions:
+                    results['already_processed'] += 1
+                    continue
+                outcomes = {}
+                
                 for candidate in candidates:
                     detail = {
                         'consult_id': candidate.consult_id,
@@ -491,39 +657,70 @@ class MedKittUpdater:
                     }
                     
                     if candidate.requires_review:
-                        self.queue_for_review(candidate)
-                        results['queued_for_review'] += 1
-                        detail['action'] = 'queued_for_review'
+                        if self.queue_for_review(candidate):
+                            results['queued_for_review'] += 1
+                            detail['action'] = 'queued_for_review'
+                        else:
+                            detail['action'] = 'already_queued'
                     elif candidate.auto_approved or candidate.change_type == 'minor':
                         success = self.apply_minor_update(candidate, dry_run=dry_run)
                         if success:
                             results['auto_updated'] += 1
                             detail['action'] = 'auto_updated' if not dry_run else 'would_auto_update'
+                            if not dry_run:
+                                self._add_updated_paths(results['updated_paths'], candidate.consult_id)
                     
                     results['details'].append(detail)
+                    if 'action' in detail:
+                        outcomes[candidate.consult_id] = detail['action']
                 
                 if not candidates:
                     results['no_changes'] += 1
+                
+                if dry_run:
+                    self._ledger_pending.pop(source_id, None)
+                else:
+                    self.record_processed(source_id, outcomes)
                     
             except Exception as e:
                 logger.error(f"Error processing {source_id}: {e}")
                 results['errors'] += 1
         
+        if not dry_run:
+            self.table_index.save()
+        
+        metrics.observe('stage_seconds', time.perf_counter() - started, stage='update')
         return results
     
-    def commit_changes(self, message: str = None) -> bool:
-        """Commit changes to Git repository"""
+    def export_metrics(self, command: str) -> Optional[Dict[str, Any]]:
+        """Write the timings and counts recorded since the last reset (see metrics.py)"""
+        return metrics.export_configured(command, self.config.get('metrics', {}), METRICS_FILE, PROMETHEUS_FILE)
+    
+    def commit_changes(self, message: str = None, paths: Optional[List[str]] = None) -> bool:
+        """Commit changes to Git repository
+        
+        With paths (e.g. process_all_sources' updated_paths), only those files
+        are staged and committed; otherwise the consult exports and scraper data.
+        """
         try:
             if message is None:
                 message = f"[AUTO-SCRAPER] Update consults - {datetime.now().isoformat()}"
             
+            if paths is not None and not paths:
+                logger.info("No changes to commit")
+                return True
+            pathspec = ['--', *paths] if paths else []
+            
             # Add files
-            subprocess.run(['git', 'add', 'src/data/consults/'], cwd=BASE_DIR, check=True)
-            subprocess.run(['git', 'add', 'scraper/data/'], cwd=BASE_DIR, check=True)
+            if paths:
+                subprocess.run(['git', 'add', *pathspec], cwd=BASE_DIR, check=True)
+            else:
+                subprocess.run(['git', 'add', 'src/data/consults/'], cwd=BASE_DIR, check=True)
+                subprocess.run(['git', 'add', 'scraper/data/'], cwd=BASE_DIR, check=True)
             
             # Check if there are changes to commit
             result = subprocess.run(
-                ['git', 'diff', '--cached', '--quiet'],
+                ['git', 'diff', '--cached', '--quiet', *pathspec],
                 cwd=BASE_DIR,
                 capture_output=True
             )
@@ -533,7 +730,7 @@ class MedKittUpdater:
                 return True
             
             # Commit
-            subprocess.run(['git', 'commit', '-m', message], cwd=BASE_DIR, check=True)
+            subprocess.run(['git', 'commit', '-m', message, *pathspec], cwd=BASE_DIR, check=True)
             logger.info(f"Committed changes: {message}")
             
             return True
@@ -542,18 +739,26 @@ class MedKittUpdater:
             logger.error(f"Git error: {e}")
             return False
     
-    def get_status(self) -> Dict[str, Any]:
-        """Get current status of the update system"""
+    def get_status(self, page: int = 1, page_size: int = 5) -> Dict[str, Any]:
+        """Get current status of the update system
+        
+        review_items is one page of the review queue, newest first.
+        """
+        page = max(1, page)
         return {
-            'pending_reviews': len(self.review_queue),
+            'pending_reviews': self.review_queue.count(PENDING),
+            'total_reviews': self.review_queue.count(None),
+            'page': page,
             'review_items': [
                 {
+                    'id': item['id'],
                     'consult_id': item['consult_id'],
+                    'source_id': item['source_id'],
                     'change_type': item['change_type'],
                     'timestamp': item['timestamp'],
                     'status': item['status']
                 }
-                for item in self.review_queue[-5:]  # Last 5
+                for item in self.review_queue.page(None, limit=page_size, offset=(page - 1) * page_size)
             ],
             'consults_tracked': list(self.config.get('consults', {}).keys()),
             'sources_monitored': list(self.config.get('sources', {}).keys())
@@ -568,15 +773,19 @@ def main():
     parser.add_argument('--dry-run', action='store_true', help='Simulate without applying changes')
     parser.add_argument('--apply', action='store_true', help='Apply detected updates')
     parser.add_argument('--status', action='store_true', help='Show current status')
+    parser.add_argument('--page', type=int, default=1, help='Review queue page to show (with --status)')
+    parser.add_argument('--page-size', type=int, default=5, help='Review items per page (with --status)')
     parser.add_argument('--source', help='Process specific source')
     parser.add_argument('--commit', action='store_true', help='Commit changes to git')
+    parser.add_argument('--force', action='store_true', help='Re-analyze content already processed')
     
     args = parser.parse_args()
     
+    setup_logging(log_file=bool(args.source or args.apply or args.dry_run))
     updater = MedKittUpdater()
     
     if args.status:
-        status = updater.get_status()
+        status = updater.get_status(page=args.page, page_size=args.page_size)
         print("\n" + "=" * 60)
         print("MEDKITT UPDATER STATUS")
         print("=" * 60)
@@ -585,13 +794,16 @@ def main():
         print(f"Sources monitored: {len(status['sources_monitored'])}")
         
         if status['review_items']:
-            print("\nRecent review items:")
+            pages = -(-status['total_reviews'] // args.page_size)
+            print(f"\nReview items (page {status['page']} of {pages}, newest first):")
             for item in status['review_items']:
-                print(f"  - {item['consult_id']} ({item['change_type']}) - {item['status']}")
+                print(f"  #{item['id']} {item['consult_id']} <- {item['source_id']} "
+                      f"({item['change_type']}) - {item['status']}")
     
     elif args.source:
         print(f"Analyzing source: {args.source}")
-        candidates = updater.analyze_changes(args.source)
+        candidates = updater.analyze_changes(args.source, skip_processed=args.apply and not args.force)
+        outcomes = {}
         
         if candidates:
             print(f"\nFound {len(candidates)} update candidates:")
@@ -604,14 +816,20 @@ def main():
                 
                 if args.apply and not c.requires_review:
                     updater.apply_minor_update(c, dry_run=False)
+                    outcomes[c.consult_id] = 'auto_updated'
                 elif args.apply and c.requires_review:
                     updater.queue_for_review(c)
+                    outcomes[c.consult_id] = 'queued_for_review'
         else:
             print("No updates detected")
+        
+        if args.apply:
+            updater.record_processed(args.source, outcomes)
+            updater.table_index.save()
     
     elif args.apply or args.dry_run:
         print(f"{'[DRY RUN] ' if args.dry_run else ''}Processing all sources...")
-        results = updater.process_all_sources(dry_run=args.dry_run)
+        results = updater.process_all_sources(dry_run=args.dry_run, force=args.force)
         
         print("\n" + "=" * 60)
         print("UPDATE SUMMARY")
@@ -620,6 +838,7 @@ def main():
         print(f"Auto-updates: {results['auto_updated']}")
         print(f"Queued for review: {results['queued_for_review']}")
         print(f"No changes: {results['no_changes']}")
+        print(f"Already processed: {results['already_processed']}")
         print(f"Errors: {results['errors']}")
         
         if results['details']:
@@ -632,6 +851,9 @@ def main():
     
     else:
         parser.print_help()
+    
+    if args.source or args.apply or args.dry_run:
+        updater.export_metrics('update')
 
 if __name__ == '__main__':
     main()